@@ -0,0 +1,94 @@
+#! python3
+'''
+Atomic file replacement shared by the build stamping scripts.  The new
+contents are built in memory and written to a temporary file beside the
+target, which is then swapped in with os.replace.  A reader (or a build
+that dies part way through) sees either the old file or the new one, never
+a truncated one.  When the contents are unchanged nothing is written at all,
+so the file keeps its modification time and does not trigger rebuilds in
+tools downstream.
+'''
+
+import os
+import locale
+import shutil
+import tempfile
+
+
+def read_bytes(filename):
+    '''Returns the contents of a file, or None if it does not exist.'''
+    try:
+        with open(filename, 'rb') as f_in:
+            return f_in.read()
+    except FileNotFoundError:
+        return None
+
+
+def umask_by_setting():
+    '''Returns the process umask by setting it and setting it back, which
+    another thread creating a file in between would see.'''
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read while importing, before the scripts start any threads.
+IMPORT_UMASK = umask_by_setting()
+
+
+def current_umask():
+    '''
+    Returns the process umask without changing it: from the Umask line of
+    /proc/self/status where there is one (Linux 4.7 on), otherwise the
+    umask when this module was imported.
+    '''
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+    return IMPORT_UMASK
+
+
+def replace_bytes(filename, data):
+    '''
+    Atomically replaces the contents of filename with data unless it
+    already holds exactly that.  The file is created if need be, and the
+    permissions of an existing file are kept.  Returns True if the file was
+    written.
+    '''
+    if read_bytes(filename) == data:
+        return False
+
+    directory, basename = os.path.split(os.path.abspath(filename))
+    fd, temp_name = tempfile.mkstemp(
+        prefix='.{}.'.format(basename), suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f_temp:
+            f_temp.write(data)
+            f_temp.flush()
+            os.fsync(f_temp.fileno())
+        if os.path.exists(filename):
+            shutil.copymode(filename, temp_name)
+        else:
+            # mkstemp creates the file private, give it the mode open()
+            # would have.
+            os.chmod(temp_name, 0o666 & ~current_umask())
+        os.replace(temp_name, filename)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+    return True
+
+
+def replace_text(filename, text, encoding=None):
+    '''
+    Text version of replace_bytes.  Newlines are translated and the text is
+    encoded just as a text mode write would, so the file comes out the same
+    as it did when written with open(filename, 'w').
+    '''
+    if encoding is None:
+        encoding = locale.getpreferredencoding(False)
+    return replace_bytes(filename, text.replace('\n', os.linesep).encode(encoding))
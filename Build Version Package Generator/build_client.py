@@ -0,0 +1,153 @@
+#! python3
+'''
+Client for the build scripts, for TCL hooks to call in place of the scripts
+themselves:
+
+    python build_client.py stamp -o ../src/system_build_info_pkg.vhd
+    python build_client.py cof -p onx10k_fpga -s jic -d ../dev_firmware
+        -b ../src/system_build_info_pkg.vhd onx10k_fpga_jic.cof
+
+The first argument names the operation (see OPERATIONS), the rest are the
+script's own command line arguments.  If build_server.py is running, the
+operation is sent to it over its Unix socket and runs in a process that
+already has every module imported, so the call costs little more than
+starting this small script.  Otherwise, the operation runs here in process
+just as the script would.  The output and exit status are the same either
+way.
+'''
+
+import os
+import sys
+import json
+import stat
+import socket
+import tempfile
+import importlib
+
+# Operation name to the module whose main() runs it.
+OPERATIONS = {
+    'stamp': 'update_build_time',
+    'info': 'build_info',
+    'cof': 'update_cof_filename',
+    'outputs': 'gen_output_files',
+}
+
+SOCKET_ENV = 'BUILD_SERVER_SOCKET'
+
+
+def socket_directory():
+    '''Returns the user private directory for the server socket:
+    $XDG_RUNTIME_DIR, or build_server-<uid> in the temporary directory,
+    which the server creates readable by its owner only.'''
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return runtime_dir
+    return os.path.join(tempfile.gettempdir(),
+                        'build_server-{}'.format(os.getuid()))
+
+
+def socket_path():
+    '''Returns the server socket path: $BUILD_SERVER_SOCKET, or
+    build_server.sock in socket_directory().'''
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    return os.path.join(socket_directory(), 'build_server.sock')
+
+
+def owned_socket(path):
+    '''
+    True if path is a socket owned by this user.  Anything else there may
+    belong to another local user, who could answer requests with false
+    results, so it is not used.
+    '''
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if stat.S_ISSOCK(st.st_mode) and st.st_uid == os.getuid():
+        return True
+    print('Ignoring {}, not a socket owned by this user.'.format(path))
+    return False
+
+
+def import_operation(op):
+    '''Imports the module of an operation.  The COF scripts live in the
+    sibling directory in the source tree.'''
+    try:
+        return importlib.import_module(OPERATIONS[op])
+    except ImportError:
+        sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     '..', 'Dynamic COF Filenames'))
+        return importlib.import_module(OPERATIONS[op])
+
+
+def run_operation(op, args):
+    '''
+    Runs an operation's main() with args as its command line, in this
+    process.  Returns the exit status.
+    '''
+    module = import_operation(op)
+    sys.argv = [OPERATIONS[op] + '.py'] + list(args)
+    try:
+        module.main()
+    except SystemExit as exc:
+        if exc.code is None or isinstance(exc.code, int):
+            return exc.code or 0
+        print(exc.code, file=sys.stderr)
+        return 1
+    return 0
+
+
+def recv_line(sock):
+    '''Reads one newline terminated message from a socket.'''
+    data = bytearray()
+    while not data.endswith(b'\n'):
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+def call_server(op, args, path=None):
+    '''
+    Sends an operation to the server.  Returns a tuple of its output and
+    exit status, or None if no server of this user is listening.
+    '''
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'getuid'):
+        return None
+    path = path or socket_path()
+    if not owned_socket(path):
+        return None
+    request = json.dumps({'op': op, 'args': list(args), 'cwd': os.getcwd()})
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(path)
+            sock.sendall(request.encode('utf-8') + b'\n')
+            reply = recv_line(sock)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    reply = json.loads(reply.decode('utf-8'))
+    return reply['output'], reply['status']
+
+
+def main():
+    '''
+    Main entry point for command line usage
+    '''
+    if len(sys.argv) < 2 or sys.argv[1] not in OPERATIONS:
+        print('usage: build_client.py {{{}}} [script arguments]'.format(
+            ','.join(OPERATIONS)), file=sys.stderr)
+        sys.exit(2)
+    op, args = sys.argv[1], sys.argv[2:]
+    reply = call_server(op, args)
+    if reply is None:
+        sys.exit(run_operation(op, args))
+    output, status = reply
+    sys.stdout.write(output)
+    sys.exit(status)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#! python3
+'''
+Concurrency safe build number allocation.  Builds of several Quartus seeds
+or revisions may run update_build_time.py at the same moment, and the
+read-increment-write of a build number must not interleave between them or
+two builds get the same number.  FileLock holds an exclusive operating
+system lock (fcntl on Unix, msvcrt on Windows) on a lock file beside the
+file being updated for the whole read-increment-write.  A separate lock file
+is used because the updated file itself is replaced atomically, so it is a
+different file after every update.
+
+Per-revision counters are kept in a small JSON counter file mapping each
+revision name to the last number it was given, so each revision numbers its
+builds independently.
+'''
+
+import os
+import json
+import time
+from atomic_file import read_bytes, replace_text
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+COUNTER_FILENAME = 'build_numbers.json'
+
+
+class FileLock:
+    '''
+    Context manager holding an exclusive lock on filename + '.lock' for the
+    duration of a with block.  Blocks until the lock is available.  The lock
+    file is left in place afterwards; deleting it would let two processes
+    lock different files of the same name.
+    '''
+
+    def __init__(self, filename):
+        self.lock_filename = filename + '.lock'
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(self.lock_filename, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            # msvcrt locks a byte range from the current position and gives
+            # up after 10 seconds, so keep trying.
+            self.lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if fcntl is not None:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+        else:
+            self.lock_file.seek(0)
+            msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.lock_file.close()
+        self.lock_file = None
+
+
+def next_build_number(counter_filename, revision):
+    '''
+    Allocates the next build number for a revision from a JSON counter
+    file, creating the file or the revision's entry (starting at 1) as
+    needed.  Safe against other processes allocating at the same time.
+    '''
+    with FileLock(counter_filename):
+        data = read_bytes(counter_filename)
+        counters = json.loads(data) if data else {}
+        build_num = counters.get(revision, 0) + 1
+        counters[revision] = build_num
+        replace_text(counter_filename,
+                     json.dumps(counters, indent=2, sort_keys=True) + '\n')
+    return build_num
+
+
+def counter_path(package_filename, counter_filename=None):
+    '''Returns the counter file to use for a package: the one given, or
+    COUNTER_FILENAME in the package's directory.'''
+    if counter_filename:
+        return counter_filename
+    return os.path.join(os.path.dirname(package_filename), COUNTER_FILENAME)
@@ -0,0 +1,162 @@
+#! python3
+'''
+The build information held in the system build package, as a data object.
+BuildInfo is parsed from the VHDL in a single pass with one compiled
+pattern, and reports every missing constant by name rather than failing
+part way through.
+
+update_build_time.py also writes the information to a small JSON sidecar
+beside the package (system_build_info_pkg.json for
+system_build_info_pkg.vhd), so post-build steps such as
+update_cof_filename.py and TCL hooks can read it without parsing VHDL:
+
+    {"build": 458, "day": 1, "hour": 14, "minute": 12, "month": 3,
+     "second": 48, "version": "0.0.1", "year": 2019}
+'''
+
+import os
+import re
+import json
+import argparse
+from atomic_file import replace_text
+
+# Constant name to BuildInfo attribute.
+FIELDS = {
+    'C_BUILD_VERSION_STR': 'version',
+    'C_BUILD_TIME_YEAR': 'year',
+    'C_BUILD_TIME_MONTH': 'month',
+    'C_BUILD_TIME_DAY': 'day',
+    'C_BUILD_TIME_HOUR': 'hour',
+    'C_BUILD_TIME_MINUTE': 'minute',
+    'C_BUILD_TIME_SECOND': 'second',
+    'C_BUILD_NUMBER': 'build',
+}
+
+FIELD_RE = re.compile(
+    r'constant\s+(?P<name>{})\b[^;]*?:=\s*'
+    r'(?:"(?P<string>[^"]*)"|(?P<number>[0-9]+))\s*;'.format('|'.join(FIELDS)))
+
+
+class BuildInfoError(ValueError):
+    '''Raised when the build information is incomplete.'''
+
+
+class BuildInfo:
+    '''
+    Class holding the version string, build time and build number of a
+    build.  The time fields and build number are integers.
+    '''
+
+    def __init__(self, version, year, month, day, hour, minute, second, build):
+        self.version = version
+        self.year = year
+        self.month = month
+        self.day = day
+        self.hour = hour
+        self.minute = minute
+        self.second = second
+        self.build = build
+
+    @classmethod
+    def from_text(cls, text, source='package'):
+        '''Parses the contents of a system build package.  Raises
+        BuildInfoError naming every constant that is missing.'''
+        values = {}
+        for match in FIELD_RE.finditer(text):
+            attr = FIELDS[match.group('name')]
+            if match.group('string') is not None:
+                values[attr] = match.group('string')
+            else:
+                values[attr] = int(match.group('number'))
+        missing = [name for name, attr in FIELDS.items() if attr not in values]
+        if missing:
+            raise BuildInfoError('{} is missing constant(s): {}'.format(
+                source, ', '.join(missing)))
+        return cls(**values)
+
+    @classmethod
+    def from_package(cls, filename):
+        '''Parses a system build package file.'''
+        with open(filename, 'r') as f:
+            return cls.from_text(f.read(), filename)
+
+    @classmethod
+    def from_sidecar(cls, filename):
+        '''Reads a JSON sidecar file.'''
+        with open(filename, 'r') as f:
+            values = json.load(f)
+        missing = [attr for attr in FIELDS.values() if attr not in values]
+        if missing:
+            raise BuildInfoError('{} is missing field(s): {}'.format(
+                filename, ', '.join(missing)))
+        return cls(**{attr: values[attr] for attr in FIELDS.values()})
+
+    @classmethod
+    def load(cls, package_filename):
+        '''Reads the build information of a package from its sidecar when
+        that is at least as new as the package, otherwise from the package
+        itself.  A package without build constants (one written by the ROM
+        mode of update_build_time.py) is always read from its sidecar.'''
+        sidecar = sidecar_path(package_filename)
+        has_sidecar = os.path.isfile(sidecar)
+        if (has_sidecar and
+                os.path.getmtime(sidecar) >= os.path.getmtime(package_filename)):
+            return cls.from_sidecar(sidecar)
+        try:
+            return cls.from_package(package_filename)
+        except BuildInfoError:
+            if not has_sidecar:
+                raise
+            return cls.from_sidecar(sidecar)
+
+    def as_dict(self):
+        '''Returns the information as a dictionary of the sidecar fields.'''
+        return {attr: getattr(self, attr) for attr in FIELDS.values()}
+
+    def write_sidecar(self, filename):
+        '''Writes the JSON sidecar file.'''
+        replace_text(filename, json.dumps(self.as_dict(), sort_keys=True) + '\n')
+
+    def stamp(self):
+        '''Returns the version, time and build stamp used in output
+        filenames, e.g. v0.0.1_20190301_141248_Build_457.'''
+        return 'v{}_{:04}{:02}{:02}_{:02}{:02}{:02}_Build_{}'.format(
+            self.version, self.year, self.month, self.day,
+            self.hour, self.minute, self.second, self.build)
+
+
+def sidecar_path(package_filename):
+    '''Returns the JSON sidecar filename of a package.'''
+    return os.path.splitext(package_filename)[0] + '.json'
+
+
+def main():
+    '''
+    Main entry point for command line usage
+    '''
+    parser = argparse.ArgumentParser(
+        prog='build_info',
+        description='''Prints the build information of a system build
+        package as JSON, read from its sidecar when that is up to date.''')
+    parser.add_argument(
+        'build_file',
+        help='The system build package file.')
+    parser.add_argument(
+        '-s', '--stamp',
+        help='Print the output filename stamp instead, e.g. '
+             'v0.0.1_20190301_141248_Build_457',
+        action='store_true')
+    args = parser.parse_args()
+
+    try:
+        info = BuildInfo.load(args.build_file)
+    except (OSError, ValueError) as err:
+        parser.exit(1, 'Error: {}\n'.format(err))
+    if args.stamp:
+        print(info.stamp())
+    else:
+        print(json.dumps(info.as_dict(), sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
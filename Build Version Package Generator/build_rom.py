@@ -0,0 +1,291 @@
+#! python3
+'''
+ROM image stamping mode for update_build_time.py.  Stamping constants into
+system_build_info_pkg.vhd changes a source file on every build, so every
+build is a full synthesis.  In this mode the version, build time and build
+number go in a small ROM image instead, a MIF or Verilog MEM file, and the
+VHDL holds no stamped values at all: a package of the ROM layout and an
+entity that instantiates the ROM from the image.  The VHDL is written once
+and left alone afterwards (it is only rewritten if its contents would
+change), so a new stamp needs just the memory initialization updated and the
+design re-assembled (in Quartus, quartus_cdb --update_mif then quartus_asm).
+
+The VHDL file must be new or one written by this mode before; any other file
+is refused rather than overwritten, so a package stamped by the package mode
+needs a new output filename.  The build number and version are carried
+between builds in the JSON sidecar beside the package (see build_info.py),
+which also keeps update_cof_filename.py working unchanged.  The version is
+edited there.  To carry on the build numbers of a package stamped by the
+package mode, copy its sidecar beside the new package.
+
+ROM layout, 32 bit words:
+
+    0       date, year(31:16) month(15:8) day(7:0)
+    1       time, hour(31:16) minute(15:8) second(7:0)
+    2       build number
+    3..15   version string, ASCII, 4 characters per word, first character
+            in the most significant byte, NUL padded
+'''
+
+import os
+from atomic_file import replace_text
+from build_info import BuildInfo, BuildInfoError, sidecar_path
+
+ROM_DEPTH = 16
+ROM_WIDTH = 32
+ROM_ADDR_WIDTH = 4
+DATE_ADDR = 0
+TIME_ADDR = 1
+NUMBER_ADDR = 2
+VERSION_ADDR = 3
+VERSION_CHARS = (ROM_DEPTH - VERSION_ADDR) * 4
+DEFAULT_VERSION = '1.0.0'
+
+ROM_FORMATS = ('mif', 'mem')
+# First lines of a package written by this mode.
+ROM_PACKAGE_TITLE = '''-------------------------------------------------------------------------------
+-- Title       : System Build Information ROM
+'''
+
+
+def rom_format(rom_filename):
+    '''Returns the ROM image format from the filename extension.'''
+    fmt = os.path.splitext(rom_filename)[1][1:].lower()
+    if fmt not in ROM_FORMATS:
+        raise ValueError('ROM image must be a .mif or .mem file: {}'.format(
+            rom_filename))
+    return fmt
+
+
+def rom_words(info):
+    '''Returns the ROM contents for the build information as a list of
+    ROM_DEPTH integers.'''
+    version = info.version.encode('ascii')
+    if len(version) > VERSION_CHARS:
+        raise BuildInfoError('version "{}" is longer than {} characters'.format(
+            info.version, VERSION_CHARS))
+    version = version.ljust(VERSION_CHARS, b'\0')
+    words = [
+        info.year << 16 | info.month << 8 | info.day,
+        info.hour << 16 | info.minute << 8 | info.second,
+        info.build,
+    ]
+    words.extend(int.from_bytes(version[idx:idx + 4], 'big')
+                 for idx in range(0, VERSION_CHARS, 4))
+    return words
+
+
+def rom_text(info, fmt):
+    '''Returns the ROM image text in the given format, laid out as the MIF
+    Generation writers lay out a table, one word to a line.'''
+    words = rom_words(info)
+    nibbles = ROM_WIDTH // 4
+    if fmt == 'mif':
+        lines = ['DEPTH={}; % Memory Depth in Address Locations %'.format(ROM_DEPTH),
+                 'WIDTH={}; % Memory Width in Bits %'.format(ROM_WIDTH),
+                 'ADDRESS_RADIX = HEX;',
+                 'DATA_RADIX = HEX;',
+                 'CONTENT',
+                 'BEGIN']
+        addr_nibbles = (ROM_ADDR_WIDTH + 3) // 4
+        lines.extend('{:0{}X} : {:0{}X} ;'.format(addr, addr_nibbles, word, nibbles)
+                     for addr, word in enumerate(words))
+        lines.append('END;')
+    else:
+        lines = ['// Verilog Hex Memory Format',
+                 '// DEPTH={}'.format(ROM_DEPTH),
+                 '// WIDTH={}'.format(ROM_WIDTH),
+                 '// DATA_RADIX = HEX']
+        lines.extend('{:0{}X}'.format(word, nibbles) for word in words)
+    return '\n'.join(lines) + '\n'
+
+
+def check_rom_package(package_filename):
+    '''
+    Raises ValueError unless the package file is new or was written by this
+    mode, so that ROM mode never overwrites a package with other contents.
+    '''
+    if not os.path.isfile(package_filename):
+        return
+    with open(package_filename) as f:
+        head = f.read(len(ROM_PACKAGE_TITLE))
+    if head != ROM_PACKAGE_TITLE:
+        raise ValueError('{} was not written by ROM mode, give --rom a new '
+                         'output file'.format(package_filename))
+
+
+def rom_package_text(package_filename, rom_filename):
+    '''
+    Returns the VHDL for ROM mode: the system_build_info package describing
+    the ROM layout and the system_build_info_rom entity.  For a MIF image
+    the ROM is an altsyncram initialized from the file, which Quartus can
+    update after fitting.  For a MEM image it is an inferred ROM read from
+    the file with VHDL-2008 textio.
+    '''
+    init_file = os.path.basename(rom_filename)
+    if rom_format(rom_filename) == 'mif':
+        library = 'library altera_mf;\nuse altera_mf.altera_mf_components.all;\n'
+        architecture = ALTSYNCRAM_ARCHITECTURE
+    else:
+        library = 'use std.textio.all;\n'
+        architecture = TEXTIO_ARCHITECTURE
+    return ROM_PACKAGE.format(
+        filename=os.path.basename(package_filename), depth=ROM_DEPTH,
+        width=ROM_WIDTH, addr_width=ROM_ADDR_WIDTH, date=DATE_ADDR,
+        time=TIME_ADDR, number=NUMBER_ADDR, version=VERSION_ADDR,
+        library=library,
+        architecture=architecture.format(init_file=init_file))
+
+
+def previous_info(package_filename):
+    '''Returns the build information of the previous build from the sidecar,
+    or None for a first build.'''
+    sidecar = sidecar_path(package_filename)
+    if os.path.isfile(sidecar):
+        return BuildInfo.from_sidecar(sidecar)
+    return None
+
+
+def stamp_rom(package_filename, rom_filename, now, build_num=None):
+    '''
+    Writes the ROM image for a new build, the VHDL if it has changed, and
+    then the sidecar.  The build number is one more than the previous build's
+    unless build_num gives it.  Callers running in parallel must hold the
+    package lock.  Raises ValueError if the package file was not written by
+    this mode.  Returns the new build number.
+    '''
+    check_rom_package(package_filename)
+    print('=================================================================')
+    print('Updating system build ROM image with time: {:%c}'.format(now))
+    previous = previous_info(package_filename)
+    version = previous.version if previous else DEFAULT_VERSION
+    if build_num is None:
+        build_num = previous.build + 1 if previous else 1
+    info = BuildInfo(version, now.year, now.month, now.day,
+                     now.hour, now.minute, now.second, build_num)
+    print('Build number: {}'.format(build_num))
+    replace_text(rom_filename, rom_text(info, rom_format(rom_filename)))
+    if replace_text(package_filename,
+                    rom_package_text(package_filename, rom_filename)):
+        print('Wrote {}'.format(package_filename))
+    # Last, so the sidecar is at least as new as the package.
+    info.write_sidecar(sidecar_path(package_filename))
+    print('Update complete')
+    print('=================================================================')
+    return build_num
+
+
+ROM_PACKAGE = ROM_PACKAGE_TITLE + '''-------------------------------------------------------------------------------
+-- File        : {filename}
+-------------------------------------------------------------------------------
+-- Description:  This file is generated by the Python file
+-- "update_build_time.py" in ROM mode (--rom).  It holds no build values.
+-- The version, build time and build number are in the ROM image, which is
+-- rewritten on every build, so that this file does not change and a new
+-- build stamp does not require synthesis.  Read the ROM through
+-- system_build_info_rom:
+--
+--   C_BUILD_ROM_DATE_ADDR     date, year(31:16) month(15:8) day(7:0)
+--   C_BUILD_ROM_TIME_ADDR     time, hour(31:16) minute(15:8) second(7:0)
+--   C_BUILD_ROM_NUMBER_ADDR   build number
+--   C_BUILD_ROM_VERSION_ADDR  version string, ASCII, 4 characters per word,
+--                             first character in the MSB, NUL padded to the
+--                             end of the ROM
+-------------------------------------------------------------------------------
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
+
+package system_build_info is
+
+\tconstant C_BUILD_ROM_DEPTH        : integer := {depth};
+\tconstant C_BUILD_ROM_WIDTH        : integer := {width};
+\tconstant C_BUILD_ROM_ADDR_WIDTH   : integer := {addr_width};
+\tconstant C_BUILD_ROM_DATE_ADDR    : integer := {date};
+\tconstant C_BUILD_ROM_TIME_ADDR    : integer := {time};
+\tconstant C_BUILD_ROM_NUMBER_ADDR  : integer := {number};
+\tconstant C_BUILD_ROM_VERSION_ADDR : integer := {version};
+
+\tcomponent system_build_info_rom is
+\t\tport (
+\t\t\tclk     : in  std_logic;
+\t\t\taddress : in  std_logic_vector(C_BUILD_ROM_ADDR_WIDTH - 1 downto 0);
+\t\t\tq       : out std_logic_vector(C_BUILD_ROM_WIDTH - 1 downto 0)
+\t\t);
+\tend component system_build_info_rom;
+
+end package system_build_info;
+
+library ieee;
+use ieee.std_logic_1164.all;
+use ieee.numeric_std.all;
+{library}use work.system_build_info.all;
+
+entity system_build_info_rom is
+\tport (
+\t\tclk     : in  std_logic;
+\t\taddress : in  std_logic_vector(C_BUILD_ROM_ADDR_WIDTH - 1 downto 0);
+\t\tq       : out std_logic_vector(C_BUILD_ROM_WIDTH - 1 downto 0)
+\t);
+end entity system_build_info_rom;
+{architecture}'''
+
+ALTSYNCRAM_ARCHITECTURE = '''
+architecture rtl of system_build_info_rom is
+begin
+
+\trom : altsyncram
+\t\tgeneric map (
+\t\t\toperation_mode         => "ROM",
+\t\t\twidth_a                => C_BUILD_ROM_WIDTH,
+\t\t\twidthad_a              => C_BUILD_ROM_ADDR_WIDTH,
+\t\t\tnumwords_a             => C_BUILD_ROM_DEPTH,
+\t\t\toutdata_reg_a          => "UNREGISTERED",
+\t\t\tinit_file              => "{init_file}",
+\t\t\tlpm_type               => "altsyncram"
+\t\t)
+\t\tport map (
+\t\t\tclock0    => clk,
+\t\t\taddress_a => address,
+\t\t\tq_a       => q
+\t\t);
+
+end architecture rtl;
+'''
+
+TEXTIO_ARCHITECTURE = '''
+architecture rtl of system_build_info_rom is
+
+\ttype rom_t is array (0 to C_BUILD_ROM_DEPTH - 1) of
+\t\tstd_logic_vector(C_BUILD_ROM_WIDTH - 1 downto 0);
+
+\t-- Reads the MEM file, skipping its // comment lines.
+\timpure function read_rom(filename : string) return rom_t is
+\t\tfile rom_file     : text open read_mode is filename;
+\t\tvariable rom_line : line;
+\t\tvariable rom      : rom_t := (others => (others => '0'));
+\t\tvariable idx      : integer := 0;
+\tbegin
+\t\twhile not endfile(rom_file) and idx < C_BUILD_ROM_DEPTH loop
+\t\t\treadline(rom_file, rom_line);
+\t\t\tif rom_line'length > 0 and rom_line(rom_line'left) /= '/' then
+\t\t\t\thread(rom_line, rom(idx));
+\t\t\t\tidx := idx + 1;
+\t\t\tend if;
+\t\tend loop;
+\t\treturn rom;
+\tend function read_rom;
+
+\tconstant C_ROM : rom_t := read_rom("{init_file}");
+
+begin
+
+\tprocess (clk)
+\tbegin
+\t\tif rising_edge(clk) then
+\t\t\tq <= C_ROM(to_integer(unsigned(address)));
+\t\tend if;
+\tend process;
+
+end architecture rtl;
+'''
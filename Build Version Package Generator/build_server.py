@@ -0,0 +1,130 @@
+#! python3
+'''
+Long lived server for the build scripts.  Most of the time taken by a short
+script such as update_build_time.py or update_cof_filename.py run from a
+TCL hook is interpreter startup and imports, paid again by every call of
+every build.  This server imports all the operations of build_client.py
+once and then listens on a Unix socket.  Each request forks a child that
+changes to the client's directory and runs the operation's main() there, so
+requests from parallel builds run side by side and one cannot disturb the
+state of another.  The child sends back the output and exit status.
+
+Start it once per machine (or per user session) before building:
+
+    python build_server.py &
+
+build_client.py runs operations in process when the server is not running,
+so the server is purely an optimization.
+'''
+
+import io
+import os
+import sys
+import json
+import stat
+import signal
+import argparse
+import contextlib
+import socketserver
+from build_client import (OPERATIONS, import_operation, recv_line, run_operation,
+                          socket_directory, socket_path)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''Runs one operation, in the forked child handling the connection.'''
+
+    def handle(self):
+        request = json.loads(recv_line(self.connection).decode('utf-8'))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            if request.get('op') not in OPERATIONS:
+                print('Unknown operation: {}'.format(request.get('op')))
+                status = 2
+            else:
+                try:
+                    os.chdir(request['cwd'])
+                    status = run_operation(request['op'], request['args'])
+                except Exception as err:
+                    print('Error: {}: {}'.format(type(err).__name__, err))
+                    status = 1
+        reply = json.dumps({'output': output.getvalue(), 'status': status})
+        self.connection.sendall(reply.encode('utf-8') + b'\n')
+
+
+class BuildServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    '''Unix socket server forking a child per request.'''
+
+
+def private_directory(directory):
+    '''
+    Creates the socket directory readable by this user only if need be,
+    and checks that it is, so that no other user can put a socket in it.
+    Returns an error message, or None.
+    '''
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    st = os.lstat(directory)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid()
+            or st.st_mode & 0o077):
+        return '{} is not a directory private to this user'.format(directory)
+    return None
+
+
+def warm_up():
+    '''
+    Imports the operations, so forked children start with them loaded.
+    The stamp path (update_build_time and the build_info and build_rom
+    modules it imports) must load.  The COF operations are only preloaded
+    if their modules are installed too; otherwise they are imported when
+    first requested.
+    '''
+    import_operation('stamp')
+    for op in OPERATIONS:
+        try:
+            import_operation(op)
+        except ImportError as err:
+            print('Not preloading {}: {}'.format(op, err))
+
+
+def main():
+    '''
+    Main entry point for command line usage
+    '''
+    parser = argparse.ArgumentParser(
+        prog='build_server',
+        description='''Serves the build script operations of
+        build_client.py over a Unix socket.''')
+    parser.add_argument(
+        '-s', '--socket',
+        help='The socket path.  Default: {}'.format(socket_path()),
+        default=socket_path())
+    args = parser.parse_args()
+
+    # A socket given outright is the caller's responsibility.
+    if args.socket == os.path.join(socket_directory(), 'build_server.sock'):
+        error = private_directory(socket_directory())
+        if error:
+            parser.error(error)
+    warm_up()
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(args.socket)
+    # Only this user may connect.
+    mask = os.umask(0o177)
+    try:
+        server = BuildServer(args.socket, RequestHandler)
+    finally:
+        os.umask(mask)
+    # Remove the socket on kill as well as on Ctrl-C.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('Build server listening on {}'.format(args.socket))
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(args.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 # Runs the Python update_build_time.py script to update the
-# system build package.
+# system build package.  build_client.py passes it to build_server.py when
+# that is running, and otherwise runs it directly.
 proc call_python {} {
-	set output [exec python ../bin/update_build_time.py -o ../src/system_build_info_pkg.vhd]
+	set output [exec python ../bin/build_client.py stamp -o ../src/system_build_info_pkg.vhd]
 	post_message $output
 }
 post_message "Executing run_update_build_time.tcl script..."
@@ -0,0 +1,79 @@
+#! python3
+'''Tests for update_build_time.  Run with pytest from this directory.'''
+import os
+import io
+import json
+import datetime
+import tempfile
+import unittest
+import contextlib
+from build_info import BuildInfo
+from build_rom import stamp_rom
+from update_build_time import stamp_packages
+
+NOW = datetime.datetime(2019, 3, 1, 14, 12, 48)
+
+
+class StampPackagesTest(unittest.TestCase):
+    '''Several packages stamped in one run.'''
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.packages = [os.path.join(self.tempdir.name, name)
+                         for name in ('a_pkg.vhd', 'b_pkg.vhd')]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def stamp(self, revision=None):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return stamp_packages(self.packages, NOW, revision)
+
+    def test_revision_number_once_per_run(self):
+        for run in (1, 2):
+            numbers = self.stamp('rev')
+            self.assertEqual(numbers, {package: run for package in self.packages})
+            for package in self.packages:
+                self.assertEqual(BuildInfo.from_package(package).build, run)
+        with open(os.path.join(self.tempdir.name, 'build_numbers.json')) as f:
+            self.assertEqual(json.load(f), {'rev': 2})
+
+    def test_package_numbers(self):
+        self.stamp()
+        numbers = self.stamp()
+        self.assertEqual(numbers, {package: 2 for package in self.packages})
+
+
+class RomModeTest(unittest.TestCase):
+    '''Stamping into a ROM image.'''
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.package = os.path.join(self.tempdir.name, 'rom_pkg.vhd')
+        self.rom = os.path.join(self.tempdir.name, 'build_info.mif')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def stamp(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return stamp_rom(self.package, self.rom, NOW)
+
+    def test_restamp(self):
+        self.assertEqual(self.stamp(), 1)
+        self.assertEqual(self.stamp(), 2)
+        with open(self.rom) as f:
+            self.assertIn('2 : 00000002 ;', f.read())
+
+    def test_refuses_other_package(self):
+        with open(self.package, 'w') as f:
+            f.write('-- user edits\n')
+        with self.assertRaises(ValueError):
+            self.stamp()
+        with open(self.package) as f:
+            self.assertEqual(f.read(), '-- user edits\n')
+        self.assertFalse(os.path.exists(self.rom))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,105 +11,118 @@ set_global_assignment -name PRE_FLOW_SCRIPT_FILE
 The program will work with no command line arguments and the
 default value is specified in PKG_FILENAME global.  However the
 filename may be overridden using a commandline parameter '-o'.
+
+With '--rom' the build values are written to a ROM image instead
+and the package holds none, see build_rom.py.
 '''
 
 import os
-import time
 import re
-import tempfile
+import datetime
 import argparse
+from atomic_file import replace_text
+from build_counter import FileLock, counter_path, next_build_number
+from build_info import BuildInfo, BuildInfoError, sidecar_path
+from build_rom import check_rom_package, rom_format, stamp_rom
 
 PKG_FILENAME = 'system_build_info_pkg.vhd'
 
 
-def scanline(line):
+# Every line that gets stamped, matched by one alternation.  The named group
+# that matched tells which field the line holds.  Matching the constant
+# declaration (rather than just the name) lets users add vector conversions
+# of these numbers safely without the lines getting eaten.
+STAMP_RE = re.compile(
+    r'^.*(?:(?P<update>-- Last update :)'
+    r'|constant (?P<name>C_BUILD_TIME_(?:YEAR|MONTH|DAY|HOUR|MINUTE|SECOND)'
+    r'|C_BUILD_NUMBER)\b(?:.*:= (?P<value>[0-9]+);)?).*$',
+    re.MULTILINE)
+
+# Replacement line for each stamped field.
+STAMP_LINES = {
+    'C_BUILD_TIME_YEAR': '\tconstant C_BUILD_TIME_YEAR   : integer := {:%Y};',
+    'C_BUILD_TIME_MONTH': '\tconstant C_BUILD_TIME_MONTH  : integer := {:%m};',
+    'C_BUILD_TIME_DAY': '\tconstant C_BUILD_TIME_DAY    : integer := {:%d};',
+    'C_BUILD_TIME_HOUR': '\tconstant C_BUILD_TIME_HOUR   : integer := {:%H};',
+    'C_BUILD_TIME_MINUTE': '\tconstant C_BUILD_TIME_MINUTE : integer := {:%M};',
+    'C_BUILD_TIME_SECOND': '\tconstant C_BUILD_TIME_SECOND : integer := {:%S};',
+}
+
+
+def stamp_text(text, now=None, build_num=None):
+    '''
+    Rewrites the contents of a build package in a single pass, stamping
+    every field from the same time snapshot so a second boundary can not
+    fall between them.  now is a datetime and defaults to the current local
+    time.  The build number found is incremented unless build_num gives the
+    number to use.  Returns a tuple of the new text and the build number
+    (None if the text has no C_BUILD_NUMBER constant).
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+    stamped_num = None
+
+    def replace(match):
+        nonlocal stamped_num
+        if match.group('update'):
+            return '-- Last update : {:%c}'.format(now)
+        name = match.group('name')
+        if name == 'C_BUILD_NUMBER':
+            # This one is special as it increments the number found.
+            if build_num is None:
+                stamped_num = int(match.group('value') or 0) + 1
+            else:
+                stamped_num = build_num
+            return '\tconstant C_BUILD_NUMBER : integer := {};'.format(stamped_num)
+        return STAMP_LINES[name].format(now)
+
+    return STAMP_RE.sub(replace, text), stamped_num
+
+
+def scanline(line, now=None):
     '''Scans a line for a number of predefined
     text strings and replaces if found.'''
-    # Acquire the current time and setup some variables with
-    # strings of the contents.
-    longform_date = time.strftime('%c', time.localtime())
-    year = time.strftime('%Y', time.localtime())
-    month = time.strftime('%m', time.localtime())
-    day = time.strftime('%d', time.localtime())
-    hour = time.strftime('%H', time.localtime())
-    minute = time.strftime('%M', time.localtime())
-    second = time.strftime('%S', time.localtime())
-
-    # Search for the following patterns and recreate the line if found.
-    if re.search(r'-- Last update :', line):
-        line = '-- Last update : {}\n'.format(longform_date)
-
-    # Note, searching for the constant declaration line so users can
-    # add vector conversions of these numbers safely without the lines
-    # getting eaten.
-    if re.search(r'constant C_BUILD_TIME_YEAR', line):
-        line = '\tconstant C_BUILD_TIME_YEAR   : integer := {};\n'.format(year)
-
-    if re.search(r'constant C_BUILD_TIME_MONTH', line):
-        line = '\tconstant C_BUILD_TIME_MONTH  : integer := {};\n'.format(month)
-
-    if re.search(r'constant C_BUILD_TIME_DAY', line):
-        line = '\tconstant C_BUILD_TIME_DAY    : integer := {};\n'.format(day)
-
-    if re.search(r'constant C_BUILD_TIME_HOUR', line):
-        line = '\tconstant C_BUILD_TIME_HOUR   : integer := {};\n'.format(hour)
-
-    if re.search(r'constant C_BUILD_TIME_MINUTE', line):
-        line = '\tconstant C_BUILD_TIME_MINUTE : integer := {};\n'.format(minute)
-
-    if re.search(r'constant C_BUILD_TIME_SECOND', line):
-        line = '\tconstant C_BUILD_TIME_SECOND : integer := {};\n'.format(second)
-
-    # This one is special as it searches for the constant, then increments
-    # the number.
-    if re.search(r'constant C_BUILD_NUMBER\b', line):
-        s = re.search(r':= ([0-9]+);', line)
-        build_num = int(s.group(1)) + 1
-        print('Build number: {}'.format(build_num))
-        line = '\tconstant C_BUILD_NUMBER : integer := {};\n'.format(build_num)
-
-    return line
-
-def update_file(filename):
+    return stamp_text(line, now)[0]
+
+
+def write_sidecar(filename, text):
+    '''
+    Writes the JSON sidecar holding the build information of the package
+    just stamped, for post-build steps to read instead of the VHDL.
+    '''
+    try:
+        info = BuildInfo.from_text(text, filename)
+    except BuildInfoError as err:
+        print('No build information sidecar written: {}'.format(err))
+        return
+    info.write_sidecar(sidecar_path(filename))
+
+
+def update_file(filename, now=None, build_num=None):
     '''
     Opens the file and scans for fields, replacing them
-    with the appropriate time information.
+    with the appropriate time information.  The file is
+    replaced atomically.  Returns the new build number.
+    Callers running in parallel must hold the package
+    lock, see stamp_package.
     '''
-    longform_date = time.strftime('%c', time.localtime())
+    if now is None:
+        now = datetime.datetime.now()
     print('=================================================================')
-    print('Updating system build package with time: {}'.format(longform_date))
-    # Open the original, and a temp file.  Not using contexts
-    # because I want to control the file handling.
-    f_in = open(filename, 'r')
-    f_temp = tempfile.TemporaryFile(mode='r+')
-
-    # Examine each line and write a potentially modified
-    # version to the tempfile.
-    for line in f_in:
-        newline = scanline(line)
-        f_temp.write(newline)
-
-    # Close the read context on the file, and reopen as
-    # write (overwriting.).  Rewind temp file.
-    f_temp.seek(0)
-    f_in.close()
-    f_out = open(filename, 'w')
-
-    # Rewrite the file from temporary contents.
-    for line in f_temp:
-        f_out.write(line)
-
-    # Close all files.  Temp file will be destroyed.
-    f_out.close()
-    f_temp.close()
+    print('Updating system build package with time: {:%c}'.format(now))
+    with open(filename, 'r') as f_in:
+        text, build_num = stamp_text(f_in.read(), now, build_num)
+    print('Build number: {}'.format(build_num))
+    replace_text(filename, text)
+    write_sidecar(filename, text)
     print('Update complete')
     print('=================================================================')
+    return build_num
 
-def create_file(filename):
+def create_file(filename, now=None, build_num=None):
     '''
-    Creates a file with the contents desired.  Uses a temp
-    file and then scans it and writes it back into the real file
-    because scanline was intended to work on a line by line basis.
+    Creates a file with the contents desired, stamped the same
+    way as an update.  Returns the new build number.
     '''
     # This is the file contents to be written.
     package_str = '''-------------------------------------------------------------------------------
@@ -187,28 +200,64 @@ package system_build_info is
 end package system_build_info;
 '''.format(filename)
 
-    longform_date = time.strftime('%c', time.localtime())
+    if now is None:
+        now = datetime.datetime.now()
     print('=================================================================')
-    print('Creating system build package with time: {}'.format(longform_date))
-
-    f_temp = tempfile.TemporaryFile(mode='r+')
-    f_temp.write(package_str)
-
-    # Close the read context on the file, and reopen as
-    # write (overwriting.).  Rewind temp file.
-    f_temp.seek(0)
-    f_out = open(filename, 'w')
-
-    # Rewrite the file from temporary contents.
-    for line in f_temp:
-        newline = scanline(line)
-        f_out.write(newline)
-
-    # Close all files.  Temp file will be destroyed.
-    f_out.close()
-    f_temp.close()
+    print('Creating system build package with time: {:%c}'.format(now))
+    text, build_num = stamp_text(package_str, now, build_num)
+    print('Build number: {}'.format(build_num))
+    replace_text(filename, text)
+    write_sidecar(filename, text)
     print('Creation complete')
     print('=================================================================')
+    return build_num
+
+
+def stamp_package(filename, now=None, revision=None, counter_file=None,
+                  rom=None, build_num=None):
+    '''
+    Updates the package if it exists, otherwise creates it.  Returns the
+    new build number.  The package is locked for the whole update so
+    builds running in parallel each get a different number.  With a
+    revision, the number comes from that revision's counter in the counter
+    file (by default build_numbers.json beside the package) instead of
+    incrementing the one in the package.  build_num gives a number already
+    allocated instead.  With a rom filename the values are stamped into
+    that ROM image instead of the package.
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+    with FileLock(filename):
+        if build_num is None and revision:
+            build_num = next_build_number(counter_path(filename, counter_file),
+                                          revision)
+        if rom:
+            return stamp_rom(filename, rom, now, build_num)
+        # First check to see if the file exists.  Assuming that
+        # we are properly keeping source files in a separate
+        # directory from where the project is installed.
+        if os.path.isfile(filename):
+            return update_file(filename, now, build_num)
+        return create_file(filename, now, build_num)
+
+
+def stamp_packages(filenames, now=None, revision=None, counter_file=None):
+    '''
+    Stamps several packages with one time snapshot, for build scripts that
+    maintain a package per design.  With a revision, one build number is
+    allocated for the run (from the counter file beside the first package
+    by default) and every package gets it.  Returns a dictionary of the new
+    build number of each file.
+    '''
+    if now is None:
+        now = datetime.datetime.now()
+    build_num = None
+    if revision:
+        build_num = next_build_number(counter_path(filenames[0], counter_file),
+                                      revision)
+    return {filename: stamp_package(filename, now, revision, counter_file,
+                                    build_num=build_num)
+            for filename in filenames}
 
 
 def main():
@@ -225,17 +274,40 @@ def main():
         intended to be run just prior to building the design.''')
     parser.add_argument(
         '-o', '--output_file',
-        help='VHDL package output filename.  Default: {}'.format(PKG_FILENAME),
-        default=PKG_FILENAME)
+        nargs='+',
+        help='''VHDL package output filename(s).  Several packages are
+        stamped with the same time.  Default: {}'''.format(PKG_FILENAME),
+        default=[PKG_FILENAME])
+    parser.add_argument(
+        '-r', '--revision',
+        help='''Takes the build number from a counter kept for this
+        revision (e.g. the Quartus revision or seed) instead of incrementing
+        the number in the package.  Default: no revision counter''')
+    parser.add_argument(
+        '-c', '--counter_file',
+        help='''JSON file holding the revision counters.  Default:
+        build_numbers.json in the package directory''')
+    parser.add_argument(
+        '--rom',
+        help='''Stamps the build values into this ROM image (.mif or
+        .mem) and writes a package without them that instantiates the
+        ROM, so a new stamp does not require synthesis.  Default: stamp
+        the package''')
     args = parser.parse_args()
 
-    # First check to see if the file exists.  Assuming that
-    # we are properly keeping source files in a separate
-    # directory from where the project is installed.
-    if os.path.isfile(args.output_file):
-        update_file(args.output_file)
-    else:
-        create_file(args.output_file)
+    if args.rom:
+        if len(args.output_file) > 1:
+            parser.error('--rom takes a single output file')
+        try:
+            rom_format(args.rom)
+            check_rom_package(args.output_file[0])
+        except ValueError as err:
+            parser.error(str(err))
+        stamp_package(args.output_file[0], revision=args.revision,
+                      counter_file=args.counter_file, rom=args.rom)
+        return
+    stamp_packages(args.output_file, revision=args.revision,
+                   counter_file=args.counter_file)
 
 if __name__ == '__main__':
     main()
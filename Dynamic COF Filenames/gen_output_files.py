@@ -0,0 +1,190 @@
+#! python 3
+'''
+Generates the output files for the project at build end, the Python
+counterpart of gen_output_files.tcl.  For every COF file it:
+
+    1. Stamps the output filename in the COF with the version, build time
+       and build number (see update_cof_filename.py).
+    2. Copies the SOF named in the COF beside the output file, with the
+       output file's name and a .sof extension.
+    3. Runs the converter (quartus_cpf -c <cof>) on the COF.
+    4. Renames the <output>_auto.rpd file the converter may produce to
+       <output>.rpd.
+
+The COF updates and SOF copies are quick and done first.  The conversions
+are independent of each other and run concurrently, one converter process
+per COF up to --jobs at a time.  Each step is timed and the timings are
+reported at the end.  The converter command is configurable, so the flow can
+be exercised with a stand-in script in place of quartus_cpf.
+'''
+import os
+import sys
+import time
+import shlex
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from update_cof_filename import (BuildInfoError, CofError, add_cof_arguments,
+                                 cof_jobs, parse_build_info,
+                                 read_cof_filenames, run_job, update_cof,
+                                 update_cof_full_parse)
+
+CONVERTER = 'quartus_cpf -c'
+
+
+class OutputFiles:
+    '''
+    Class holding the progress of one COF file through the steps: the
+    report lines, the time taken by each step and whether all succeeded.
+    '''
+
+    def __init__(self, job):
+        self.job = job
+        self.lines = []
+        self.timings = []
+        self.ok = True
+        self.output_filename = None
+        self.sof_filename = None
+
+    @property
+    def base(self):
+        '''Output filename without its extension.'''
+        return os.path.splitext(self.output_filename)[0]
+
+    def step(self, name, func, *args):
+        '''Runs func(*args) as a timed step.  Errors are reported and mark
+        the files as failed.  Returns the result, None on error.'''
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except (OSError, CofError, subprocess.SubprocessError) as err:
+            self.lines.append('Error: {}'.format(err))
+            self.ok = False
+            return None
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
+
+def update_step(files, build_str, update):
+    '''Stamps the COF file and reads back its output and SOF filenames.'''
+    lines, ok = run_job(files.job, build_str, update)
+    files.lines.extend(lines)
+    if not ok:
+        files.ok = False
+        return
+    files.output_filename, files.sof_filename = read_cof_filenames(
+        files.job.cof_filename)
+    if files.sof_filename is None:
+        raise CofError('{} has no <sof_filename> element'.format(
+            files.job.cof_filename))
+
+
+def copy_sof(files):
+    '''Copies the SOF beside the output file.'''
+    dest_filename = files.base + '.sof'
+    files.lines.append('Copying {} to {}'.format(files.sof_filename, dest_filename))
+    directory = os.path.dirname(dest_filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    shutil.copy2(files.sof_filename, dest_filename)
+
+
+def convert(files, converter):
+    '''Runs the converter on the COF file, then renames the _auto.rpd file
+    if it made one.'''
+    cmd = converter + [files.job.cof_filename]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, universal_newlines=True)
+    files.lines.append('$ {}'.format(' '.join(cmd)))
+    files.lines.extend(result.stdout.splitlines())
+    if result.returncode:
+        raise subprocess.CalledProcessError(result.returncode, cmd)
+    auto_rpd = files.base + '_auto.rpd'
+    try:
+        os.replace(auto_rpd, files.base + '.rpd')
+    except FileNotFoundError:
+        return
+    files.lines.append('Renamed {} to {}.rpd'.format(auto_rpd, files.base))
+
+
+def generate(jobs, build_str, converter, update=update_cof, workers=None):
+    '''
+    Runs all the steps for each job.  Returns the OutputFiles of each job
+    and a list of (phase, seconds) wall clock timings.
+    '''
+    all_files = [OutputFiles(job) for job in jobs]
+    phases = []
+
+    start = time.perf_counter()
+    for files in all_files:
+        files.step('update COF', update_step, files, build_str, update)
+    # COFs differing only in suffix share the SOF copy, so copy each once.
+    copied = set()
+    for files in all_files:
+        if not files.ok or files.base in copied:
+            continue
+        copied.add(files.base)
+        files.step('copy SOF', copy_sof, files)
+    phases.append(('update and copy', time.perf_counter() - start))
+
+    start = time.perf_counter()
+    ready = [files for files in all_files if files.ok]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda files: files.step('convert', convert, files, converter),
+                      ready))
+    phases.append(('convert', time.perf_counter() - start))
+    return all_files, phases
+
+
+def main():
+    '''
+    Main entry point for command line usage
+    '''
+    parser = argparse.ArgumentParser(
+        prog='gen_output_files',
+        description='''Stamps the output filenames of Altera COF files with
+        the build version, time and number, copies the SOF files and runs
+        the conversions concurrently.''')
+    add_cof_arguments(parser)
+    parser.add_argument(
+        '--converter',
+        help='The converter command, run with the COF filename appended.  '
+             'Default: {}'.format(CONVERTER),
+        default=CONVERTER)
+    parser.add_argument(
+        '-j', '--jobs',
+        help='Number of conversions to run at once.  Default: one per CPU',
+        type=int)
+    args = parser.parse_args()
+    jobs = cof_jobs(parser, args)
+
+    print('=================================================================')
+    print('Reading {}'.format(args.build_file))
+    try:
+        build_str = parse_build_info(args.build_file)
+    except (OSError, BuildInfoError) as err:
+        print('Error: {}'.format(err))
+        sys.exit(1)
+    update = update_cof_full_parse if args.full_parse else update_cof
+    all_files, phases = generate(jobs, build_str, shlex.split(args.converter),
+                                 update, args.jobs)
+
+    for files in all_files:
+        print('-----------------------------------------------------------------')
+        for line in files.lines:
+            print(line)
+    print('-----------------------------------------------------------------')
+    print('Timings:')
+    for files in all_files:
+        for name, seconds in files.timings:
+            print('  {:<30} {:<12} {:8.3f} s'.format(files.job.cof_filename, name, seconds))
+    for name, seconds in phases:
+        print('  {:<43} {:8.3f} s'.format(name, seconds))
+    print('=================================================================')
+    if not all(files.ok for files in all_files):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
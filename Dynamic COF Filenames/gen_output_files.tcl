@@ -1,8 +1,26 @@
 # Generates the output files for the project automatically at build end.
 # Uses the Python program update_cof_filename to automatically version, date,
-# time, and build stamp the file name.
+# time, and build stamp the file name.  The calls go through build_client.py,
+# which hands them to build_server.py when that is running.
 proc call_update_cof_python {prefix suffix dir filename} {
-	set output [exec python ../bin/update_cof_filename.py -p $prefix -s $suffix -d $dir -b ../src/system_build_info_pkg.vhd $filename]
+	set output [exec python ../bin/build_client.py cof -p $prefix -s $suffix -d $dir -b ../src/system_build_info_pkg.vhd $filename]
+	post_message $output
+}
+
+# Updates several COF files in one run of update_cof_filename.  Each entry of
+# cofs is a list of {prefix suffix dir filename}.  A # comment can not go
+# inside the braces of the list, so an entry whose first word is # is skipped
+# instead: {# prefix suffix dir filename}.
+proc call_update_cof_python_batch {cofs} {
+	set cmd [list python ../bin/build_client.py cof -b ../src/system_build_info_pkg.vhd]
+	foreach cof $cofs {
+		if {[lindex $cof 0] eq "#"} {
+			continue
+		}
+		lassign $cof prefix suffix dir filename
+		lappend cmd -c $filename $prefix $suffix $dir
+	}
+	set output [exec {*}$cmd]
 	post_message $output
 }
 
@@ -31,9 +49,10 @@ proc copy_sof_file {filename} \
 post_message "Executing generate_outputfiles.tcl script..."
 post_message "================================================================="
 post_message "Generating output filenames in COF files..."
-call_update_cof_python onx10k_fpga jic ../dev_firmware onx10k_fpga_jic.cof
-#call_update_cof_python onx10k_fpga rbf ../dev_firmware onx10k_fpga_crbf.cof
-#post_message "================================================================="
+call_update_cof_python_batch {
+	{onx10k_fpga jic ../dev_firmware onx10k_fpga_jic.cof}
+	{# onx10k_fpga rbf ../dev_firmware onx10k_fpga_crbf.cof}
+}
 set filebase [copy_sof_file onx10k_fpga_jic.cof]
 post_message "Generating JTAG Indirect Compressed Flash File (*.jic)..."
 set cmd [exec quartus_cpf -c ../project/onx10k_fpga_jic.cof]
@@ -0,0 +1,88 @@
+#! python 3
+'''Tests for gen_output_files.  Run with pytest from this directory.'''
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from gen_output_files import generate
+from update_cof_filename import CofJob, read_cof_filenames
+
+COF_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'onx10k_fpga_jic.cof')
+BUILD_STR = 'v0.0.1_20190301_141248_Build_457'
+
+# Stand-in for quartus_cpf -c: writes the output file named in the COF, and
+# the _auto.rpd file too if given --rpd.  Exits with 1 if given --fail.
+CONVERTER = '''
+import os
+import re
+import sys
+
+if '--fail' in sys.argv:
+    print('conversion failed')
+    sys.exit(1)
+with open(sys.argv[-1]) as f:
+    output_filename = re.search('<output_filename>(.*)</output_filename>',
+                                f.read()).group(1)
+with open(output_filename, 'w') as f:
+    f.write('jic')
+if '--rpd' in sys.argv:
+    with open(os.path.splitext(output_filename)[0] + '_auto.rpd', 'w') as f:
+        f.write('rpd')
+print('converted')
+'''
+
+
+class ConvertTest(unittest.TestCase):
+    '''The conversion step, run with a stand-in converter.'''
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        cof = os.path.join(self.tempdir.name, 'onx10k_fpga_jic.cof')
+        shutil.copy(COF_FILENAME, cof)
+        sof = os.path.join(self.tempdir.name, 'top.sof')
+        with open(sof, 'w') as f:
+            f.write('sof')
+        self.job = CofJob(cof, 'onx10k_fpga', 'jic',
+                          os.path.join(self.tempdir.name, 'out'), sof)
+        self.script = os.path.join(self.tempdir.name, 'fake_cpf.py')
+        with open(self.script, 'w') as f:
+            f.write(CONVERTER)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def convert(self, *options):
+        converter = [sys.executable, self.script] + list(options)
+        all_files, phases = generate([self.job], BUILD_STR, converter, workers=1)
+        files = all_files[0]
+        return files, os.path.splitext(files.output_filename)[0]
+
+    def test_auto_rpd(self):
+        files, base = self.convert('--rpd')
+        self.assertTrue(files.ok, files.lines)
+        self.assertIn('converted', files.lines)
+        self.assertTrue(os.path.isfile(base + '.jic'))
+        self.assertTrue(os.path.isfile(base + '.sof'))
+        self.assertTrue(os.path.isfile(base + '.rpd'))
+        self.assertFalse(os.path.exists(base + '_auto.rpd'))
+
+    def test_no_auto_rpd(self):
+        files, base = self.convert()
+        self.assertTrue(files.ok, files.lines)
+        self.assertTrue(os.path.isfile(base + '.jic'))
+        self.assertFalse(os.path.exists(base + '.rpd'))
+        self.assertFalse(any(line.startswith('Renamed') for line in files.lines))
+
+    def test_converter_fails(self):
+        files, base = self.convert('--fail')
+        self.assertFalse(files.ok)
+        self.assertIn('conversion failed', files.lines)
+        self.assertTrue(files.lines[-1].startswith('Error: '))
+        self.assertEqual(read_cof_filenames(self.job.cof_filename)[0],
+                         files.output_filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
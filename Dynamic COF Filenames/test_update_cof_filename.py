@@ -0,0 +1,70 @@
+#! python 3
+'''Tests for update_cof_filename.  Run with pytest from this directory.'''
+import io
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+from update_cof_filename import (CofJob, run_jobs, update_cof,
+                                 update_cof_full_parse)
+
+try:
+    import lxml
+except ImportError:
+    lxml = None
+
+COF_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            'onx10k_fpga_jic.cof')
+BUILD_STR = 'v0.0.1_20190301_141248_Build_457'
+
+
+class BatchErrorTest(unittest.TestCase):
+    '''A malformed COF in a batch is reported on its own.'''
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.good = os.path.join(self.tempdir.name, 'good.cof')
+        self.bad = os.path.join(self.tempdir.name, 'bad.cof')
+        shutil.copy(COF_FILENAME, self.good)
+        with open(self.bad, 'w') as f:
+            f.write('<cof><output_filename>x.jic</cof>\n')
+        self.jobs = [CofJob(self.bad, 'bad', 'jic'), CofJob(self.good, 'good', 'jic')]
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def run_batch(self, update):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            ok = run_jobs(self.jobs, BUILD_STR, update, 2)
+        return ok, output.getvalue()
+
+    def good_output_filename(self):
+        with open(self.good) as f:
+            return 'good_{}.jic'.format(BUILD_STR) in f.read()
+
+    @unittest.skipUnless(lxml, 'lxml is not installed')
+    def test_full_parse_malformed(self):
+        ok, output = self.run_batch(update_cof_full_parse)
+        self.assertFalse(ok)
+        self.assertIn('Error: {} is not well formed'.format(self.bad), output)
+        self.assertTrue(self.good_output_filename())
+
+    def test_full_parse_without_lxml(self):
+        with mock.patch.dict(sys.modules, {'lxml': None}):
+            ok, output = self.run_batch(update_cof_full_parse)
+        self.assertFalse(ok)
+        self.assertEqual(output.count('Error: --full_parse requires lxml'), 2)
+
+    def test_in_place_malformed(self):
+        ok, output = self.run_batch(update_cof)
+        self.assertFalse(ok)
+        self.assertIn('Error: COF file has no <output_filename> element', output)
+        self.assertTrue(self.good_output_filename())
+
+
+if __name__ == '__main__':
+    unittest.main()
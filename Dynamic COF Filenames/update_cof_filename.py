@@ -6,110 +6,266 @@ different types.  What we'd like to do is dynamically update the
 filename based on the version, build time, and build number.  This
 information is generated at the beginning of the build time and stored in
 the file system_build_info_pkg.vhd in the source directory.
+
+By default the COF is edited as text: the contents of the <output_filename>
+element (and optionally the first <sof_filename>) are substituted in a
+single pass and every other byte of the file is kept as it is.  The XML
+declaration is written with the double quotes Quartus requires.  lxml is only
+imported for the --full_parse path, which rewrites the whole document.
+
+Any number of COF files can be updated in one run, each with its own output
+filename prefix, suffix and directory, given with --cof or in a JSON
+manifest:
+
+    [
+        {"cof": "onx10k_fpga_jic.cof", "prefix": "onx10k_fpga",
+         "suffix": "jic", "directory": "../dev_firmware"},
+        {"cof": "onx10k_fpga_crbf.cof", "prefix": "onx10k_fpga",
+         "suffix": "rbf", "directory": "../dev_firmware"}
+    ]
+
+The build information is read once and the files are written concurrently.
 '''
 import os
 import re
+import sys
+import json
 import argparse
-import tempfile
-from lxml import etree
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape, unescape
+try:
+    from atomic_file import replace_bytes, replace_text
+    from build_info import BuildInfo, BuildInfoError
+except ImportError:
+    # Running from the source tree rather than an installed bin directory,
+    # the shared modules live with update_build_time.py.
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 '..', 'Build Version Package Generator'))
+    from atomic_file import replace_bytes, replace_text
+    from build_info import BuildInfo, BuildInfoError
 
 SRC_FILE = "system_build_info_pkg.vhd"
 OUTPUT_DIR = "../dev_firmware"
 OUTPUT_FILENAME_PREFIX = "projectname"
 OUTPUT_FILENAME_SUFFIX = "bin"
 
+# The COF is US-ASCII.  It is edited as latin-1 text so any stray bytes
+# round trip unchanged.
+COF_ENCODING = 'latin-1'
+DECLARATION = '<?xml version="1.0" encoding="US-ASCII" standalone="yes"?>'
+DECLARATION_RE = re.compile(r'\A<\?xml\b[^>]*\?>')
+ELEMENT_RE = re.compile(
+    r'<(?P<tag>output_filename|sof_filename)>(?P<text>[^<]*)</(?P=tag)>')
+
+
+class CofError(ValueError):
+    '''Raised when a COF file lacks the elements to be updated.'''
+
+
+class CofJob:
+    '''
+    Class holding one COF file to update and the parts of its output
+    filename.
+    '''
+
+    def __init__(self, cof_filename, prefix=OUTPUT_FILENAME_PREFIX,
+                 suffix=OUTPUT_FILENAME_SUFFIX, directory='', sof=None):
+        self.cof_filename = cof_filename
+        self.prefix = prefix
+        self.suffix = suffix
+        self.directory = directory
+        self.sof = sof
+
+    def output_filename(self, build_str):
+        '''Returns the output filename for the build stamp.'''
+        new_filename = '{}_{}.{}'.format(self.prefix, build_str, self.suffix)
+        if self.directory:
+            new_filename = self.directory + '/' + new_filename
+        return new_filename
+
+
+def load_manifest(filename):
+    '''
+    Reads a JSON manifest, a list of objects with a 'cof' filename and
+    optional 'prefix', 'suffix', 'directory' and 'sof' keys.  Returns a list
+    of CofJob.
+    '''
+    with open(filename, 'r') as f:
+        entries = json.load(f)
+    jobs = []
+    for entry in entries:
+        if 'cof' not in entry:
+            raise CofError('{}: manifest entry has no "cof" key: {}'.format(
+                filename, entry))
+        jobs.append(CofJob(entry['cof'],
+                           entry.get('prefix', OUTPUT_FILENAME_PREFIX),
+                           entry.get('suffix', OUTPUT_FILENAME_SUFFIX),
+                           entry.get('directory', ''),
+                           entry.get('sof')))
+    return jobs
+
+
+def run_job(job, build_str, update):
+    '''
+    Updates the COF file of one job.  Returns the lines to report and
+    whether it succeeded.
+    '''
+    new_filename = job.output_filename(build_str)
+    lines = ['Updating {}'.format(job.cof_filename),
+             'Output filename: {}'.format(new_filename)]
+    try:
+        written = update(job.cof_filename, new_filename, job.sof)
+    except (OSError, CofError) as err:
+        lines.append('Error: {}'.format(err))
+        return lines, False
+    if written:
+        lines.append('Update complete.')
+    else:
+        lines.append('Output filename unchanged, COF file left as is.')
+    return lines, True
+
+
+def run_jobs(jobs, build_str, update, workers=None):
+    '''
+    Updates the COF files of all jobs, concurrently when there are several,
+    and prints each job's report in order.  Returns True if all succeeded.
+    '''
+    if len(jobs) == 1:
+        results = [run_job(jobs[0], build_str, update)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(
+                lambda job: run_job(job, build_str, update), jobs))
+    ok = True
+    for idx, (lines, success) in enumerate(results):
+        if idx:
+            print('-----------------------------------------------------------------')
+        for line in lines:
+            print(line)
+        ok = ok and success
+    return ok
+
 
 def parse_build_info(filename):
     '''
     Method for reading the generated data out of the system build info
-    source file.
+    source file, or the JSON sidecar update_build_time.py writes beside it
+    when that is up to date.  Returns the version, time and build stamp for
+    the filename.  Raises BuildInfoError naming any missing constants.
+    '''
+    return BuildInfo.load(filename).stamp()
+
+
+def element_text(value):
+    '''Returns value escaped as US-ASCII XML element text.'''
+    return escape(value).encode('ascii', 'xmlcharrefreplace').decode('ascii')
+
 
-    TODO: Make the searches more robust and permit failing operations
-    (just in case).
+def edit_cof_text(text, output_filename, sof_filename=None):
     '''
-    with open(filename, 'r') as f:
-        for line in f:
+    Returns the COF text with the <output_filename> element (and the first
+    <sof_filename> element when sof_filename is given) set, in one pass over
+    the text.  Nothing outside those elements changes except the quotes of
+    the XML declaration, which is added if missing.  Raises CofError if an
+    element to be set is not present.
+    '''
+    values = {'output_filename': output_filename}
+    if sof_filename is not None:
+        values['sof_filename'] = sof_filename
 
-            if re.search(r'constant C_BUILD_VERSION_STR\b', line):
-                s = re.search(r':=\s*"([0-9_AB.]*)"', line)
-                version = s.group(1)
+    def substitute(match):
+        tag = match.group('tag')
+        if tag not in values:
+            return match.group(0)
+        value = values.pop(tag)
+        return '<{0}>{1}</{0}>'.format(tag, element_text(value))
 
-            if re.search(r'constant C_BUILD_TIME_YEAR\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                year = s.group(1)
+    text = ELEMENT_RE.sub(substitute, text)
+    if values:
+        raise CofError('COF file has no <{}> element'.format(
+            '>, <'.join(sorted(values))))
 
-            if re.search(r'constant C_BUILD_TIME_MONTH\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                month = s.group(1)
+    match = DECLARATION_RE.match(text)
+    if match:
+        return match.group(0).replace('\'', '"') + text[match.end():]
+    newline = '\r\n' if '\r\n' in text else '\n'
+    return DECLARATION + newline + text
 
-            if re.search(r'constant C_BUILD_TIME_DAY\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                day = s.group(1)
 
-            if re.search(r'constant C_BUILD_TIME_HOUR\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                hour = s.group(1)
+def read_cof_filenames(cof_filename):
+    '''Returns the output filename and first SOF filename of a COF file,
+    None for either if absent.'''
+    with open(cof_filename, 'rb') as f:
+        text = f.read().decode(COF_ENCODING)
+    found = {}
+    for match in ELEMENT_RE.finditer(text):
+        found.setdefault(match.group('tag'), unescape(match.group('text')))
+    return found.get('output_filename'), found.get('sof_filename')
 
-            if re.search(r'constant C_BUILD_TIME_MINUTE\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                minute = s.group(1)
 
-            if re.search(r'constant C_BUILD_TIME_SECOND\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                second = s.group(1)
+def update_cof(cof_filename, output_filename, sof_filename=None):
+    '''
+    Updates a COF file in place with edit_cof_text.  Returns True if the
+    file was written, False if it already held the filenames.
+    '''
+    with open(cof_filename, 'rb') as f:
+        text = f.read().decode(COF_ENCODING)
+    text = edit_cof_text(text, output_filename, sof_filename)
+    return replace_bytes(cof_filename, text.encode(COF_ENCODING))
 
-            if re.search(r'constant C_BUILD_NUMBER\b', line):
-                s = re.search(r':= ([0-9]+);', line)
-                build = s.group(1)
 
-    # Form string out of the various bits
-    return "v{}_{}{}{}_{}{}{}_Build_{}".format(version, year, month, day,
-                                              hour, minute, second, build)
+def update_cof_full_parse(cof_filename, output_filename, sof_filename=None):
+    '''
+    Updates a COF file by parsing and rewriting the whole document with
+    lxml, which normalises its formatting.  Returns True if the file was
+    written.  Raises CofError if lxml is not installed or the COF is not
+    well formed XML.
+    '''
+    try:
+        from lxml import etree
+    except ImportError:
+        raise CofError('--full_parse requires lxml, which is not installed') from None
+    try:
+        cof_et = etree.parse(cof_filename)
+    except etree.XMLSyntaxError as err:
+        raise CofError('{} is not well formed: {}'.format(cof_filename, err)) from None
+    values = {'output_filename': output_filename}
+    if sof_filename is not None:
+        values['sof_filename'] = sof_filename
+    for tag, value in values.items():
+        element = cof_et.find('.//' + tag)
+        if element is None:
+            raise CofError('COF file has no <{}> element'.format(tag))
+        element.text = value
+    cof_xml = etree.tostring(cof_et, xml_declaration=True, encoding='US-ASCII',
+                             standalone=True).decode('ascii')
+    return replace_text(cof_filename, quote_hack(cof_xml))
 
 
-def quote_hack(filename):
+def quote_hack(text):
     '''
     This is a method that corrects for a bug in the XML in Quartus.  The XML
     spec says that the strings in the XML declaration may be delimited by
     either single or double quotes.  Quartus's tool only supports double
     quotes.  lxml ElementTree only produces single quotes.  This method
     looks for the xml declaration and changes all single quotes on that line
-    to double quotes.
+    to double quotes.  Returns the corrected text.
     '''
-    f_in = open(filename, 'r')
-    f_temp = tempfile.TemporaryFile(mode='r+')
-    for line in f_in:
+    lines = text.splitlines(keepends=True)
+    for idx, line in enumerate(lines):
         if re.search(r'<\?xml', line, re.I):
-            line = re.sub('\'', '"', line)
-        f_temp.write(line)
-    f_temp.seek(0)
-    f_in.close()
-    f_out = open(filename, 'w')
-    for line in f_temp:
-        f_out.write(line)
-    f_out.close()
-    f_temp.close()
+            lines[idx] = line.replace('\'', '"')
+    return ''.join(lines)
 
 
-def main():
-    '''
-    Main entry point for command line usage
-    '''
-    # Parse the system build file and create the new filename.
-    # Setup ArgParse class
-    parser = argparse.ArgumentParser(
-        prog='update_cof_filename',
-        description='''Alters the 'output_filename' key in the Altera
-        Convert Output File (*.cof) XML file to format the file with the
-        build version, time, and build number prior to running the
-        conversion.
-
-        The filename created will be of the format:
-            <filename prefix>_v<version>_<YYYYMMDD>_<HHMMSS>_<Build>
-        ''')
+def add_cof_arguments(parser):
+    '''Adds the arguments selecting the COF files, their output filenames
+    and the build package to an ArgumentParser.'''
     parser.add_argument(
         'cof_filename',
-        help='The Altera COF file to alter.  Mandatory field.')
+        help='The Altera COF files to alter, using the prefix, suffix and '
+             'directory options.',
+        nargs='*')
     parser.add_argument(
         '-p', '--prefix',
         help='The output filename prefix.  Default: {}'.format(OUTPUT_FILENAME_PREFIX),
@@ -122,27 +278,85 @@ def main():
         '-d', '--directory',
         help='The output filename directory.  Default: None',
         default="")
+    parser.add_argument(
+        '-c', '--cof',
+        help='A further COF file with its own output filename prefix, '
+             'suffix and directory ("" for none).  May be repeated.',
+        nargs=4, action='append', default=[],
+        metavar=('COF', 'PREFIX', 'SUFFIX', 'DIRECTORY'))
+    parser.add_argument(
+        '-m', '--manifest',
+        help='A JSON manifest listing further COF files to alter.')
     parser.add_argument(
         '-b', '--build_file',
         help='The system build package file.  Default: {}'.format(SRC_FILE),
         default=SRC_FILE)
+    parser.add_argument(
+        '--sof',
+        help='Also set the (first) sof_filename key of the COF files given '
+             'as arguments to this SOF file.')
+    parser.add_argument(
+        '--full_parse',
+        help='Parse and rewrite the whole COF with lxml rather than '
+             'editing the filename elements in place.',
+        action='store_true')
+
+
+def cof_jobs(parser, args):
+    '''Returns the CofJob list selected by the add_cof_arguments arguments,
+    exiting through the parser if there are none or a file repeats.'''
+    jobs = [CofJob(filename, args.prefix, args.suffix, args.directory, args.sof)
+            for filename in args.cof_filename]
+    jobs.extend(CofJob(*cof) for cof in args.cof)
+    if args.manifest:
+        try:
+            jobs.extend(load_manifest(args.manifest))
+        except (OSError, ValueError) as err:
+            parser.error('manifest: {}'.format(err))
+    if not jobs:
+        parser.error('no COF files given')
+    cof_paths = [os.path.normcase(os.path.abspath(job.cof_filename)) for job in jobs]
+    if len(set(cof_paths)) != len(cof_paths):
+        parser.error('a COF file is given more than once')
+    return jobs
+
+
+def main():
+    '''
+    Main entry point for command line usage
+    '''
+    # Parse the system build file and create the new filename.
+    # Setup ArgParse class
+    parser = argparse.ArgumentParser(
+        prog='update_cof_filename',
+        description='''Alters the 'output_filename' key in the Altera
+        Convert Output File (*.cof) XML file to format the file with the
+        build version, time, and build number prior to running the
+        conversion.
+
+        The filename created will be of the format:
+            <filename prefix>_v<version>_<YYYYMMDD>_<HHMMSS>_<Build>
+        ''')
+    add_cof_arguments(parser)
+    parser.add_argument(
+        '-j', '--jobs',
+        help='Number of COF files to write at once.  Default: one per CPU',
+        type=int)
     args = parser.parse_args()
+    jobs = cof_jobs(parser, args)
 
     print('=================================================================')
     print('Reading {}'.format(args.build_file))
-    build_str = parse_build_info(args.build_file)
-    new_filename = '{}_{}.{}'.format(args.prefix, build_str, args.suffix)
-    if args.directory:
-        new_filename = args.directory + '/' + new_filename
-    print('Updating {}'.format(args.cof_filename))
-    print('Output filename: {}'.format(new_filename))
-    cof_et = etree.parse(args.cof_filename)
-    output_file = cof_et.find('output_filename')
-    output_file.text = new_filename
-    cof_et.write(args.cof_filename, xml_declaration=True, encoding='US-ASCII', standalone="yes")
-    quote_hack(args.cof_filename)
-    print('Update complete.')
+    try:
+        build_str = parse_build_info(args.build_file)
+    except (OSError, BuildInfoError) as err:
+        print('Error: {}'.format(err))
+        sys.exit(1)
+    update = update_cof_full_parse if args.full_parse else update_cof
+    ok = run_jobs(jobs, build_str, update, args.jobs)
     print('=================================================================')
+    if not ok:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
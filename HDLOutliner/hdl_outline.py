@@ -3,6 +3,8 @@
 
 import re
 import os
+import sys
+import argparse
 from collections import defaultdict
 from timeit import default_timer as timer
 start = timer()
@@ -579,6 +581,110 @@ class EntityTreeItem:
         self.instance_used = []
 
 
+def instance_target(instance):
+    """Returns the name of the entity or module an instance instantiates."""
+    if isinstance(instance, VHDLInstance):
+        return instance.instance_entity
+    return instance.instance_module
+
+
+def instance_count(entity_tree, name, counts):
+    """
+    Returns the number of instances in the hierarchy below an entity.  The
+    hierarchy is a DAG, so the count of each entity is memoized in counts
+    and every entity is counted once however often it is instantiated.  An
+    instance that closes a cycle counts itself but is not followed.
+    """
+    if name in counts:
+        return counts[name]
+    on_path = {name}
+    stack = [(name, iter(entity_tree[name].instance_used))]
+    totals = [0]
+    while stack:
+        node, instances = stack[-1]
+        instance = next(instances, None)
+        if instance is None:
+            stack.pop()
+            on_path.discard(node)
+            counts[node] = totals.pop()
+            if totals:
+                totals[-1] += counts[node]
+            continue
+        child = instance_target(instance)
+        totals[-1] += 1
+        if child in on_path:
+            continue
+        if child in counts:
+            totals[-1] += counts[child]
+            continue
+        on_path.add(child)
+        stack.append((child, iter(entity_tree[child].instance_used)))
+        totals.append(0)
+    return counts[name]
+
+
+def arch_names(entity_tree, name):
+    """Returns the ' (arch)' suffix listing an entity's architectures."""
+    return "".join(" ({})".format(arch.name) for arch in entity_tree[name].architectures)
+
+
+def write_tree(out, entity_tree, top, counts, max_depth=None):
+    """
+    Writes the instance hierarchy below a top entity, one instance per line
+    indented by depth.  Each entity's subtree is written out the first time
+    it is reached only; later instances of it give its instance count and
+    refer back, so the output is linear in the number of distinct
+    instantiations.  Instances closing a cycle are marked and not followed,
+    and instances deeper than max_depth are summarised.  The walk keeps its
+    own stack, as does instance_count, so deep hierarchies do not hit the
+    recursion limit.
+    """
+    out.write("{}{} [{} instances]\n".format(
+        top, arch_names(entity_tree, top), instance_count(entity_tree, top, counts)))
+    written = {top}
+    path = [top]
+    stack = [iter(entity_tree[top].instance_used)]
+    while stack:
+        instance = next(stack[-1], None)
+        if instance is None:
+            stack.pop()
+            path.pop()
+            continue
+        child = instance_target(instance)
+        depth = len(stack)
+        line = "{}|-> {}: {}{}".format(
+            "  " * depth, instance.instance_name, child, arch_names(entity_tree, child))
+        if child in path:
+            out.write(line + " (cycle)\n")
+            continue
+        count = instance_count(entity_tree, child, counts)
+        if not count:
+            out.write(line + "\n")
+        elif child in written:
+            out.write(line + " [{} instances, see above]\n".format(count))
+        elif max_depth is not None and depth >= max_depth:
+            out.write(line + " [{} instances, not shown]\n".format(count))
+        else:
+            out.write(line + " [{} instances]\n".format(count))
+            written.add(child)
+            path.append(child)
+            stack.append(iter(entity_tree[child].instance_used))
+
+
+parser = argparse.ArgumentParser(
+    prog="hdl_outline",
+    description="""Scans the HDL files below the current directory and
+    reports each entity and module with its instances, followed by the
+    instance hierarchy below each top level.""",
+)
+parser.add_argument(
+    "-d",
+    "--depth",
+    help="Deepest level of the hierarchy trees to show.  Default: all",
+    type=int,
+)
+args = parser.parse_args()
+
 entity_tree = {}
 logstr("Starting file scan.", True)
 for root, dirs, files in os.walk("."):
@@ -668,36 +774,46 @@ for root, dirs, files in os.walk("."):
                     pass
 
 logstr("Completed file scan.\n", True)
+sys.stdout.flush()
+# The report runs to a line per instance and more, so it is written through
+# one large buffer rather than a print per line.
+out = open(sys.stdout.fileno(), "w", buffering=1 << 20, closefd=False)
 for name in sorted(entity_tree):
     topstr = ""
     if not entity_tree[name].instances:
         topstr = "(top)"
-    print("[+] {} {}".format(name, topstr))
+    out.write("[+] {} {}\n".format(name, topstr))
     if entity_tree[name].architectures:
-        print("  Architectures:")
+        out.write("  Architectures:\n")
         for arch in entity_tree[name].architectures:
-            print("  {{+}} {}".format(arch.name))
-        print("    Subcomponent hierarchy:")
+            out.write("  {{+}} {}\n".format(arch.name))
+        out.write("    Subcomponent hierarchy:\n")
         for instance in entity_tree[name].instance_used:
             if isinstance(instance, VHDLInstance):
                 line = "    |-> {}: {} ".format(instance.instance_name, instance.instance_entity)
                 for arch in entity_tree[instance.instance_entity].architectures:
                     line = line + " ({})".format(arch.name)
-                print(line)
+                out.write(line + "\n")
             elif isinstance(instance, SVInstance):
-                print("    |-> {}: {}".format(instance.instance_name, instance.instance_module))
+                out.write("    |-> {}: {}\n".format(instance.instance_name, instance.instance_module))
             else:
                 pass
-    print("  Instantiated as:")
+    out.write("  Instantiated as:\n")
     for instance in entity_tree[name].instances:
         if isinstance(instance, VHDLInstance):
             line = "  > {} in {}".format(instance.instance_name, instance.calling_entity)
             for arch in entity_tree[instance.calling_entity].architectures:
                 line = line + " ({})".format(arch.name)
-            print(line)
+            out.write(line + "\n")
         elif isinstance(instance, SVInstance):
-            print("  > {} in {}".format(instance.instance_name, instance.calling_module))
+            out.write("  > {} in {}\n".format(instance.instance_name, instance.calling_module))
         else:
             pass
 
-
+out.write("\nHierarchy:\n")
+counts = {}
+for name in sorted(entity_tree):
+    if not entity_tree[name].instances and entity_tree[name].instance_used:
+        write_tree(out, entity_tree, name, counts, args.depth)
+        out.write("\n")
+out.flush()
@@ -5,13 +5,79 @@ use with block ROM in FPGA design.  There are a number of command line
 parameters for sinusoid type (cos/sin), size, full vs. quarter and so forth.
 With the proper option, it will also generate in 'mem' format which is useful
 for simulation.
+
+Besides sin and cos, any function in the lut_functions registry may be used
+(arctan, log2, exp2, invsqrt, Hann and Blackman windows, PAM levels, or one
+added with --plugin).  Several functions may be given at once, in which case
+a table is written for each from the same angle grid.
+
+With --quality a report of the quantization error, and for sin/cos tables
+the SFDR and SINAD, is printed for every table written.  With --sweep no
+files are written; instead every pair of the candidate address and data
+widths is measured in parallel to find the smallest ROM that meets a given
+SFDR/SINAD.
+
+With --manifest every table listed in a TOML or JSON manifest is generated
+in one run, spread over a pool of worker processes.  A table is skipped when
+its output file exists and the hash of its spec (and of the generator
+sources) matches the one recorded in the cache from the previous run:
+
+    [defaults]
+    datawidth = 16
+    rotation = "quad"
+
+    [[tables]]
+    function = ["sin", "cos"]
+    addrwidth = 10
+
+    [[tables]]
+    function = "sin"
+    addrwidth = 12
+    datawidth = 18
+    format = "mem"
+
+The JSON form has the same "defaults", "tables" and optional "plugins"
+keys.  Table keys are the long option names and may include "output" to
+override the generated filename.  Plugin and output paths are relative to the
+manifest's directory.
 """
 import argparse
+import hashlib
+import json
 import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from lut_analysis import analyze
+from lut_functions import FUNCTIONS, load_plugin, load_plugins
+from lut_symmetry import derive_samples
+from lut_writers import (
+    write_bin,
+    write_coe,
+    write_hex,
+    write_mem,
+    write_mem_header,
+    write_mem_line,
+    write_mif,
+    write_mif_footer,
+    write_mif_header,
+    write_mif_line,
+)
+
+try:
+    import tomllib
+except ImportError:
+    # Python before 3.11, JSON manifests only.
+    tomllib = None
+
+# How close the fraction of an unrounded table value must be to .5 for the
+# benchmark to take a one step difference from the loop as a rounding tie.
+TIE_TOLERANCE = 1e-6
 
 
-def generate_file(args, filename):
-    """Creating a MIF formatted memory file based on the arguments."""
+def lut_parameters(args):
+    """Returns a tuple of (max_value, depth, angle_step) for the arguments."""
     # Max value is constrained to maximum positive value for 2's complement
     # numbers.
     if args.scale is not None:
@@ -26,7 +92,7 @@ def generate_file(args, filename):
     if args.endpoint:
         num_samples = depth - 1
     else:
-        num_sample = depth
+        num_samples = depth
 
     if args.rotation == "full":
         angle_step = 2 * math.pi / num_samples
@@ -35,10 +101,165 @@ def generate_file(args, filename):
     elif args.rotation == "eighth":
         angle_step = 0.25 * math.pi / num_samples
 
+    return max_value, depth, angle_step
+
+
+def angle_grid(args):
+    """Returns the angle of every address as a numpy array."""
+    max_value, depth, angle_step = lut_parameters(args)
+    return np.arange(depth, dtype=np.float64) * angle_step
+
+
+def ideal_samples(args, function, angles=None):
+    """Returns the scaled function values of the table before quantization.
+    The angles may be passed in when several tables share them."""
+    max_value, depth, angle_step = lut_parameters(args)
+    if angles is None:
+        angles = angle_grid(args)
+    return max_value * FUNCTIONS[function](angles, args)
+
+
+def quantize(ideal, datawidth):
+    """Rounds ideal values to integers and converts negative values to
+    datawidth bit 2's complement.  numpy rounds half to even just like
+    round(), so the table matches the per-sample loop."""
+    return np.rint(ideal).astype(np.int64) & ((1 << datawidth) - 1)
+
+
+def generate_samples(args, function, angles=None):
+    """Computes the whole table for a registered function at once as a numpy
+    integer array.  sin and cos tables are derived from a shared eighth wave
+    (see lut_symmetry) unless --direct is given or the table has no quarter
+    wave symmetry."""
+    if not args.direct:
+        max_value, depth, angle_step = lut_parameters(args)
+        values = derive_samples(
+            function, args.rotation, args.endpoint, depth, max_value
+        )
+        if values is not None:
+            return values & ((1 << args.datawidth) - 1)
+    return quantize(ideal_samples(args, function, angles), args.datawidth)
+
+
+def rotation_args(args):
+    """Generator yielding a copy of the arguments for each rotation given."""
+    for rotation in args.rotation:
+        yield argparse.Namespace(**dict(vars(args), rotation=rotation))
+
+
+def quality(args, function, angles=None):
+    """Generates a table in memory and returns its QualityReport."""
+    return analyze(
+        ideal_samples(args, function, angles),
+        generate_samples(args, function, angles),
+        function,
+        args.addrwidth,
+        args.datawidth,
+        args.rotation,
+        args.endpoint,
+    )
+
+
+def worker_pool(jobs, plugins=(), mp_context=None):
+    """
+    Returns a process pool of jobs workers (None for one per CPU) that have
+    every plugin loaded.  Workers started by spawn or forkserver rather than
+    fork begin with only the built in functions registered, so the plugins
+    are loaded again in each one.
+    """
+    return ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=mp_context,
+        initializer=load_plugins,
+        initargs=([os.path.abspath(plugin) for plugin in plugins],),
+    )
+
+
+def sweep_point(args, function, addrwidth, datawidth):
+    """Measures the table for one pair of widths.  Run in a worker process."""
+    args = argparse.Namespace(**vars(args))
+    args.addrwidth = addrwidth
+    args.datawidth = datawidth
+    args.scale = None
+    return quality(args, function)
+
+
+def sweep(args, function, mp_context=None):
+    """
+    Measures the table for every pair of candidate address and data widths
+    in a pool of worker processes and prints the results from the smallest
+    ROM to the largest, marking the smallest that meets the limits.
+    mp_context selects how the workers are started, by default the platform
+    default.
+    """
+    pairs = [(aw, dw) for aw in args.addrwidths for dw in args.datawidths]
+    with worker_pool(args.jobs, args.plugin, mp_context) as executor:
+        reports = list(
+            executor.map(
+                sweep_point,
+                [args] * len(pairs),
+                [function] * len(pairs),
+                [aw for aw, dw in pairs],
+                [dw for aw, dw in pairs],
+            )
+        )
+    reports.sort(key=lambda report: (report.rom_bits, report.addrwidth))
+
+    print(f"Width sweep for {function}, {args.rotation} rotation:")
+    print("  Addr  Data    ROM bits  Max err  RMS err     SFDR    SINAD")
+    best = None
+    for report in reports:
+        if best is None and report.meets(args.sfdr, args.sinad):
+            best = report
+            mark = "  <- smallest meeting spec"
+        else:
+            mark = ""
+        if report.sfdr is None:
+            spectrum = "{:>8} {:>8}".format("-", "-")
+        else:
+            spectrum = f"{report.sfdr:8.1f} {report.sinad:8.1f}"
+        print(
+            f"  {report.addrwidth:4} {report.datawidth:5} {report.rom_bits:11} "
+            f"{report.max_error:8.3f} {report.rms_error:8.3f} {spectrum}{mark}"
+        )
+    if best is None:
+        print("  No candidate meets the spec.")
+
+
+def generate_file(args, filename, function, angles=None):
+    """Creating a MIF formatted memory file based on the arguments.  The table
+    is computed as a whole array and written out in large blocks."""
+    values = generate_samples(args, function, angles)
+
+    if args.format == "bin":
+        lut_file = open(filename, "wb")
+    else:
+        lut_file = open(filename, "w")
+
+    if args.format == "mif":
+        write_mif(lut_file, values, args.datawidth, args.words, args.ranges)
+    elif args.format == "mem":
+        write_mem(lut_file, values, args.datawidth, args.words)
+    elif args.format == "bin":
+        write_bin(lut_file, values, args.datawidth, args.endian)
+    elif args.format == "hex":
+        write_hex(lut_file, values, args.datawidth, args.words)
+    elif args.format == "coe":
+        write_coe(lut_file, values, args.datawidth, args.words)
+
+    lut_file.close()
+
+
+def generate_file_loop(args, filename, function):
+    """Creating a MIF formatted memory file one sample and one line at a time.
+    Kept as the reference the vectorized generate_file is benchmarked
+    against, so it only knows sin and cos."""
+    max_value, depth, angle_step = lut_parameters(args)
+
     addr_nibbles = math.ceil(args.addrwidth / 4)
     data_nibbles = math.ceil(args.datawidth / 4)
 
-    if args.function == "sin":
+    if function == "sin":
         func = math.sin
     else:
         func = math.cos
@@ -50,7 +271,6 @@ def generate_file(args, filename):
     elif args.format == "mem":
         write_mem_header(lut_file, depth, args.datawidth)
 
-    # TODO: Support multiple values per line.
     for idx in range(0, depth):
         angle = idx * angle_step
         value = round(max_value * func(angle))
@@ -69,42 +289,98 @@ def generate_file(args, filename):
     lut_file.close()
 
 
-def write_mif_header(lut_file, depth, datawidth):
-    """Specific header to MIF file formats."""
-    lut_file.write(f"DEPTH={depth}; % Memory Depth in Address Locations %\n")
-    lut_file.write(f"WIDTH={datawidth}; % Memory Width in Bits %\n")
-    lut_file.write("ADDRESS_RADIX = HEX;\n")
-    lut_file.write("DATA_RADIX = HEX;\n")
-    lut_file.write("CONTENT\nBEGIN\n")
+def untied_lines(args, function, loop_filename, filename):
+    """
+    Compares the loop reference file with the generated one line by line.
+    Returns a tuple of the number of lines that differ and the number of
+    those that are not explained by rounding an exact .5 tie the other way:
+    the exact value is not halfway between two integers or the two words are
+    not adjacent.  The loop only writes one value per line.
+    """
+    max_value, depth, angle_step = lut_parameters(args)
+    func = math.sin if function == "sin" else math.cos
+    modulus = 2**args.datawidth
+    # MIF lines are "address : data ;" after a six line header, MEM lines are
+    # the data alone after four comment lines.
+    header, field = (6, 2) if args.format == "mif" else (4, 0)
+    differ = untied = 0
+    with open(loop_filename) as loop_file, open(filename) as vector_file:
+        for num, (loop_line, vector_line) in enumerate(zip(loop_file, vector_file)):
+            if loop_line == vector_line:
+                continue
+            differ += 1
+            idx = num - header
+            if not 0 <= idx < depth:
+                untied += 1
+                continue
+            exact = max_value * func(idx * angle_step)
+            loop_word = int(loop_line.split()[field], 16)
+            step = loop_word - int(vector_line.split()[field], 16)
+            tie = math.isclose(exact % 1, 0.5, abs_tol=TIE_TOLERANCE)
+            if not tie or step % modulus not in (1, modulus - 1):
+                untied += 1
+    return differ, untied
 
 
-def write_mif_line(lut_file, address, addr_nibbles, data, data_nibbles):
-    line = f"{address:0{addr_nibbles}X} : {data:0{data_nibbles}X} ;\n"
-    lut_file.write(line)
+def benchmark(args, filename, function, angles=None):
+    """Times the per-sample loop against the vectorized generation for the
+    arguments and checks that both write the same file."""
+    if function not in ("sin", "cos"):
+        print(f"No loop reference for {function}, nothing to benchmark.")
+        generate_file(args, filename, function, angles)
+        return
 
+    loop_filename = filename + ".loop"
+    start = time.perf_counter()
+    generate_file_loop(args, loop_filename, function)
+    loop_time = time.perf_counter() - start
 
-def write_mif_footer(lut_file):
-    lut_file.write("END;\n")
+    start = time.perf_counter()
+    generate_file(args, filename, function, angles)
+    vector_time = time.perf_counter() - start
 
+    # The loop only writes MIF and MEM files with one value per line, so the
+    # files can only be compared when the layout options are left alone.
+    if args.format in ("mif", "mem") and args.words == 1 and not args.ranges:
+        differ, untied = untied_lines(args, function, loop_filename, filename)
+    else:
+        differ = None
+    os.remove(loop_filename)
 
-def write_mem_header(lut_file, depth, datawidth):
-    """Specific header to Verilog MEM file format."""
-    lut_file.write("// Verilog Hex Memory Format\n")
-    lut_file.write(f"// DEPTH={depth}\n")
-    lut_file.write(f"// WIDTH={datawidth}\n")
-    lut_file.write("// DATA_RADIX = HEX\n")
+    depth = 2 ** args.addrwidth
+    print(f"Loop:       {loop_time:.3f} s ({depth / loop_time:.0f} entries/s)")
+    print(f"Vectorized: {vector_time:.3f} s ({depth / vector_time:.0f} entries/s)")
+    print(f"Speedup:    {loop_time / vector_time:.1f}x")
+    if differ is None:
+        print("Outputs not compared, the file layout differs from the loop.")
+    elif not differ:
+        print("Outputs match.")
+    elif not untied:
+        # The loop and --direct round exact ties such as sin(pi/6) by however
+        # the float angle happens to fall, the derived table consistently.
+        print(f"Outputs differ on {differ} line(s), each an exact .5 rounding tie.")
+    else:
+        print(
+            f"Error: Outputs differ on {differ} line(s), {untied} of them not"
+            " rounding ties."
+        )
 
 
-def write_mem_line(lut_file, data, data_nibbles):
-    line = f"{data:0{data_nibbles}X}\n"
-    lut_file.write(line)
+def positive_int(text):
+    """argparse type for a count of at least 1."""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1: {}".format(text))
+    return value
 
 
-def main():
-    """Main entry point for program."""
+def build_parser():
+    """Returns the command line parser.  Any plugins must be loaded first so
+    the functions they register are valid choices."""
     parser = argparse.ArgumentParser(
         prog="generate_lut",
-        description="""Creates a memory initialization file for a sinusoid.""",
+        description="""Creates a memory initialization file for a sinusoid
+        or another registered function.""",
     )
     parser.add_argument(
         "-p",
@@ -142,10 +418,24 @@ def main():
     parser.add_argument(
         "-f",
         "--function",
-        choices=["sin", "cos"],
-        help="""Function to be created.  Valid options are 'sin' and 'cos'.
-        Default: sin""",
-        default="sin",
+        nargs="+",
+        choices=sorted(FUNCTIONS),
+        help="""Function(s) to be created.  A table is written for each one
+        given, all sharing the same angle grid.  Default: sin""",
+        default=["sin"],
+    )
+    parser.add_argument(
+        "--levels",
+        help="Number of amplitude levels for the pam function.  Default: 4",
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--plugin",
+        action="append",
+        default=[],
+        help="""Python file registering further functions with
+        lut_functions.register.  May be given more than once.""",
     )
     parser.add_argument(
         "-s",
@@ -157,22 +447,33 @@ def main():
     parser.add_argument(
         "-r",
         "--rotation",
+        nargs="+",
         choices=["full", "quad", "eighth"],
-        help="""Rotational angle.  Valid options are 'full' and 'quad' and
-        'eighth'.  Note that the eighth mode does not automatically generate
-        both sin/cos outputs but that's how it's intended to be done, so run
-        the program again to generate the other function.  Default: full""",
-        default="full",
+        help="""Rotational angle(s).  Valid options are 'full' and 'quad' and
+        'eighth'.  A table is written for each rotation and function given.
+        Note that the eighth mode is intended to be used with both sin and
+        cos tables, e.g. '-r eighth -f sin cos'.  Default: full""",
+        default=["full"],
     )
     parser.add_argument(
         "-fmt",
         "--format",
-        choices=["mif", "mem"],
+        choices=["mif", "mem", "bin", "hex", "coe"],
         help="""Sets the output file format.  MIF is the Intel Memory
         Initialization File format (similar to MTI as well).  MEM is the
-        Verilog Hex Memory format.  Default: mif""",
+        Verilog Hex Memory format.  BIN is raw binary with each word in the
+        fewest whole bytes that hold the data width.  HEX is Intel HEX with
+        word addresses as used by Quartus.  COE is the Xilinx coefficient
+        file format.  Default: mif""",
         default="mif",
     )
+    parser.add_argument(
+        "-e",
+        "--endian",
+        choices=["little", "big"],
+        help="Byte order of the words in BIN files.  Default: little",
+        default="little",
+    )
     parser.add_argument(
         "-ep",
         "--endpoint",
@@ -185,43 +486,355 @@ def main():
         be (2^15 - 1) * sin(pi/4) = 0x5a82.  Care may need to be taken with the
         angle determination.  Default: Do not include the endpoint."""
     )
+    parser.add_argument(
+        "-w",
+        "--words",
+        help="""Number of data words written per line.  Larger values make
+        smaller files that are faster to write and load.  Default: 1""",
+        default=1,
+        type=positive_int,
+    )
+    parser.add_argument(
+        "-rg",
+        "--ranges",
+        metavar="MIN_RUN",
+        help="""MIF only.  Writes runs of at least MIN_RUN repeated values as a
+        single address range line, '[a..b] : v ;'.  Default: no ranges""",
+        default=0,
+        type=int,
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        action="store_true",
+        help="""Prints the quantization error of every table written, and the
+        SFDR and SINAD of sin/cos tables whose full period can be
+        reconstructed (full rotation, or quad with the endpoint).""",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="""Writes no files.  Measures the tables for every pair of
+        --addrwidths and --datawidths in parallel instead, always at full
+        scale, and reports the smallest ROM meeting --sfdr and --sinad.""",
+    )
+    parser.add_argument(
+        "--addrwidths",
+        nargs="+",
+        type=int,
+        default=[8, 10, 12],
+        help="Candidate address widths for --sweep.  Default: 8 10 12",
+    )
+    parser.add_argument(
+        "--datawidths",
+        nargs="+",
+        type=int,
+        default=[12, 14, 16, 18],
+        help="Candidate data widths for --sweep.  Default: 12 14 16 18",
+    )
+    parser.add_argument(
+        "--sfdr",
+        type=float,
+        help="Minimum SFDR in dBc a --sweep candidate must reach.",
+    )
+    parser.add_argument(
+        "--sinad",
+        type=float,
+        help="Minimum SINAD in dB a --sweep candidate must reach.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="""Number of worker processes for --sweep.  Default: one per CPU
+        core.""",
+    )
+    parser.add_argument(
+        "--direct",
+        action="store_true",
+        help="""Computes sin and cos at every address instead of deriving the
+        table from the shared eighth wave by symmetry.""",
+    )
+    parser.add_argument(
+        "-b",
+        "--benchmark",
+        action="store_true",
+        help="""Also generates the table with the original per-sample loop,
+        reports the time taken by each method and checks that the outputs
+        match.""",
+    )
+    parser.add_argument(
+        "-m",
+        "--manifest",
+        help="""TOML or JSON manifest of tables to generate in one run.  The
+        other table options are ignored.""",
+    )
+    parser.add_argument(
+        "--cache",
+        help="""Spec hash cache file for --manifest.  Default: the manifest
+        filename with '.cache' appended.""",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Regenerates every --manifest table even if it is up to date.",
+    )
     # TODO: Add other RADIX arguments someday instead of just HEX.
-    args = parser.parse_args()
+    return parser
 
-    # Error check for full scale value.  args.scale equivalent to None is
-    # fine, however if specified, must not be greater than the maximum
-    # possible value.
-    if args.scale is not None and args.scale > 2 ** (args.width - 1) - 1:
-        print(
-            "Argument Error: Full scale value must be less than or equal to the maximum possible.  A signed number at {} bits has a maximum scale value of {}.".format(
-                args.width, 2 ** (args.width - 1) - 1
-            )
+
+def scale_error(args):
+    """Error check for full scale value.  args.scale equivalent to None is
+    fine, however if specified, must not be greater than the maximum possible
+    value.  Returns an error message or None."""
+    if args.scale is not None and args.scale > 2 ** (args.datawidth - 1) - 1:
+        return "Argument Error: Full scale value must be less than or equal to the maximum possible.  A signed number at {} bits has a maximum scale value of {}.".format(
+            args.datawidth, 2 ** (args.datawidth - 1) - 1
         )
+    return None
+
+
+def table_filename(args, function):
+    """Constructs the output filename of a table."""
+    if args.scale is None:
+        scale_str = ""
     else:
-        # Construct filename
-        if args.scale is None:
-            scale_str = ""
+        scale_str = "scaled_"
+
+    return "{}_{}x{}_{}{}_{}_lut.{}".format(
+        args.prefix,
+        args.datawidth,
+        2**args.addrwidth,
+        scale_str,
+        args.rotation,
+        function,
+        args.format,
+    )
+
+
+# Options that change the contents of a generated table and so make up its
+# spec hash.
+SPEC_KEYS = (
+    "addrwidth",
+    "datawidth",
+    "scale",
+    "rotation",
+    "endpoint",
+    "format",
+    "endian",
+    "words",
+    "ranges",
+    "levels",
+    "direct",
+)
+SOURCES = (
+    "generate_lut.py",
+    "lut_functions.py",
+    "lut_symmetry.py",
+    "lut_writers.py",
+)
+
+
+def source_digest(plugins=()):
+    """Returns a hash of the generator sources and plugins, so that a change
+    to the code invalidates every cached table."""
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for filename in [os.path.join(directory, name) for name in SOURCES] + list(plugins):
+        with open(filename, "rb") as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def spec_hash(args, function, sources):
+    """Returns the hash identifying the contents of one table."""
+    spec = {key: getattr(args, key) for key in SPEC_KEYS}
+    spec["function"] = function
+    spec["sources"] = sources
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest(filename):
+    """Reads a TOML or JSON manifest.  Returns a tuple of the plugin
+    filenames (joined to the manifest's directory) and the list of table
+    specs with the defaults merged in."""
+    if filename.endswith(".json"):
+        with open(filename) as manifest_file:
+            manifest = json.load(manifest_file)
+    else:
+        if tomllib is None:
+            raise ValueError("TOML manifests need Python 3.11 or later")
+        with open(filename, "rb") as manifest_file:
+            manifest = tomllib.load(manifest_file)
+
+    if isinstance(manifest, list):
+        manifest = {"tables": manifest}
+    directory = os.path.dirname(filename)
+    plugins = [os.path.join(directory, name) for name in manifest.get("plugins", [])]
+    defaults = manifest.get("defaults", {})
+    specs = [dict(defaults, **table) for table in manifest.get("tables", [])]
+    return plugins, specs
+
+
+def manifest_jobs(parser, specs, directory=""):
+    """
+    Turns manifest specs into a list of (args, function, filename) jobs, one
+    per table.  The args start from the command line defaults and the
+    filenames are joined to directory, the manifest's.  Raises ValueError for
+    an unknown key or an invalid spec.
+    """
+    defaults = vars(parser.parse_args([]))
+    jobs = []
+    for num, spec in enumerate(specs, 1):
+        spec = dict(spec)
+        output = spec.pop("output", None)
+        unknown = set(spec) - set(defaults)
+        if unknown:
+            raise ValueError(
+                "Table {}: unknown key(s) {}".format(num, ", ".join(sorted(unknown)))
+            )
+        args = argparse.Namespace(**dict(defaults, **spec))
+        if isinstance(args.function, str):
+            args.function = [args.function]
+        if isinstance(args.rotation, str):
+            args.rotation = [args.rotation]
+        for function in args.function:
+            if function not in FUNCTIONS:
+                raise ValueError("Table {}: unknown function {}".format(num, function))
+        error = scale_error(args)
+        if error:
+            raise ValueError("Table {}: {}".format(num, error))
+        if args.words < 1:
+            raise ValueError("Table {}: words must be at least 1".format(num))
+        if output and len(args.function) * len(args.rotation) > 1:
+            raise ValueError("Table {}: output given for several tables".format(num))
+        for table_args in rotation_args(args):
+            for function in args.function:
+                filename = os.path.join(
+                    directory, output or table_filename(table_args, function)
+                )
+                jobs.append((table_args, function, filename))
+    return jobs
+
+
+def generate_table(args, function, filename):
+    """Writes one manifest table, creating its directory if need be.  Run in
+    a worker process."""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    generate_file(args, filename, function)
+    return filename
+
+
+def run_manifest(parser, args, mp_context=None):
+    """
+    Generates every table of a manifest in a pool of worker processes.
+    Tables whose output exists with the spec hash recorded in the cache are
+    skipped.  A table that fails is reported and the rest carry on.  The
+    cache is rewritten once the run is complete, with the hashes of the
+    tables that are up to date or were generated, so failed tables are
+    retried on the next run.  mp_context selects how the workers are
+    started, by default the platform default.
+    """
+    try:
+        plugins, specs = load_manifest(args.manifest)
+        for plugin in plugins:
+            load_plugin(plugin)
+        jobs = manifest_jobs(parser, specs, os.path.dirname(args.manifest))
+    except ValueError as err:
+        print("Manifest Error: {}".format(err))
+        return
+
+    cache_filename = args.cache or args.manifest + ".cache"
+    try:
+        with open(cache_filename) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        cache = {}
+
+    sources = source_digest(args.plugin + plugins)
+    hashes = {}
+    pending = []
+    for job_args, function, filename in jobs:
+        hashes[filename] = spec_hash(job_args, function, sources)
+        if (
+            not args.force
+            and os.path.exists(filename)
+            and cache.get(filename) == hashes[filename]
+        ):
+            print("Up to date {}".format(filename))
         else:
-            scale_str = "scaled_"
+            pending.append((job_args, function, filename))
+
+    failed = 0
+    if pending:
+        with worker_pool(args.jobs, args.plugin + plugins, mp_context) as executor:
+            futures = [executor.submit(generate_table, *job) for job in pending]
+            for future, (_, _, filename) in zip(futures, pending):
+                try:
+                    future.result()
+                except Exception as err:
+                    print("Error: {}: {}: {}".format(filename, type(err).__name__, err))
+                    hashes.pop(filename, None)
+                    cache.pop(filename, None)
+                    failed += 1
+                else:
+                    print("Generated {}".format(filename))
 
+    cache.update(hashes)
+    with open(cache_filename, "w") as cache_file:
+        json.dump(cache, cache_file, indent=2, sort_keys=True)
+    print(
+        "{} table(s), {} generated, {} failed, {} up to date".format(
+            len(jobs), len(pending) - failed, failed, len(jobs) - len(pending)
+        )
+    )
+
+
+def main():
+    """Main entry point for program."""
+    # Plugins are loaded before the full parser is built so that the
+    # functions they register are valid choices.
+    plugin_parser = argparse.ArgumentParser(add_help=False)
+    plugin_parser.add_argument("--plugin", action="append", default=[])
+    for plugin in plugin_parser.parse_known_args()[0].plugin:
+        load_plugin(plugin)
+
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.manifest:
+        run_manifest(parser, args)
+        return
+
+    if args.sweep:
+        for table_args in rotation_args(args):
+            for function in args.function:
+                sweep(table_args, function)
+        return
+
+    error = scale_error(args)
+    if error:
+        print(error)
+    else:
         # TODO: Actually support the number of samples option
-        if args.addrwidth:
-            depth = 2 ** args.addrwidth
-        else:
+        if not args.addrwidth:
             print("Error: Nonbinary depth not yet supported despite the fact it's in the help text.")
 
-        filename = "{}_{}x{}_{}{}_{}_lut.{}".format(
-            args.prefix,
-            args.datawidth,
-            depth,
-            scale_str,
-            args.rotation,
-            args.function,
-            args.format,
-        )
-        print("Generating {}".format(filename))
+        for table_args in rotation_args(args):
+            angles = angle_grid(table_args)
+            for function in args.function:
+                filename = table_filename(table_args, function)
+                print("Generating {}".format(filename))
 
-        generate_file(args, filename)
+                if args.benchmark:
+                    benchmark(table_args, filename, function, angles)
+                else:
+                    generate_file(table_args, filename, function, angles)
+                if args.quality:
+                    for line in quality(table_args, function, angles).report():
+                        print("  " + line)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+#! python3
+"""
+Module for measuring the quality of a generated look-up table.  The
+quantization error is the difference between each stored value and the ideal
+scaled function value, in LSBs.  For sin and cos tables the full period
+waveform is reconstructed from the table (mirroring a quarter wave table
+that includes its endpoint) and its spectrum is taken with one FFT.  Since
+the table holds exactly one period, the tone falls in a single bin with no
+window needed, and the SFDR and SINAD follow directly from the bin powers.
+"""
+import math
+import numpy as np
+
+# Functions whose tables are one period of a tone the spectrum applies to.
+PERIODIC = ("sin", "cos")
+
+
+class QualityReport:
+    """
+    Class holding the quality measurements of one table.  The SFDR and SINAD
+    are None when no full period waveform can be reconstructed from the
+    table.
+    """
+
+    def __init__(
+        self, addrwidth, datawidth, max_error, rms_error, sfdr=None, sinad=None
+    ):
+        self.addrwidth = addrwidth
+        self.datawidth = datawidth
+        self.max_error = max_error
+        self.rms_error = rms_error
+        self.sfdr = sfdr
+        self.sinad = sinad
+
+    @property
+    def rom_bits(self):
+        """Size of the table in bits."""
+        return 2**self.addrwidth * self.datawidth
+
+    @property
+    def enob(self):
+        """Effective number of bits from the SINAD."""
+        if self.sinad is None:
+            return None
+        return (self.sinad - 1.76) / 6.02
+
+    def meets(self, sfdr=None, sinad=None):
+        """True if the table meets the given minimum SFDR and SINAD in dB.
+        A limit that cannot be measured is not met."""
+        if sfdr is not None and (self.sfdr is None or self.sfdr < sfdr):
+            return False
+        if sinad is not None and (self.sinad is None or self.sinad < sinad):
+            return False
+        return True
+
+    def report(self):
+        """Returns the report as a list of lines."""
+        lines = [
+            f"Max quantization error: {self.max_error:.3f} LSB",
+            f"RMS quantization error: {self.rms_error:.3f} LSB",
+        ]
+        if self.sfdr is None:
+            lines.append("SFDR/SINAD: not available for this function and rotation")
+        else:
+            lines.append(f"SFDR:  {self.sfdr:.1f} dBc")
+            lines.append(f"SINAD: {self.sinad:.1f} dB (ENOB {self.enob:.2f} bits)")
+        return lines
+
+
+def to_signed(values, datawidth):
+    """Converts datawidth bit 2's complement table values back to signed."""
+    return np.where(values >= 1 << (datawidth - 1), values - (1 << datawidth), values)
+
+
+def full_period(signed, function, rotation, endpoint):
+    """
+    Reconstructs one full period of the tone from a sin or cos table.
+    Returns None if the table does not determine it, i.e. an eighth wave
+    table or a quarter wave table without its endpoint.
+    """
+    if function not in PERIODIC:
+        return None
+    if rotation == "full":
+        # With the endpoint the last entry repeats the first of the next
+        # period.
+        if endpoint:
+            return signed[:-1]
+        return signed
+    if rotation != "quad" or not endpoint:
+        return None
+    # Put the quarter wave in sine order, zero up to the peak, then mirror it
+    # about the peak and negate for the second half period.  The spectrum
+    # magnitude does not depend on the starting phase.
+    if function == "cos":
+        signed = signed[::-1]
+    half = np.concatenate((signed, signed[-2:0:-1]))
+    return np.concatenate((half, -half))
+
+
+def spectrum_metrics(waveform):
+    """Returns the SFDR and SINAD in dB of a waveform holding a whole number
+    of periods of one tone.  DC is ignored and the tone is the largest bin."""
+    power = np.abs(np.fft.rfft(waveform.astype(np.float64))) ** 2
+    power[0] = 0
+    tone = np.argmax(power)
+    signal = power[tone]
+    power[tone] = 0
+    spur = power.max()
+    noise = power.sum()
+    if spur == 0:
+        return math.inf, math.inf
+    return 10 * math.log10(signal / spur), 10 * math.log10(signal / noise)
+
+
+def analyze(ideal, values, function, addrwidth, datawidth, rotation, endpoint):
+    """Measures a table given the ideal scaled function values and the stored
+    2's complement values.  Returns a QualityReport."""
+    signed = to_signed(values, datawidth)
+    error = signed - ideal
+    max_error = float(np.abs(error).max())
+    rms_error = float(np.sqrt(np.mean(error**2)))
+
+    waveform = full_period(signed, function, rotation, endpoint)
+    if waveform is None:
+        return QualityReport(addrwidth, datawidth, max_error, rms_error)
+    sfdr, sinad = spectrum_metrics(waveform)
+    return QualityReport(addrwidth, datawidth, max_error, rms_error, sfdr, sinad)
@@ -0,0 +1,122 @@
+#! python3
+"""
+Registry of the functions generate_lut can build tables for.  Every function
+is vectorized: it is called with a numpy array of angles (0 to 2*pi over a
+full rotation, see the --rotation option) and the parsed command line
+arguments, and returns an array of values in the range -1 to 1 which are
+then scaled and quantized to the data width.
+
+The trig functions use the angle directly.  The others treat a full rotation
+as one pass over their own domain, so the quad and eighth rotations cover the
+first quarter and eighth of it, and the endpoint option includes its end.
+
+Further functions may be added from a plugin file given with --plugin.  The
+plugin imports this module and registers its functions with the decorator:
+
+    import numpy as np
+    from lut_functions import register
+
+    @register("square")
+    def square(angles, args):
+        return np.where(angles < np.pi, 1.0, -1.0)
+"""
+import importlib.util
+import math
+import os
+import numpy as np
+
+TWO_PI = 2 * math.pi
+FUNCTIONS = {}
+
+
+def register(name):
+    """Decorator adding a table function to the registry under name."""
+
+    def decorator(func):
+        FUNCTIONS[name] = func
+        return func
+
+    return decorator
+
+
+def load_plugin(filename):
+    """Imports a Python file so the functions it registers become
+    available."""
+    name = os.path.splitext(os.path.basename(filename))[0]
+    spec = importlib.util.spec_from_file_location(name, filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_plugins(filenames):
+    """Loads every plugin file.  Used as the initializer of worker processes,
+    which only inherit the registry of the parent when they are forked."""
+    for filename in filenames:
+        load_plugin(filename)
+
+
+def turns(angles):
+    """Converts angles to the fraction of a full rotation, 0 to 1."""
+    return angles / TWO_PI
+
+
+@register("sin")
+def sine(angles, args):
+    """Sine."""
+    return np.sin(angles)
+
+
+@register("cos")
+def cosine(angles, args):
+    """Cosine."""
+    return np.cos(angles)
+
+
+@register("arctan")
+def arctan(angles, args):
+    """Arctangent of x for x from 0 to 1, as a fraction of pi/4.  This is the
+    ratio to angle table used for phase detection in place of CORDIC
+    iterations."""
+    return np.arctan(turns(angles)) / (math.pi / 4)
+
+
+@register("log2")
+def log2(angles, args):
+    """Base 2 logarithm of the mantissa 1 + x for x from 0 to 1."""
+    return np.log2(1 + turns(angles))
+
+
+@register("exp2")
+def exp2(angles, args):
+    """Fractional part of 2^x for x from 0 to 1, the inverse of log2."""
+    return np.exp2(turns(angles)) - 1
+
+
+@register("invsqrt")
+def invsqrt(angles, args):
+    """Inverse square root of the mantissa x for x from 1 to 4, two octaves so
+    the exponent may be halved exactly."""
+    return 1 / np.sqrt(1 + 3 * turns(angles))
+
+
+@register("hann")
+def hann(angles, args):
+    """Hann window across the rotation."""
+    return 0.5 - 0.5 * np.cos(angles)
+
+
+@register("blackman")
+def blackman(angles, args):
+    """Blackman window across the rotation."""
+    return 0.42 - 0.5 * np.cos(angles) + 0.08 * np.cos(2 * angles)
+
+
+@register("pam")
+def pam(angles, args):
+    """Evenly spaced PAM amplitude levels from -1 to 1, --levels of them,
+    stepping through each in turn across the rotation.  With a depth equal to
+    the number of levels this is the symbol to amplitude table."""
+    levels = args.levels
+    symbols = np.minimum(np.floor(turns(angles) * levels), levels - 1)
+    return 2 * symbols / (levels - 1) - 1
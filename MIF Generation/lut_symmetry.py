@@ -0,0 +1,75 @@
+#! python3
+"""
+Module for deriving sin and cos tables from a single eighth wave.  The angle
+grid of every table is a whole number of points per turn, e.g. a full 4096
+entry table, a quad 1024 entry table and an eighth 512 entry table all sit
+on a grid of 4096 points per turn.  sin and cos are computed (in extended
+precision where the platform has it) and quantized only for the first
+octant of that grid, 0 to pi/4.  Every other table on the grid is then built
+by index mirroring and negation:
+
+    sin(pi/2 - x) = cos(x)    sin(pi - x) = sin(x)    sin(pi + x) = -sin(x)
+    cos(x) = sin(x + pi/2)
+
+Related tables are therefore bit exact mirrors of each other, and the trig
+functions are evaluated for an eighth of the points of a full table.  The
+quantized octant is cached so further tables on the same grid reuse it.
+"""
+import functools
+import numpy as np
+
+SYMMETRIC = ("sin", "cos")
+ROTATION_FRACTION = {"full": 1, "quad": 4, "eighth": 8}
+PI = 2 * np.arccos(np.longdouble(0))
+
+
+def turn_points(rotation, endpoint, depth):
+    """Returns the number of grid points per full turn of a table, or None if
+    that is not a whole multiple of 4 and so has no quarter wave symmetry (a
+    full rotation table with the endpoint)."""
+    if endpoint:
+        depth -= 1
+    points = depth * ROTATION_FRACTION[rotation]
+    if points % 4:
+        return None
+    return points
+
+
+@functools.lru_cache(maxsize=None)
+def octant(points, max_value):
+    """Returns the quantized sin and cos over the first octant of a grid with
+    the given points per turn, as int64 arrays of points // 8 + 1 entries."""
+    angles = np.arange(points // 8 + 1).astype(np.longdouble) * (2 * PI / points)
+    sin = np.rint(max_value * np.sin(angles)).astype(np.int64)
+    cos = np.rint(max_value * np.cos(angles)).astype(np.int64)
+    return sin, cos
+
+
+def period(points, max_value):
+    """
+    Returns one full period of the quantized sine on the grid, assembled from
+    the octant by concatenating mirrored and negated slices: the octant and
+    the reversed cosine octant make the quarter wave, the quarter wave and
+    its reflection about pi/2 make the half wave, and the half wave and its
+    negation make the period.
+    """
+    sin, cos = octant(points, max_value)
+    quarter = points // 4
+    quarter_wave = np.concatenate((sin, cos[: quarter - points // 8][::-1]))
+    half_wave = np.concatenate((quarter_wave, quarter_wave[quarter - 1 : 0 : -1]))
+    return np.concatenate((half_wave, -half_wave))
+
+
+def derive_samples(function, rotation, endpoint, depth, max_value):
+    """
+    Returns the quantized (signed) table of depth entries for sin or cos
+    derived from the cached octant, or None when the table's grid has no
+    quarter wave symmetry and must be computed directly.
+    """
+    points = turn_points(rotation, endpoint, depth)
+    if function not in SYMMETRIC or points is None:
+        return None
+    wave = period(points, max_value)
+    if function == "cos":
+        wave = np.roll(wave, -(points // 4))
+    return wave[:depth]
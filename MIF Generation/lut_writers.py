@@ -0,0 +1,310 @@
+#! python3
+"""
+Module for writing look-up tables to memory initialization files in bulk.
+Rather than one small write per address, the table (a numpy integer array of
+unsigned data words) is formatted a block of entries at a time by indexing a
+hex digit table, and each block is written as a single buffer.  Blocks are
+limited to CHUNK entries so the memory used stays bounded on very deep
+tables.
+
+Both formats may hold several data words per line.  MIF files may also use
+address ranges ('[a..b] : v ;') for runs of repeated values, which shortens
+tables with flat regions considerably.
+
+Besides MIF and MEM, tables may be written as raw binary (each word in the
+fewest whole bytes that hold the data width, either byte order), as Intel
+HEX with word addressing the way Quartus reads it for memory initialization,
+and as a Xilinx COE file.
+"""
+import math
+import numpy as np
+
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+SPACE = ord(" ")
+# Largest number of table entries formatted into one buffer.
+CHUNK = 1 << 16
+# Words covered by one Intel HEX extended linear address record.
+HEX_SEGMENT = 1 << 16
+
+
+def hex_digits(values, nibbles):
+    """Returns an array of shape (len(values), nibbles) holding the ASCII hex
+    digits of each value, most significant digit first."""
+    shifts = np.arange(nibbles - 1, -1, -1, dtype=np.int64) * 4
+    return HEX_DIGITS[(values[:, np.newaxis] >> shifts) & 0xF]
+
+
+def join_columns(count, *columns):
+    """Joins columns of ASCII bytes side by side into one string of count
+    lines.  A column is either a 2D array of ASCII codes or a str that is
+    repeated on every line."""
+    parts = []
+    for column in columns:
+        if isinstance(column, str):
+            column = np.frombuffer(column.encode("ascii"), dtype=np.uint8)
+            column = np.broadcast_to(column, (count, len(column)))
+        parts.append(column)
+    return np.hstack(parts).tobytes().decode("ascii")
+
+
+def word_columns(values, nibbles, words_per_line):
+    """Lays the hex data words out words_per_line to a row, each preceded by a
+    space.  The number of values must be a multiple of words_per_line."""
+    digits = hex_digits(values, nibbles).reshape(-1, words_per_line, nibbles)
+    spaces = np.full(digits.shape[:2] + (1,), SPACE, dtype=np.uint8)
+    return np.concatenate((spaces, digits), axis=2).reshape(len(digits), -1)
+
+
+def blocks(start, stop, words_per_line):
+    """Generator yielding (start, stop) ranges of entries to format at once.
+    Each is a whole number of lines and at most about CHUNK entries, except
+    for a final short line which comes on its own."""
+    step = words_per_line * max(1, CHUNK // words_per_line)
+    whole = start + (stop - start) // words_per_line * words_per_line
+    for pos in range(start, whole, step):
+        yield pos, min(pos + step, whole)
+    if whole < stop:
+        yield whole, stop
+
+
+def find_runs(values, min_run):
+    """Returns arrays of the start and stop indices of every run of at least
+    min_run equal consecutive values."""
+    change = np.flatnonzero(np.diff(values)) + 1
+    starts = np.concatenate(([0], change))
+    stops = np.concatenate((change, [len(values)]))
+    long_runs = stops - starts >= min_run
+    return starts[long_runs], stops[long_runs]
+
+
+def address_nibbles(depth):
+    """Returns the number of hex digits needed for the addresses of a memory
+    of the given depth."""
+    return max(1, math.ceil((depth - 1).bit_length() / 4))
+
+
+def format_mif_block(values, start, addr_nibbles, data_nibbles, words_per_line):
+    """Formats consecutive entries beginning at address start as MIF content
+    lines.  The entries must fill whole lines or fit on one line."""
+    words = min(words_per_line, len(values))
+    addresses = np.arange(start, start + len(values), words, dtype=np.int64)
+    return join_columns(
+        len(addresses),
+        hex_digits(addresses, addr_nibbles),
+        " :",
+        word_columns(values, data_nibbles, words),
+        " ;\n",
+    )
+
+
+def format_mem_block(values, data_nibbles, words_per_line):
+    """Formats consecutive entries as MEM data lines.  The entries must fill
+    whole lines or fit on one line."""
+    words = min(words_per_line, len(values))
+    columns = word_columns(values, data_nibbles, words)[:, 1:]
+    return join_columns(len(columns), columns, "\n")
+
+
+def write_mif_entries(
+    lut_file, values, start, stop, addr_nibbles, data_nibbles, words_per_line
+):
+    """Writes the entries from start up to stop as MIF content lines."""
+    for block_start, block_stop in blocks(start, stop, words_per_line):
+        lut_file.write(
+            format_mif_block(
+                values[block_start:block_stop],
+                block_start,
+                addr_nibbles,
+                data_nibbles,
+                words_per_line,
+            )
+        )
+
+
+def write_mif(lut_file, values, datawidth, words_per_line=1, min_run=0):
+    """
+    Writes a complete MIF file for the table.  Runs of at least min_run
+    repeated values are written as one address range line when min_run is
+    given, the remaining entries go words_per_line to a line.
+    """
+    depth = len(values)
+    addr_nibbles = address_nibbles(depth)
+    data_nibbles = math.ceil(datawidth / 4)
+
+    write_mif_header(lut_file, depth, datawidth)
+    if min_run:
+        starts, stops = find_runs(values, min_run)
+    else:
+        starts, stops = [], []
+
+    pos = 0
+    for run_start, run_stop in zip(starts, stops):
+        write_mif_entries(
+            lut_file, values, pos, run_start, addr_nibbles, data_nibbles, words_per_line
+        )
+        write_mif_range(
+            lut_file,
+            run_start,
+            run_stop - 1,
+            addr_nibbles,
+            values[run_start],
+            data_nibbles,
+        )
+        pos = run_stop
+    write_mif_entries(
+        lut_file, values, pos, depth, addr_nibbles, data_nibbles, words_per_line
+    )
+    write_mif_footer(lut_file)
+
+
+def write_mem(lut_file, values, datawidth, words_per_line=1):
+    """Writes a complete Verilog MEM file for the table with words_per_line
+    data words to a line."""
+    data_nibbles = math.ceil(datawidth / 4)
+    write_mem_header(lut_file, len(values), datawidth)
+    for block_start, block_stop in blocks(0, len(values), words_per_line):
+        lut_file.write(
+            format_mem_block(
+                values[block_start:block_stop], data_nibbles, words_per_line
+            )
+        )
+
+
+def word_bytes(values, nbytes, byteorder="little"):
+    """Returns an array of shape (len(values), nbytes) holding the bytes of
+    each value in the given byte order."""
+    shifts = np.arange(nbytes, dtype=np.int64) * 8
+    if byteorder == "big":
+        shifts = shifts[::-1]
+    return ((values[:, np.newaxis] >> shifts) & 0xFF).astype(np.uint8)
+
+
+def write_bin(lut_file, values, datawidth, byteorder="little"):
+    """Writes the table as raw binary to a file opened in binary mode.  Each
+    word takes the fewest whole bytes that hold datawidth bits."""
+    nbytes = math.ceil(datawidth / 8)
+    for block_start, block_stop in blocks(0, len(values), 1):
+        lut_file.write(
+            word_bytes(values[block_start:block_stop], nbytes, byteorder).tobytes()
+        )
+
+
+def hex_record(record_type, address, data=b""):
+    """Returns one Intel HEX record line."""
+    record = bytes((len(data), address >> 8, address & 0xFF, record_type)) + data
+    checksum = -sum(record) & 0xFF
+    return ":{}{:02X}\n".format(record.hex().upper(), checksum)
+
+
+def format_hex_block(values, start, nbytes, words_per_line):
+    """Formats consecutive entries beginning at word address start as Intel
+    HEX data records, words_per_line words per record.  The entries must fill
+    whole records or fit in one, and must not cross a HEX_SEGMENT boundary."""
+    words = min(words_per_line, len(values))
+    data = word_bytes(values, nbytes, "big").reshape(-1, words * nbytes)
+    count = len(data)
+    addresses = np.arange(start, start + len(values), words, dtype=np.int64) & 0xFFFF
+    header = np.zeros((count, 4), dtype=np.uint8)
+    header[:, 0] = words * nbytes
+    header[:, 1] = addresses >> 8
+    header[:, 2] = addresses & 0xFF
+    record = np.hstack((header, data))
+    checksum = -record.sum(axis=1, dtype=np.int64) & 0xFF
+    record = np.hstack((record, checksum[:, np.newaxis].astype(np.uint8)))
+    digits = hex_digits(record.reshape(-1).astype(np.int64), 2)
+    return join_columns(count, ":", digits.reshape(count, -1), "\n")
+
+
+def write_hex(lut_file, values, datawidth, words_per_line=1):
+    """
+    Writes the table as Intel HEX.  Addresses count words rather than bytes
+    and each word is stored most significant byte first, which is how Quartus
+    reads HEX memory initialization files.  An extended linear address record
+    starts every HEX_SEGMENT words past the first.
+    """
+    nbytes = math.ceil(datawidth / 8)
+    if words_per_line * nbytes > 255:
+        raise ValueError(
+            "Intel HEX records hold at most 255 bytes, {} words of {} bytes do not fit".format(
+                words_per_line, nbytes
+            )
+        )
+    depth = len(values)
+    for segment in range(0, depth, HEX_SEGMENT):
+        if segment:
+            lut_file.write(hex_record(4, 0, (segment >> 16).to_bytes(2, "big")))
+        stop = min(segment + HEX_SEGMENT, depth)
+        for block_start, block_stop in blocks(segment, stop, words_per_line):
+            lut_file.write(
+                format_hex_block(
+                    values[block_start:block_stop],
+                    block_start,
+                    nbytes,
+                    words_per_line,
+                )
+            )
+    lut_file.write(hex_record(1, 0))
+
+
+def format_coe_block(values, data_nibbles, words_per_line):
+    """Formats consecutive entries as COE vector lines with a comma after
+    every word.  The entries must fill whole lines or fit on one line."""
+    words = min(words_per_line, len(values))
+    digits = hex_digits(values, data_nibbles).reshape(-1, words, data_nibbles)
+    commas = np.full(digits.shape[:2] + (1,), ord(","), dtype=np.uint8)
+    columns = np.concatenate((digits, commas), axis=2).reshape(len(digits), -1)
+    return join_columns(len(columns), columns, "\n")
+
+
+def write_coe(lut_file, values, datawidth, words_per_line=1):
+    """Writes the table as a Xilinx COE file with words_per_line words to a
+    line.  The vector is terminated by a semicolon after the last word."""
+    data_nibbles = math.ceil(datawidth / 4)
+    lut_file.write(f"; DEPTH={len(values)}\n")
+    lut_file.write(f"; WIDTH={datawidth}\n")
+    lut_file.write("memory_initialization_radix=16;\n")
+    lut_file.write("memory_initialization_vector=\n")
+    text = ""
+    for block_start, block_stop in blocks(0, len(values), words_per_line):
+        lut_file.write(text)
+        text = format_coe_block(
+            values[block_start:block_stop], data_nibbles, words_per_line
+        )
+    lut_file.write(text[:-2] + ";\n")
+
+
+def write_mif_header(lut_file, depth, datawidth):
+    """Specific header to MIF file formats."""
+    lut_file.write(f"DEPTH={depth}; % Memory Depth in Address Locations %\n")
+    lut_file.write(f"WIDTH={datawidth}; % Memory Width in Bits %\n")
+    lut_file.write("ADDRESS_RADIX = HEX;\n")
+    lut_file.write("DATA_RADIX = HEX;\n")
+    lut_file.write("CONTENT\nBEGIN\n")
+
+
+def write_mif_line(lut_file, address, addr_nibbles, data, data_nibbles):
+    line = f"{address:0{addr_nibbles}X} : {data:0{data_nibbles}X} ;\n"
+    lut_file.write(line)
+
+
+def write_mif_range(lut_file, first, last, addr_nibbles, data, data_nibbles):
+    """Writes one value for an inclusive range of addresses."""
+    line = f"[{first:0{addr_nibbles}X}..{last:0{addr_nibbles}X}] : {data:0{data_nibbles}X} ;\n"
+    lut_file.write(line)
+
+
+def write_mif_footer(lut_file):
+    lut_file.write("END;\n")
+
+
+def write_mem_header(lut_file, depth, datawidth):
+    """Specific header to Verilog MEM file format."""
+    lut_file.write("// Verilog Hex Memory Format\n")
+    lut_file.write(f"// DEPTH={depth}\n")
+    lut_file.write(f"// WIDTH={datawidth}\n")
+    lut_file.write("// DATA_RADIX = HEX\n")
+
+
+def write_mem_line(lut_file, data, data_nibbles):
+    line = f"{data:0{data_nibbles}X}\n"
+    lut_file.write(line)
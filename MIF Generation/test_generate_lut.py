@@ -0,0 +1,163 @@
+#! python3
+"""Tests for generate_lut worker pools.  Run with pytest from this directory."""
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+import generate_lut
+from lut_functions import FUNCTIONS, load_plugin
+
+PLUGIN = '''
+import numpy as np
+from lut_functions import register
+
+
+@register("test_square")
+def square(angles, args):
+    return np.where(angles < np.pi, 1.0, -1.0)
+'''
+
+
+class SpawnedWorkersTest(unittest.TestCase):
+    """Plugin functions used in workers started by spawn, which do not
+    inherit the registry of the parent."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.plugin = os.path.join(self.tempdir.name, "square_plugin.py")
+        with open(self.plugin, "w") as plugin_file:
+            plugin_file.write(PLUGIN)
+        load_plugin(self.plugin)
+        self.spawn = multiprocessing.get_context("spawn")
+
+    def tearDown(self):
+        FUNCTIONS.pop("test_square", None)
+        self.tempdir.cleanup()
+
+    def test_sweep(self):
+        parser = generate_lut.build_parser()
+        args = parser.parse_args(
+            ["-f", "test_square", "--plugin", self.plugin, "--sweep",
+             "--addrwidths", "4", "5", "--datawidths", "8", "-j", "2"]
+        )
+        table_args = next(generate_lut.rotation_args(args))
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            generate_lut.sweep(table_args, "test_square", mp_context=self.spawn)
+        self.assertIn("Width sweep for test_square", output.getvalue())
+        self.assertEqual(output.getvalue().count("\n  "), 3)
+
+    def test_manifest(self):
+        manifest = os.path.join(self.tempdir.name, "tables.json")
+        table = os.path.join(self.tempdir.name, "square.mif")
+        with open(manifest, "w") as manifest_file:
+            json.dump(
+                {
+                    "plugins": ["square_plugin.py"],
+                    "tables": [
+                        {"function": "test_square", "addrwidth": 6, "output": table}
+                    ],
+                },
+                manifest_file,
+            )
+        parser = generate_lut.build_parser()
+        args = parser.parse_args(["-m", manifest, "-j", "1"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            generate_lut.run_manifest(parser, args, mp_context=self.spawn)
+        with open(table) as table_file:
+            self.assertIn("DEPTH=64;", table_file.read())
+
+
+class ManifestTest(unittest.TestCase):
+    """Manifest output paths and failed tables."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.manifest = os.path.join(self.tempdir.name, "tables.json")
+        with open(os.path.join(self.tempdir.name, "blocker"), "w"):
+            pass
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_outputs(self):
+        with open(self.manifest, "w") as manifest_file:
+            json.dump(
+                {
+                    "tables": [
+                        {
+                            "function": "sin",
+                            "addrwidth": 4,
+                            "output": "blocker/sin.mif",
+                        },
+                        {"function": "cos", "addrwidth": 4, "output": "out/cos.mif"},
+                    ]
+                },
+                manifest_file,
+            )
+        parser = generate_lut.build_parser()
+        args = parser.parse_args(["-m", self.manifest, "-j", "1"])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            generate_lut.run_manifest(parser, args)
+        failed = os.path.join(self.tempdir.name, "blocker", "sin.mif")
+        generated = os.path.join(self.tempdir.name, "out", "cos.mif")
+        self.assertIn("Error: {}".format(failed), output.getvalue())
+        self.assertIn("2 table(s), 1 generated, 1 failed", output.getvalue())
+        self.assertTrue(os.path.isfile(generated))
+        with open(self.manifest + ".cache") as cache_file:
+            self.assertEqual(list(json.load(cache_file)), [generated])
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Benchmark differences from the loop reference."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.loop = os.path.join(self.tempdir.name, "sin.mif.loop")
+        self.table = os.path.join(self.tempdir.name, "sin.mif")
+        parser = generate_lut.build_parser()
+        args = parser.parse_args(["-a", "8", "-r", "quad", "--endpoint"])
+        self.args = next(generate_lut.rotation_args(args))
+        generate_lut.generate_file_loop(self.args, self.loop, "sin")
+        generate_lut.generate_file(self.args, self.table, "sin")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def untied_lines(self):
+        return generate_lut.untied_lines(self.args, "sin", self.loop, self.table)
+
+    def test_ties(self):
+        self.assertEqual(self.untied_lines(), (1, 0))
+
+    def test_not_tie(self):
+        with open(self.table) as table_file:
+            lines = table_file.readlines()
+        lines[6 + 10] = lines[6 + 10].replace(" ;", "0 ;")
+        with open(self.table, "w") as table_file:
+            table_file.writelines(lines)
+        self.assertEqual(self.untied_lines(), (2, 1))
+
+
+class WordsTest(unittest.TestCase):
+    """The number of words per line must be at least 1."""
+
+    def test_parser(self):
+        parser = generate_lut.build_parser()
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                parser.parse_args(["-w", "0"])
+        self.assertEqual(parser.parse_args(["-w", "4"]).words, 4)
+
+    def test_manifest(self):
+        parser = generate_lut.build_parser()
+        with self.assertRaises(ValueError):
+            generate_lut.manifest_jobs(parser, [{"function": "sin", "words": 0}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,352 @@
+#! python3
+"""
+Module for the binary capture format used to skip CSV text parsing on
+repeated decodes of the same capture.  A file is a fixed header followed by
+the samples in one of two encodings.  Each sample is packed into a byte:
+
+    bit 0     : clk
+    bit 1     : cmd
+    bits 7..4 : data nibble (DAT3..DAT0)
+
+The packed encoding stores every sample.  The transitions encoding stores a
+(position, value) record only where the value changes, which for a
+capture sampled far faster than the bus clock is a small fraction of the
+size.  The header holds a magic string, format version, sample encoding,
+sample period in nanoseconds and sample count.  Files are read with mmap and
+viewed with numpy.frombuffer so no copy of the data is made up front.
+
+Either way the decoder is handed transitions: packed samples are run-length
+encoded a chunk at a time in numpy before reaching the Python decoder.
+
+Run as a program to convert a Logic Analyzer CSV capture once:
+
+    python capture_binary.py capture.csv -o capture.sdcap -s 10 [--rle]
+"""
+import argparse
+import mmap
+import os
+import struct
+import numpy as np
+from capture_split import MIN_IDLE_EDGES, Segment
+
+MAGIC = b"SDCAPBIN"
+VERSION = 1
+# Sample encodings
+PACKED = 0
+TRANSITIONS = 1
+# magic, version, encoding, sample period (ns), sample count
+HEADER = struct.Struct("<8sHHdQ")
+# position, packed sample value
+TRANSITION = struct.Struct("<QB")
+TRANSITION_DTYPE = np.dtype([("position", "<u8"), ("value", "u1")])
+# Number of samples (or transitions) handled per step.
+CHUNK = 1 << 20
+
+
+class CaptureHeader:
+    """Class representing the header fields of a binary capture."""
+
+    def __init__(self, sample_rate, count, encoding=PACKED, version=VERSION):
+        self.sample_rate = sample_rate
+        self.count = count
+        self.encoding = encoding
+        self.version = version
+
+    def pack(self):
+        """Returns the header as bytes."""
+        return HEADER.pack(
+            MAGIC, self.version, self.encoding, self.sample_rate, self.count
+        )
+
+    @classmethod
+    def unpack(cls, buf):
+        """Constructs a header from the leading bytes of a capture file."""
+        magic, version, encoding, sample_rate, count = HEADER.unpack_from(buf)
+        if magic != MAGIC:
+            raise ValueError("Not a binary SD capture file (bad magic).")
+        if version != VERSION:
+            raise ValueError(
+                "Unsupported binary SD capture version {}.".format(version)
+            )
+        if encoding not in (PACKED, TRANSITIONS):
+            raise ValueError("Unknown binary SD capture encoding {}.".format(encoding))
+        return cls(sample_rate, count, encoding, version)
+
+
+def is_binary_capture(filename):
+    """Returns True if the file begins with the binary capture magic."""
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def read_header(filename):
+    """Returns the CaptureHeader of a binary capture file."""
+    with open(filename, "rb") as f:
+        return CaptureHeader.unpack(f.read(HEADER.size))
+
+
+def map_capture(filename):
+    """
+    Returns a tuple of the header, the mmap object and a read-only numpy
+    view of the data: uint8 samples for the packed encoding or records of
+    TRANSITION_DTYPE for the transitions encoding.  The caller should drop
+    the view and close the mmap once finished.
+    """
+    with open(filename, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = CaptureHeader.unpack(mm)
+    if header.encoding == PACKED:
+        data = np.frombuffer(mm, dtype=np.uint8, count=header.count, offset=HEADER.size)
+    else:
+        data = np.frombuffer(mm, dtype=TRANSITION_DTYPE, offset=HEADER.size)
+    return header, mm, data
+
+
+def iter_transitions(header, data, start, stop):
+    """
+    Generator yielding chunks of transitions between sample indices start and
+    stop as a tuple of numpy arrays (positions, values).  Positions are
+    absolute sample indices.  The first chunk always begins with the sample
+    at start.  The arrays are copies, not views of the mapped file.  Chunks
+    of a packed capture without a transition (a stopped clock or an idle
+    bus) are skipped, so every chunk yielded holds at least one transition.
+    """
+    if header.encoding == PACKED:
+        for pos in range(start, stop, CHUNK):
+            end = min(pos + CHUNK, stop)
+            # Include the previous sample so a change on the first sample of
+            # the chunk is seen.
+            lead = 1 if pos > start else 0
+            window = data[pos - lead : end]
+            idx = np.flatnonzero(window[1:] != window[:-1]) + 1
+            if not lead:
+                idx = np.concatenate(([0], idx))
+            if idx.size:
+                yield idx + (pos - lead), window[idx]
+    else:
+        positions = data["position"]
+        values = data["value"]
+        # The record in effect at start, through the last record before stop.
+        first = max(int(np.searchsorted(positions, start, side="right")) - 1, 0)
+        last = int(np.searchsorted(positions, stop, side="left"))
+        for idx in range(first, last, CHUNK):
+            end = min(idx + CHUNK, last)
+            chunk_positions = positions[idx:end].astype(np.int64)
+            if idx == first:
+                chunk_positions[0] = start
+            yield chunk_positions, np.array(values[idx:end])
+
+
+def read_binary(filename, start=None, stop=None):
+    """Generator yielding (position, clk, cmd, data) transitions from a
+    binary capture, positions counted from start.  The start and stop sample
+    indices restrict the read to a segment.  The last sample of the range is
+    always included to mark the end."""
+    header, mm, data = map_capture(filename)
+    if start is None:
+        start = 0
+    if stop is None:
+        stop = header.count
+    transitions = iter_transitions(header, data, start, stop)
+    try:
+        last_position = None
+        for positions, values in transitions:
+            last_position = int(positions[-1])
+            last_value = int(values[-1])
+            yield from zip(
+                (positions - start).tolist(),
+                (values & 1).tolist(),
+                ((values >> 1) & 1).tolist(),
+                (values >> 4).tolist(),
+            )
+        if last_position is not None and last_position != stop - 1:
+            yield (
+                stop - 1 - start,
+                last_value & 1,
+                (last_value >> 1) & 1,
+                last_value >> 4,
+            )
+    finally:
+        # The mmap cannot be closed while numpy views of it exist.
+        transitions.close()
+        transitions = data = None
+        mm.close()
+
+
+def find_idle_split(header, data, start, stop, min_idle_edges=MIN_IDLE_EDGES):
+    """
+    Binary capture counterpart of capture_split.find_idle_split, working on
+    sample indices.  Rising edges and CMD low transitions are located a
+    chunk at a time with numpy, and the count of CMD high edges since the
+    last CMD low is worked out for every edge at once.  Returns a tuple of
+    the sample index of the split and the clock period at that point, or
+    None.
+    """
+    idle_edges = 0
+    last_edge = None
+    # No edge can be seen on the first sample scanned.
+    last_clk = 1
+    transitions = iter_transitions(header, data, start, stop)
+    try:
+        for positions, values in transitions:
+            clk = values & 1
+            prev_clk = np.concatenate(([last_clk], clk[:-1]))
+            edges = np.flatnonzero((clk == 1) & (prev_clk == 0))
+            zeros = np.flatnonzero((values & 2) == 0)
+            last_clk = int(clk[-1])
+            if edges.size:
+                ranks = np.arange(edges.size)
+                if zeros.size:
+                    zero_idx = np.searchsorted(zeros, edges, side="right") - 1
+                    zero_pos = zeros[np.maximum(zero_idx, 0)]
+                    first_after = np.searchsorted(edges, zero_pos, side="right")
+                    counts = np.where(
+                        zero_idx >= 0, ranks - first_after + 1, ranks + 1 + idle_edges
+                    )
+                else:
+                    counts = ranks + 1 + idle_edges
+                hits = np.flatnonzero(counts > min_idle_edges)
+                if hits.size:
+                    hit = hits[0]
+                    split_pos = int(positions[edges[hit]])
+                    if hit > 0:
+                        clk_period = split_pos - int(positions[edges[hit - 1]])
+                    else:
+                        clk_period = split_pos - last_edge
+                    return split_pos, clk_period
+                last_edge = int(positions[edges[-1]])
+                if zeros.size and zeros[-1] > edges[-1]:
+                    idle_edges = 0
+                else:
+                    idle_edges = int(counts[-1])
+            elif zeros.size:
+                idle_edges = 0
+    finally:
+        transitions.close()
+    return None
+
+
+def find_split_points(filename, count, min_idle_edges=MIN_IDLE_EDGES):
+    """Binary capture counterpart of capture_split.find_split_points.  The
+    Segments returned are in sample indices."""
+    header, mm, data = map_capture(filename)
+    try:
+        targets = [header.count * idx // count for idx in range(1, count)]
+        splits = []
+        for idx, target in enumerate(targets):
+            if splits and target <= splits[-1][0]:
+                continue
+            if idx + 1 < len(targets):
+                limit = targets[idx + 1]
+            else:
+                limit = header.count
+            split = find_idle_split(header, data, target, limit, min_idle_edges)
+            if split is not None:
+                splits.append(split)
+    finally:
+        data = None
+        mm.close()
+
+    segments = []
+    start = 0
+    clk_period = 0
+    for split_pos, split_period in splits:
+        segments.append(Segment(start, split_pos, clk_period))
+        start = split_pos
+        clk_period = split_period
+    segments.append(Segment(start, header.count, clk_period))
+    return segments
+
+
+def write_binary(bin_filename, samples, sample_rate, encoding=PACKED):
+    """
+    Writes a binary capture from an iterable of (clk, cmd, data) samples,
+    normally read_csv of a CSV capture.  Returns the number of samples
+    written.  The header count is filled in once the samples are written.
+    """
+    count = 0
+    last = None
+    with open(bin_filename, "wb") as f_out:
+        f_out.write(CaptureHeader(float(sample_rate), 0, encoding).pack())
+        buf = bytearray()
+        for clk, cmd, data in samples:
+            value = clk | (cmd << 1) | (data << 4)
+            if encoding == PACKED:
+                buf.append(value)
+            elif value != last:
+                buf += TRANSITION.pack(count, value)
+                last = value
+            count += 1
+            if len(buf) >= CHUNK:
+                f_out.write(buf)
+                buf = bytearray()
+        f_out.write(buf)
+        f_out.seek(0)
+        f_out.write(CaptureHeader(float(sample_rate), count, encoding).pack())
+    return count
+
+
+def write_packed(bin_filename, packed, sample_rate, encoding=PACKED):
+    """Writes a binary capture from samples that are already packed into a
+    bytes-like object.  The transitions encoding is worked out with numpy."""
+    samples = np.frombuffer(packed, dtype=np.uint8)
+    with open(bin_filename, "wb") as f_out:
+        f_out.write(CaptureHeader(float(sample_rate), samples.size, encoding).pack())
+        if encoding == PACKED:
+            f_out.write(samples.tobytes())
+        elif samples.size:
+            idx = np.flatnonzero(samples[1:] != samples[:-1]) + 1
+            idx = np.concatenate(([0], idx))
+            records = np.empty(idx.size, dtype=TRANSITION_DTYPE)
+            records["position"] = idx
+            records["value"] = samples[idx]
+            f_out.write(records.tobytes())
+    return samples.size
+
+
+def main():
+    """Command line converter from Logic Analyzer CSV to binary capture."""
+    # Imported here as the decoder imports this module.
+    from sdcard_data_reader import read_csv
+
+    parser = argparse.ArgumentParser(
+        prog="capture_binary",
+        description="""Converts a Logic Analyzer CSV capture to the binary
+        capture format read by sdcard_data_reader.""",
+    )
+    parser.add_argument("input_file", help="Input CSV filename.  Required.")
+    parser.add_argument(
+        "-o",
+        "--output_file",
+        help="Output filename.  Default: input filename with .sdcap extension.",
+    )
+    parser.add_argument(
+        "-s",
+        "--sample_rate",
+        help="Sample rate in nanoseconds.  Default = 10.",
+        default=10,
+    )
+    parser.add_argument(
+        "--rle",
+        action="store_true",
+        help="""Store only the transitions instead of every sample.  Best for
+        captures sampled much faster than the bus clock.""",
+    )
+    args = parser.parse_args()
+
+    output_file = args.output_file
+    if output_file is None:
+        output_file = os.path.splitext(args.input_file)[0] + ".sdcap"
+    if args.rle:
+        encoding = TRANSITIONS
+    else:
+        encoding = PACKED
+    print("Converting {} to {}".format(args.input_file, output_file))
+    count = write_binary(
+        output_file, read_csv(args.input_file), args.sample_rate, encoding
+    )
+    print("Wrote {} samples".format(count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#! python3
+"""
+Module for cutting a Logic Analyzer CSV capture into segments that can be
+decoded independently.  A segment may only begin where the CMD line state
+machine is known to be idle.  Every frame is at most 136 bits long and begins
+with a start bit of 0, so once the CMD line has been high for more than 136
+consecutive rising clock edges no frame can still be in progress.  The cut is
+made on the next rising clock edge after such a stretch.
+"""
+import csv
+import os
+
+# Longest frame (R2) is 136 bits, so one more edge than that guarantees idle.
+MIN_IDLE_EDGES = 137
+
+
+class Segment:
+    """
+    Class describing one segment of a capture file as a byte range.  The
+    clk_period is the clock period in samples leading into the first sample
+    of the segment so the decoder can continue the clock rate calculation.
+    """
+
+    def __init__(self, start, stop, clk_period=0):
+        self.start = start
+        self.stop = stop
+        self.clk_period = clk_period
+
+    def __str__(self):
+        return "{}->{} (clock period {})".format(self.start, self.stop, self.clk_period)
+
+
+def read_lines(fileobj, start, stop=None):
+    """Generator yielding the decoded text lines of a binary file object
+    beginning at byte offset start and ending before byte offset stop."""
+    fileobj.seek(start)
+    pos = start
+    while stop is None or pos < stop:
+        line = fileobj.readline()
+        if not line:
+            break
+        pos += len(line)
+        yield line.decode("ascii")
+
+
+def find_idle_split(fileobj, start, stop, clk_col, cmd_col, min_idle_edges=MIN_IDLE_EDGES):
+    """
+    Scans forward from byte offset start (which must be the start of a line)
+    for a safe split point before byte offset stop.  Returns a tuple of the
+    byte offset of the split line and the clock period in samples at that
+    point, or None if the capture has no long enough idle gap in the range.
+    """
+    fileobj.seek(start)
+    pos = start
+    line_count = 0
+    last_clk = None
+    last_edge_line = None
+    clk_period = 0
+    idle_edges = 0
+    while pos < stop:
+        line = fileobj.readline()
+        if not line:
+            break
+        fields = line.split(b",")
+        clk = int(fields[clk_col])
+        cmd = int(fields[cmd_col])
+        if cmd == 0:
+            idle_edges = 0
+        elif clk == 1 and last_clk == 0:
+            if last_edge_line is not None:
+                clk_period = line_count - last_edge_line
+            last_edge_line = line_count
+            idle_edges += 1
+            if idle_edges > min_idle_edges and clk_period:
+                return pos, clk_period
+        pos += len(line)
+        line_count += 1
+        last_clk = clk
+    return None
+
+
+def find_split_points(filename, count, min_idle_edges=MIN_IDLE_EDGES):
+    """
+    Returns a list of up to count Segments covering the data lines of the
+    capture.  Split targets are spread evenly through the file by size and
+    each one is moved forward to the next safe idle point.  Targets without
+    an idle gap before the following target are dropped, so a capture with
+    no idle gaps comes back as a single segment.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as fileobj:
+        fieldnames = next(csv.reader([fileobj.readline().decode("ascii")]))
+        clk_col = fieldnames.index("clk")
+        cmd_col = fieldnames.index("cmd")
+        data_start = fileobj.tell()
+
+        targets = [
+            data_start + (size - data_start) * idx // count for idx in range(1, count)
+        ]
+        splits = []
+        for idx, target in enumerate(targets):
+            # Align the target to the start of the next line.
+            fileobj.seek(target - 1)
+            fileobj.readline()
+            line_start = fileobj.tell()
+            if splits and line_start <= splits[-1][0]:
+                continue
+            if idx + 1 < len(targets):
+                limit = targets[idx + 1]
+            else:
+                limit = size
+            split = find_idle_split(
+                fileobj, line_start, limit, clk_col, cmd_col, min_idle_edges
+            )
+            if split is not None:
+                splits.append(split)
+
+    segments = []
+    start = data_start
+    clk_period = 0
+    for split_pos, split_period in splits:
+        segments.append(Segment(start, split_pos, clk_period))
+        start = split_pos
+        clk_period = split_period
+    segments.append(Segment(start, size, clk_period))
+    return segments
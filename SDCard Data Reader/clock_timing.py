@@ -0,0 +1,320 @@
+#! python3
+"""
+Module for analyzing the SD card clock from the rising edge positions in a
+capture.  Edge to edge intervals are kept as integer sample counts and
+grouped into segments of steady clock rate (e.g. 400 kHz during card
+initialization followed by 25 or 50 MHz for transfers).  Each edge costs a
+subtraction, a band comparison and a few integer updates.  Conversion to a
+frequency only happens when a report is made.
+
+A capture decoded in parts is analyzed in parts too and the results merged.
+A part beginning in the middle of the capture does not know the band of the
+segment in progress, so it holds back its first intervals to estimate it and
+carries that segment on with the estimate.  The merge checks the estimate
+against the segment it continues (see ClockTiming.continues); where it is
+wrong, the part is analyzed again carrying on from that segment.
+"""
+from collections import Counter
+
+# Percentage an interval may stray from the segment reference and still be
+# counted as the same clock rate.
+TOLERANCE = 25
+# Number of consecutive consistent intervals outside the band that it takes
+# to start a new segment.  Fewer than this are treated as outliers (clock
+# pauses between transactions or glitches).
+SETTLE_EDGES = 8
+# Number of intervals a part starting in the middle of a capture holds back
+# to estimate the rate of the segment it continues.
+HEAD_EDGES = 64
+
+
+def band(period, tolerance=TOLERANCE):
+    """Returns the (low, high) interval band around a reference period."""
+    return period * (100 - tolerance) // 100, -(-period * (100 + tolerance) // 100)
+
+
+class ClockSegment:
+    """
+    Class holding the running statistics for one stretch of steady clock
+    rate.  The band starts out around the interval that opened the segment
+    and is re-centred on the mean each time the edge count doubles, so a
+    jittery first interval does not skew it for long.
+    """
+
+    def __init__(self, start_line, period, tolerance=TOLERANCE):
+        self.start_line = start_line
+        self.end_line = start_line
+        self.edges = 0
+        self.total = 0
+        self.min_period = period
+        self.max_period = period
+        self.histogram = Counter()
+        self.tolerance = tolerance
+        self.next_rebase = 2
+        # Counts carried in from an earlier part of the capture, see
+        # continuation().
+        self.base_edges = 0
+        self.base_total = 0
+        self.set_band(period)
+
+    def set_band(self, period):
+        """Sets the accepted interval band around a reference period."""
+        self.low, self.high = band(period, self.tolerance)
+
+    def continuation(self, start_line):
+        """
+        Returns an empty segment carrying this one on from start_line in a
+        later part of the capture.  It starts from the same counts, so it is
+        re-centred where this one would have been, and merge() takes in
+        only what was added to it.
+        """
+        segment = ClockSegment(start_line, 1, self.tolerance)
+        segment.edges = segment.base_edges = self.edges
+        segment.total = segment.base_total = self.total
+        segment.min_period = float("inf")
+        segment.max_period = 0
+        segment.next_rebase = self.next_rebase
+        segment.low = self.low
+        segment.high = self.high
+        return segment
+
+    def add(self, line, period):
+        """Adds one edge interval ending at the given line."""
+        self.edges += 1
+        self.total += period
+        if period < self.min_period:
+            self.min_period = period
+        if period > self.max_period:
+            self.max_period = period
+        self.histogram[period] += 1
+        self.end_line = line
+        if self.edges == self.next_rebase:
+            self.next_rebase <<= 1
+            self.set_band((self.total + self.edges // 2) // self.edges)
+
+    def merge(self, other):
+        """
+        Takes in the statistics of other, this segment carried on in the
+        following part of the capture.  If other started from the counts of
+        this segment (see continuation) its band is taken as well.
+        Otherwise the band is re-centred if the edge count passed a doubling,
+        as it would have been had the edges been added one by one.
+        """
+        edges = other.edges - other.base_edges
+        if not edges:
+            return
+        self.edges += edges
+        self.total += other.total - other.base_total
+        self.min_period = min(self.min_period, other.min_period)
+        self.max_period = max(self.max_period, other.max_period)
+        self.histogram.update(other.histogram)
+        self.end_line = other.end_line
+        if other.next_rebase:
+            self.next_rebase = other.next_rebase
+            self.low = other.low
+            self.high = other.high
+        elif self.edges >= self.next_rebase:
+            while self.next_rebase <= self.edges:
+                self.next_rebase <<= 1
+            self.set_band((self.total + self.edges // 2) // self.edges)
+
+    @property
+    def mean_period(self):
+        """Mean edge to edge interval in samples."""
+        return self.total / self.edges
+
+    def rate(self, sample_rate):
+        """Returns the clock rate in Hz for a sample rate in nanoseconds."""
+        return 1e9 / (self.mean_period * float(sample_rate))
+
+    def report(self, sample_rate):
+        """Returns a one line description of the segment."""
+        return "Lines {}-{}: {:.0f} Hz  ({} edges, period mean {:.2f} min {} max {} samples)".format(
+            self.start_line,
+            self.end_line,
+            self.rate(sample_rate),
+            self.edges,
+            self.mean_period,
+            self.min_period,
+            self.max_period,
+        )
+
+
+class ClockTiming:
+    """
+    Class that is fed the line number of every rising clock edge and splits
+    the intervals into ClockSegments.  An interval inside the band of the
+    current segment is simply added.  Intervals outside it are held back as
+    pending until SETTLE_EDGES consistent ones in a row show a real change of
+    rate; otherwise they are counted as outliers.
+
+    The last_edge before the first line is given for a part of a capture
+    other than the first.  With carry, the ClockSegment in progress there,
+    the analysis carries that segment on exactly.  Without it, the first
+    HEAD_EDGES intervals are held back, the segment is carried on with a
+    band around their mean, and then they are added.  Either way the
+    segment carried on is the continued attribute.
+    """
+
+    def __init__(
+        self,
+        last_edge=None,
+        tolerance=TOLERANCE,
+        settle_edges=SETTLE_EDGES,
+        carry=None,
+    ):
+        self.last_edge = last_edge
+        self.tolerance = tolerance
+        self.settle_edges = settle_edges
+        self.segments = []
+        self.current = None
+        self.pending = []
+        self.outliers = 0
+        self.continued = None
+        self.head = None
+        if carry is not None:
+            self._continue(carry.continuation(last_edge))
+        elif last_edge is not None:
+            self.head = []
+
+    def edge(self, line):
+        """Records a rising clock edge at the given line number."""
+        last_edge = self.last_edge
+        self.last_edge = line
+        if last_edge is None:
+            return
+        period = line - last_edge
+        current = self.current
+        if current is not None and current.low <= period <= current.high:
+            if self.pending:
+                self.outliers += len(self.pending)
+                self.pending = []
+            current.add(line, period)
+        else:
+            self._outside(line, period)
+
+    def _outside(self, line, period):
+        """Handles an interval outside the band of the current segment."""
+        if self.current is None:
+            if self.head is None:
+                self._start_segment(line, period)
+                return
+            self.head.append((line, period))
+            if len(self.head) >= HEAD_EDGES:
+                self._resolve_head()
+            return
+        pending = self.pending
+        if pending:
+            low, high = band(pending[0][1], self.tolerance)
+            if not low <= period <= high:
+                self.outliers += len(pending)
+                pending = self.pending = []
+        pending.append((line, period))
+        if len(pending) >= self.settle_edges:
+            self.pending = []
+            self._start_segment(*pending[0])
+            for pending_line, pending_period in pending[1:]:
+                self.current.add(pending_line, pending_period)
+
+    def _start_segment(self, line, period):
+        """Opens a new segment with its first interval.  A previous segment
+        too short to have settled is discarded as outliers."""
+        current = self.current
+        if (
+            current is not None
+            and current is not self.continued
+            and current.edges < self.settle_edges
+        ):
+            self.outliers += current.edges
+            self.segments.pop()
+        # The segment begins at the edge that opened the first interval.
+        self.current = ClockSegment(line - period, period, self.tolerance)
+        self.current.add(line, period)
+        self.segments.append(self.current)
+
+    def _continue(self, segment):
+        """Makes segment, carrying on one from an earlier part of the
+        capture, the current segment."""
+        self.current = self.continued = segment
+        self.segments.append(segment)
+
+    def _resolve_head(self):
+        """Carries on the segment in progress with a band around the mean of
+        the intervals held back, leaving out those outside the band of their
+        median, then adds them."""
+        head = self.head
+        self.head = None
+        if not head:
+            return
+        periods = sorted(period for line, period in head)
+        low, high = band(periods[len(periods) // 2], self.tolerance)
+        periods = [period for period in periods if low <= period <= high]
+        reference = (sum(periods) + len(periods) // 2) // len(periods)
+        line, period = head[0]
+        segment = ClockSegment(line - period, reference, self.tolerance)
+        # Not re-centred on its own few edges, see ClockSegment.merge.
+        segment.next_rebase = 0
+        segment.min_period = float("inf")
+        segment.max_period = 0
+        self._continue(segment)
+        for line, period in head:
+            self.last_edge = line - period
+            self.edge(line)
+
+    def finish(self):
+        """Counts any intervals still pending at the end of the capture."""
+        if self.head is not None:
+            self._resolve_head()
+        self.outliers += len(self.pending)
+        self.pending = []
+
+    def continues(self, other):
+        """
+        True if other, the analysis of the following part of the same
+        capture, may be merged as it is.  That is so unless it estimated the
+        band of the segment it carries on and the estimate is not the band
+        of the current segment here, or would not be once re-centred on the
+        merged counts.  Otherwise the part is to be analyzed again with the
+        current segment as carry.
+        """
+        continued = other.continued
+        if continued is None or continued.next_rebase:
+            return True
+        current = self.current
+        if current is None:
+            return False
+        if (current.low, current.high) != (continued.low, continued.high):
+            return False
+        edges = current.edges + continued.edges
+        if edges < current.next_rebase:
+            return True
+        mean = (current.total + continued.total + edges // 2) // edges
+        return band(mean, self.tolerance) == (current.low, current.high)
+
+    def merge(self, other, line_offset=0):
+        """Appends the segments of the analysis of the following part of the
+        same capture, shifting its line numbers by line_offset.  The segment
+        it carried on is combined with the current segment here."""
+        for segment in other.segments:
+            segment.start_line += line_offset
+            segment.end_line += line_offset
+        segments = list(other.segments)
+        continued = other.continued
+        if continued is not None:
+            segments.remove(continued)
+            if self.current is not None:
+                self.current.merge(continued)
+            elif continued.edges:
+                segments.insert(0, continued)
+        self.segments.extend(segments)
+        if self.segments:
+            self.current = self.segments[-1]
+        self.outliers += other.outliers
+
+    def report(self, sample_rate):
+        """Returns the lines of a clock rate report."""
+        lines = ["Clock rate segments:"]
+        for segment in self.segments:
+            lines.append("  " + segment.report(sample_rate))
+        lines.append("  Outlier intervals (pauses/glitches): {}".format(self.outliers))
+        return lines
@@ -0,0 +1,124 @@
+#! python3
+"""
+Module for the table-driven CRC checks used on the SD card bus.  The CMD line
+frames are protected by a CRC7 (x^7 + x^3 + 1) and each DAT line is protected
+by an independent CRC16-CCITT (x^16 + x^12 + x^5 + 1).  Both are computed a
+byte at a time from precomputed 256 entry tables so that a frame check costs a
+handful of table lookups rather than a loop per bit.
+"""
+
+
+def _make_crc7_table():
+    """Builds the CRC7 lookup table.  The CRC register is kept left justified
+    in a byte (CRC in bits 7..1) so that each input byte may be XOR'd straight
+    into it, which is the usual trick for polynomials narrower than 8 bits."""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ (0x09 << 1)) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table.append(crc)
+    return tuple(table)
+
+
+def _make_crc16_table():
+    """Builds the CRC16-CCITT lookup table for MSB first processing."""
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC7_TABLE = _make_crc7_table()
+CRC16_TABLE = _make_crc16_table()
+
+
+def crc7(data):
+    """Returns the 7 bit CRC of a bytes-like object."""
+    crc = 0
+    table = CRC7_TABLE
+    for byte in data:
+        crc = table[crc ^ byte]
+    return crc >> 1
+
+
+def crc16(data, crc=0):
+    """Returns the 16 bit CCITT CRC of a bytes-like object.  The crc parameter
+    permits continuing a CRC across several buffers."""
+    table = CRC16_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+def frame_crc7_ok(value, length):
+    """Checks the CRC7 of a packed CMD line frame.  The value is the integer
+    of the whole frame, start bit first, with the CRC in bits 7..1 and the
+    stop bit in bit 0.  For 48 bit frames the CRC covers the leading 40 bits.
+    For 136 bit (R2) frames the CRC covers the 120 bits of CID/CSR register
+    that follow the 8 bit header."""
+    if length == 136:
+        covered = ((value >> 8) & ((1 << 120) - 1)).to_bytes(15, "big")
+    else:
+        covered = (value >> 8).to_bytes(5, "big")
+    return crc7(covered) == (value >> 1) & 0x7F
+
+
+class CrcCounter:
+    """
+    Aggregates pass and fail counts of CRC checks.  Counts are kept per frame
+    kind (e.g. 'Command', 'R1', 'Data') so a summary may show where on the
+    bus the errors are occurring.
+    """
+
+    def __init__(self):
+        self.passed = {}
+        self.failed = {}
+
+    def record(self, kind, ok):
+        """Records the result of one check and returns it unchanged so the
+        call may be used inline."""
+        counts = self.passed if ok else self.failed
+        counts[kind] = counts.get(kind, 0) + 1
+        return ok
+
+    def merge(self, other):
+        """Adds the counts from another CrcCounter into this one."""
+        for kind, count in other.passed.items():
+            self.passed[kind] = self.passed.get(kind, 0) + count
+        for kind, count in other.failed.items():
+            self.failed[kind] = self.failed.get(kind, 0) + count
+
+    @property
+    def checked(self):
+        """Total number of checks recorded."""
+        return sum(self.passed.values()) + sum(self.failed.values())
+
+    @property
+    def errors(self):
+        """Total number of failed checks recorded."""
+        return sum(self.failed.values())
+
+    def summary(self):
+        """Returns a one line summary of the checks."""
+        kinds = sorted(set(self.passed) | set(self.failed))
+        details = ", ".join(
+            "{}: {}/{}".format(
+                kind,
+                self.failed.get(kind, 0),
+                self.passed.get(kind, 0) + self.failed.get(kind, 0),
+            )
+            for kind in kinds
+        )
+        return "CRC errors: {} of {} checked ({})".format(
+            self.errors, self.checked, details
+        )
@@ -0,0 +1,183 @@
+#! python3
+"""
+Module for decoding data blocks on the 4 bit SD card DAT bus.  A block begins
+with a start bit of 0 on all four DAT lines at once, followed by the data two
+nibbles per byte (high nibble first), a CRC16 on each DAT line, and an end bit
+of 1.  The nibbles are sampled on the rising clock edge just as for the CMD
+line.  Each DAT line carries its own CRC16 over the bits sent on that line.
+
+The data is assembled into a preallocated bytearray, so a block costs one
+small step per clock edge.  The per-line CRCs are computed once the block is
+complete by splitting the bytes back out into one bit stream per line with
+translation tables.
+"""
+from crc import crc16
+
+BLOCK_SIZE = 512
+# Commands that move data blocks over the DAT bus, keyed on (ACMD, index),
+# with the block length when it is fixed by the command rather than by
+# SET_BLOCKLEN.
+DATA_COMMANDS = {
+    (False, 6): 64,  # SWITCH_FUNC status
+    (False, 17): None,  # READ_SINGLE_BLOCK
+    (False, 18): None,  # READ_MULTIPLE_BLOCK
+    (False, 24): None,  # WRITE_BLOCK
+    (False, 25): None,  # WRITE_MULTIPLE_BLOCK
+    (True, 13): 64,  # SD_STATUS
+}
+
+
+def _make_lane_tables():
+    """Builds a translation table per output bit pair position for each DAT
+    line.  Every data byte holds two bits of each line (one per nibble), so
+    four data bytes make one byte of a line's bit stream.  Table [lane][pos]
+    maps a data byte to its two bits for that lane, already shifted to pair
+    position pos within the line byte."""
+    tables = []
+    for lane in range(4):
+        lane_tables = []
+        for shift in (6, 4, 2, 0):
+            lane_tables.append(
+                bytes(
+                    ((((byte >> (4 + lane)) & 1) << 1) | ((byte >> lane) & 1)) << shift
+                    for byte in range(256)
+                )
+            )
+        tables.append(lane_tables)
+    return tables
+
+
+LANE_TABLES = _make_lane_tables()
+
+
+def lane_crcs(data):
+    """Returns the CRC16 of each DAT line (index 0 = DAT0) for a block of data
+    sent on the 4 bit bus.  The data length must be a multiple of 4."""
+    crcs = []
+    for tables in LANE_TABLES:
+        parts = [data[pos::4].translate(table) for pos, table in enumerate(tables)]
+        lane = bytes(a | b | c | d for a, b, c, d in zip(*parts))
+        crcs.append(crc16(lane))
+    return tuple(crcs)
+
+
+class DataBlock:
+    """
+    Class representing one decoded DAT bus block and the command it belongs
+    to.  The index is the position of the block within a multiple block
+    transfer.
+    """
+
+    def __init__(self, line, data, crc_received, command, index):
+        self.line = line
+        self.data = data
+        self.crc_received = crc_received
+        self.crc_computed = lane_crcs(data)
+        self.command = command
+        self.index = index
+
+    @property
+    def crc_ok(self):
+        """True if every DAT line CRC matches."""
+        return self.crc_received == self.crc_computed
+
+    def __str__(self):
+        if self.command is not None:
+            source = "{} Arg: {:08x}  Block: {}".format(
+                self.command.name, self.command.argument, self.index
+            )
+        else:
+            source = "No command"
+        if self.crc_ok:
+            crc_str = "(CRC OK)"
+        else:
+            crc_str = "(CRC ERROR)"
+        return "Data Block:   {}  Length: {}  Data: {}...\n              CRC16 DAT3-0: {} {}".format(
+            source,
+            len(self.data),
+            self.data[:16].hex(),
+            " ".join("{:04x}".format(crc) for crc in reversed(self.crc_received)),
+            crc_str,
+        )
+
+
+class DatDecoder:
+    """
+    Class implementing the DAT bus state machine.  It is given every command
+    frame so that blocks can be linked to the command that requested them,
+    and the DAT nibble on every rising clock edge.
+    """
+
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.command = None
+        self.length = block_size
+        self.index = 0
+        self.buf = bytearray(block_size)
+        self.view = memoryview(self.buf)
+        # Nibbles remaining in the data and CRC phases.  Both zero when idle.
+        self.data_left = 0
+        self.crc_left = 0
+        self.pos = 0
+        self.high = None
+        self.crc_bits = [0, 0, 0, 0]
+        self.start_line = 0
+
+    def command_frame(self, frame):
+        """Notes a command frame.  Data commands become the owner of the
+        blocks that follow."""
+        if not frame.is_command:
+            return
+        key = (frame.acmd, frame.cmd_idx)
+        if key in DATA_COMMANDS:
+            self.command = frame
+            self.length = DATA_COMMANDS[key] or self.block_size
+            self.index = 0
+
+    def clock(self, line, nibble):
+        """Processes the DAT nibble on a rising clock edge.  Returns a
+        DataBlock when one completes, otherwise None."""
+        if self.data_left:
+            if self.high is None:
+                self.high = nibble << 4
+            else:
+                self.buf[self.pos] = self.high | nibble
+                self.pos += 1
+                self.high = None
+            self.data_left -= 1
+            return None
+
+        if self.crc_left:
+            bits = self.crc_bits
+            bits[0] = (bits[0] << 1) | (nibble & 1)
+            bits[1] = (bits[1] << 1) | ((nibble >> 1) & 1)
+            bits[2] = (bits[2] << 1) | ((nibble >> 2) & 1)
+            bits[3] = (bits[3] << 1) | (nibble >> 3)
+            self.crc_left -= 1
+            if self.crc_left:
+                return None
+            # The end bit is not waited for; the next start bit can only
+            # follow it anyway.
+            block = DataBlock(
+                self.start_line,
+                bytes(self.view[: self.length]),
+                tuple(bits),
+                self.command,
+                self.index,
+            )
+            self.index += 1
+            return block
+
+        if nibble == 0:
+            # Start bit on all four lines.  A card signaling busy or a CRC
+            # status token only pulls DAT0 low, which is not a start.
+            if self.length > len(self.buf):
+                self.buf = bytearray(self.length)
+                self.view = memoryview(self.buf)
+            self.start_line = line
+            self.pos = 0
+            self.high = None
+            self.data_left = self.length * 2
+            self.crc_left = 16
+            self.crc_bits = [0, 0, 0, 0]
+        return None
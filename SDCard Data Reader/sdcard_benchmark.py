@@ -0,0 +1,245 @@
+#! python3
+"""
+Regression and benchmark harness for the SD card decoder.  A session is
+synthesized with sdcard_synth, written out in each capture format, and
+decoded by every combination of input backend and decoder mode:
+
+    backends : csv, packed (binary), rle (binary transitions)
+    modes    : cmd (CMD line only), dat (CMD and DAT bus), split (CMD line
+               decoded in parallel segments)
+
+Each decode is checked against the ground truth of the synthesized session
+(frame lines, values, names and CRC results, and for the dat mode the data
+blocks) and timed.  Throughput is reported in samples per second.  A small
+BitVector benchmark is included since the decoder builds every frame with
+one.  The exit status is non-zero if any decode disagrees with the truth.
+
+    python sdcard_benchmark.py --reads 50 --jitter 1 --corrupt 5 17
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from bitvector import BitVector
+import sdcard_data_reader
+import sdcard_synth
+
+BACKENDS = ("csv", "packed", "rle")
+MODES = ("cmd", "dat", "split")
+EXTENSIONS = {"csv": ".csv", "packed": ".sdcap", "rle": ".rle.sdcap"}
+
+
+def check_result(result, session, mode):
+    """Compares a DecodeResult with the session ground truth.  Returns a list
+    of mismatch descriptions, empty when the decode is correct."""
+    errors = []
+    if len(result.frames) != len(session.frames):
+        errors.append(
+            "frame count {} expected {}".format(len(result.frames), len(session.frames))
+        )
+    for num, (frame, truth) in enumerate(zip(result.frames, session.frames)):
+        if truth.name.startswith(("CMD", "ACMD")):
+            name = frame.name
+        else:
+            name = frame.kind
+        if (frame.line, frame.value, frame.length, name) != (
+            truth.line,
+            truth.value,
+            truth.length,
+            truth.name,
+        ):
+            errors.append(
+                "frame {}: line {} {} {:x} expected line {} {} {:x}".format(
+                    num,
+                    frame.line,
+                    name,
+                    frame.value,
+                    truth.line,
+                    truth.name,
+                    truth.value,
+                )
+            )
+        elif truth.name != "R3" and frame.crc_ok != truth.crc_ok:
+            errors.append(
+                "frame {}: CRC result {} expected {}".format(
+                    num, frame.crc_ok, truth.crc_ok
+                )
+            )
+
+    if mode == "dat":
+        if len(result.blocks) != len(session.blocks):
+            errors.append(
+                "block count {} expected {}".format(
+                    len(result.blocks), len(session.blocks)
+                )
+            )
+        for num, (block, truth) in enumerate(zip(result.blocks, session.blocks)):
+            command = block.command.name if block.command is not None else None
+            if (block.line, block.data, command, block.index) != (
+                truth.line,
+                truth.data,
+                truth.command,
+                truth.index,
+            ):
+                errors.append("block {}: mismatch at line {}".format(num, block.line))
+            elif not block.crc_ok:
+                errors.append("block {}: CRC error".format(num))
+    return errors
+
+
+def run_case(filename, mode, sample_rate, jobs):
+    """Decodes a capture in the given mode.  Returns the result and the
+    elapsed time in seconds."""
+    start = time.perf_counter()
+    if mode == "split":
+        result = sdcard_data_reader.decode_file_split(filename, sample_rate, jobs)
+    else:
+        result = sdcard_data_reader.decode_file(filename, sample_rate, mode == "dat")
+    return result, time.perf_counter() - start
+
+
+def bench_bitvector(count=100000):
+    """Times building and slicing 48 bit frames the way the decoder does.
+    Returns frames per second."""
+    bits = [int(b) for b in "{:048b}".format(0x48000001AA87)]
+    start = time.perf_counter()
+    for _ in range(count):
+        vector = BitVector()
+        for bit in bits:
+            vector.append(bit)
+        vector.value
+        vector.slice(45, 40).value
+        vector.slice(39, 8).value
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="sdcard_benchmark",
+        description="""Checks and times sdcard_data_reader against synthesized
+        SD card sessions.""",
+    )
+    parser.add_argument(
+        "--reads", type=int, default=20, help="Block reads in the session.  Default: 20"
+    )
+    parser.add_argument(
+        "--max_blocks",
+        type=int,
+        default=4,
+        help="Largest multiple block read.  Default: 4",
+    )
+    parser.add_argument(
+        "-s",
+        "--sample_rate",
+        type=float,
+        default=10,
+        help="Sample rate in nanoseconds.  Default: 10",
+    )
+    parser.add_argument(
+        "--init_clock",
+        type=float,
+        default=400e3,
+        help="Identification clock in Hz.  Default: 400e3",
+    )
+    parser.add_argument(
+        "--clock", type=float, default=25e6, help="Transfer clock in Hz.  Default: 25e6"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=int,
+        default=0,
+        help="Clock half period jitter in samples.  Default: 0",
+    )
+    parser.add_argument(
+        "--corrupt",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Frame numbers to send with a bad CRC.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.  Default: 0")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Workers for the split mode.  Default: one per CPU core.",
+    )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        choices=BACKENDS,
+        default=list(BACKENDS),
+        help="Input backends to run.",
+    )
+    parser.add_argument(
+        "--modes",
+        nargs="+",
+        choices=MODES,
+        default=list(MODES),
+        help="Decoder modes to run.",
+    )
+    parser.add_argument(
+        "--keep",
+        help="Directory to keep the synthesized captures in.  Default: temporary.",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    session = sdcard_synth.generate(
+        args.reads,
+        args.max_blocks,
+        args.sample_rate,
+        args.init_clock,
+        args.clock,
+        args.jitter,
+        corrupt=args.corrupt,
+        seed=args.seed,
+    )
+    samples = session.writer.samples
+    print(
+        "Synthesized {} samples, {} frames, {} blocks in {:.2f} s".format(
+            len(samples),
+            len(session.frames),
+            len(session.blocks),
+            time.perf_counter() - start,
+        )
+    )
+
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.keep or tmpdir
+        print(
+            "{:<8} {:<6} {:>10} {:>14}  {}".format(
+                "Backend", "Mode", "Seconds", "Samples/s", "Check"
+            )
+        )
+        for backend in args.backends:
+            filename = os.path.join(directory, "session" + EXTENSIONS[backend])
+            sdcard_synth.write_capture(filename, samples, args.sample_rate, backend)
+            for mode in args.modes:
+                result, elapsed = run_case(filename, mode, args.sample_rate, args.jobs)
+                errors = check_result(result, session, mode)
+                if errors:
+                    failures += 1
+                    status = "FAIL ({} mismatches, first: {})".format(
+                        len(errors), errors[0]
+                    )
+                else:
+                    status = "PASS"
+                print(
+                    "{:<8} {:<6} {:>10.3f} {:>14.0f}  {}".format(
+                        backend, mode, elapsed, len(samples) / elapsed, status
+                    )
+                )
+
+    print("BitVector: {:.0f} frames/s".format(bench_bitvector()))
+    if failures:
+        print("{} decode(s) disagreed with the ground truth.".format(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,29 @@
 """
 Module receives a CSV table from the Logic Analyzer with the following columns:
 clock, cmd, data (hex nibble).  The program scans through each line looking for
-the start of a command or a response and prints it out.
+the start of a command or a response and prints it out.  Captures converted to
+the packed binary format (see capture_binary) are recognized and read directly
+without any text parsing.
+
+Several captures may be given at once, either as filenames, glob patterns, or
+directories (every *.csv and *.sdcap inside is used).  In that case the files
+are decoded in a pool of worker processes and the results are printed in the
+order the files were given, followed by a summary of the whole batch.
 """
 import argparse
 import csv
+import glob
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum, auto
 from bitvector import BitVector
+import capture_binary
+import capture_split
+from capture_split import read_lines
+from clock_timing import ClockTiming
+from crc import CrcCounter, frame_crc7_ok
+from dat_decoder import DatDecoder
 
 
 class States(Enum):
@@ -17,194 +34,601 @@ class States(Enum):
     acquire = auto()
 
 
+class Frame:
+    """
+    Class representing one decoded CMD line frame.  The frame is kept as the
+    packed integer value and length so that it is cheap to pass between
+    processes.  The fields are sliced out again when the frame is formatted.
+    """
+
+    def __init__(self, line, value, length, acmd):
+        self.line = line
+        self.value = value
+        self.length = length
+        self.acmd = acmd
+        self.crc_ok = None
+
+    @property
+    def vector(self):
+        """Returns the frame as a BitVector of the full frame length."""
+        binlist = [int(b) for b in "{:0{}b}".format(self.value, self.length)]
+        return BitVector(binlist)
+
+    @property
+    def is_command(self):
+        """The transmission bit is set for host to card commands."""
+        return (self.value >> (self.length - 2)) & 1 == 1
+
+    @property
+    def cmd_idx(self):
+        """Command index field (reserved field for R2 and R3)."""
+        return (self.value >> (self.length - 8)) & 0x3F
+
+    @property
+    def argument(self):
+        """Argument field of a 48 bit frame."""
+        return (self.value >> 8) & 0xFFFFFFFF
+
+    @property
+    def kind(self):
+        """Returns the frame type name used for CRC counts and reports."""
+        if self.is_command:
+            return "Command"
+        if self.length == 136:
+            return "R2"
+        if self.cmd_idx == 63:
+            return "R3"
+        if self.cmd_idx == 3:
+            return "R6"
+        return "R1"
+
+    @property
+    def name(self):
+        """Returns the command name (e.g. CMD08, ACMD41) of a command frame."""
+        if self.acmd:
+            return "ACMD{:02d}".format(self.cmd_idx)
+        return "CMD{:02d}".format(self.cmd_idx)
+
+
+class DecodeResult:
+    """
+    Class holding everything decoded out of one capture: the frames and DAT
+    bus blocks in order, the clock timing analysis, CRC counts and a
+    histogram of the commands.
+    """
+
+    def __init__(self, filename, sample_rate=10):
+        self.filename = filename
+        self.sample_rate = sample_rate
+        self.frames = []
+        self.blocks = []
+        self.timing = ClockTiming()
+        self.crc = CrcCounter()
+        self.commands = Counter()
+        self.samples = 0
+        # Command index state left at the end of the decode, and whether any
+        # frame in the decode set it (as opposed to it being carried in).
+        self.final_cmd_idx = 0
+        self.cmd_idx_set = False
+
+    def add_frame(self, frame):
+        """Appends a frame and updates the statistics with it."""
+        if frame.kind != "R3":
+            # R3 has the reserved field in place of the CRC.
+            frame.crc_ok = self.crc.record(
+                frame.kind, frame_crc7_ok(frame.value, frame.length)
+            )
+        if frame.is_command:
+            self.commands[frame.name] += 1
+        self.frames.append(frame)
+
+    def add_block(self, block):
+        """Appends a DAT bus block and records its CRC check."""
+        self.crc.record("Data", block.crc_ok)
+        self.blocks.append(block)
+
+    def extend(self, other, line_offset=0):
+        """Appends the frames and statistics of a decode of the following
+        segment of the same capture.  The segment frame line numbers are
+        shifted by line_offset."""
+        for frame in other.frames:
+            frame.line += line_offset
+        self.frames.extend(other.frames)
+        for block in other.blocks:
+            block.line += line_offset
+        self.blocks.extend(other.blocks)
+        self.timing.merge(other.timing, line_offset)
+        self.crc.merge(other.crc)
+        self.commands.update(other.commands)
+        self.samples += other.samples
+        if other.cmd_idx_set:
+            self.final_cmd_idx = other.final_cmd_idx
+            self.cmd_idx_set = True
+
+
+def crc_result(crc_ok):
+    """Formats the result of a frame CRC check for printing."""
+    if crc_ok:
+        return "(CRC OK)"
+    return "(CRC ERROR)"
+
+
+def format_frame(frame):
+    """Returns the printable report for one frame."""
+    vector = frame.vector
+    start_txrx = vector.slice(vector.length - 1, vector.length - 2)
+
+    if frame.is_command:
+        cmd_idx = vector.slice(45, 40)
+        argument = vector.slice(39, 8)
+        crc7_stop = vector.slice(7, 0)
+        if not frame.acmd:
+            fmt = "Command:      Raw: {:012x}  Start + Tx: {:02x}  Cmd Idx:  CMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x} {}"
+        else:
+            fmt = "Command:      Raw: {:012x}  Start + Tx: {:02x}  Cmd Idx: ACMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x} {}"
+        return fmt.format(
+            vector.value,
+            start_txrx.value,
+            cmd_idx.value,
+            argument.value,
+            crc7_stop.value,
+            crc_result(frame.crc_ok),
+        )
+
+    if frame.length != 136:
+        # R1, R3, R6 Response
+        cmd_idx = vector.slice(45, 40)
+        argument = vector.slice(39, 8)
+        crc7_stop = vector.slice(7, 0)
+        if cmd_idx.value == 63:
+            return "R3 (OCR):     Raw: {:012x}  Start + Rx: {:02x}  Reserved:    {:02x}  OCR: {:08x}  Reserved:    {:02x}".format(
+                vector.value,
+                start_txrx.value,
+                cmd_idx.value,
+                argument.value,
+                crc7_stop.value,
+            )
+        if cmd_idx.value == 3:
+            new_rca = vector.slice(39, 24)
+            card_status = vector.slice(23, 8)
+            return "R6 (RCA):     Raw: {:012x}\n              Start Rx: {:02x}\n              Cmd Idx:  {:02x}\n              RCA: {:04x}\n              Card Status: {:04x}\n              CRC7 Stop: {:02x} {}".format(
+                vector.value,
+                start_txrx.value,
+                cmd_idx.value,
+                new_rca.value,
+                card_status.value,
+                crc7_stop.value,
+                crc_result(frame.crc_ok),
+            )
+        return "R1 (Normal):  Raw: {:012x}  Start + Rx: {:02x}  Cmd Idx:  CMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x} {}".format(
+            vector.value,
+            start_txrx.value,
+            cmd_idx.value,
+            argument.value,
+            crc7_stop.value,
+            crc_result(frame.crc_ok),
+        )
+
+    # R2 Response
+    start_tx = vector.slice(135, 134)
+    cmd_idx = vector.slice(133, 128)
+    cid_csr = vector.slice(127, 0)
+    return "R2 (CID/CSR): Raw: {:034x}\n              Start Rx: {:02x}\n              Reserved: {:02x}\n              CID/CSR + Stop: {:032x} {}".format(
+        vector.value,
+        start_tx.value,
+        cmd_idx.value,
+        cid_csr.value,
+        crc_result(frame.crc_ok),
+    )
+
+
+def read_csv(filename, start=None, stop=None):
+    """Generator yielding (clk, cmd, data) tuples from a Logic Analyzer CSV
+    capture.  The start and stop byte offsets restrict the read to a segment
+    of the file, see capture_split."""
+    if start is None:
+        with open(filename) as csvfile:
+            for row in csv.DictReader(csvfile):
+                yield int(row["clk"]), int(row["cmd"]), int(row["data"], 16)
+        return
+
+    with open(filename, "rb") as csvfile:
+        fieldnames = next(csv.reader([csvfile.readline().decode("ascii")]))
+        rows = csv.DictReader(read_lines(csvfile, start, stop), fieldnames=fieldnames)
+        for row in rows:
+            yield int(row["clk"]), int(row["cmd"]), int(row["data"], 16)
+
+
+def to_transitions(samples):
+    """
+    Generator run-length encoding an iterable of (clk, cmd, data) samples
+    into (position, clk, cmd, data) transitions.  Only samples that differ
+    from the one before are passed on, apart from the first sample and the
+    last sample, which are always included so the decoder knows where the
+    capture starts and ends.
+    """
+    last = None
+    position = -1
+    for position, sample in enumerate(samples):
+        if sample != last:
+            yield (position,) + sample
+            last = sample
+            last_position = position
+    if position >= 0 and last_position != position:
+        yield (position,) + last
+
+
+def decode(
+    transitions,
+    sample_rate,
+    filename="",
+    start_line=2,
+    cmd_idx=0,
+    clk_period=0,
+    dat=False,
+    clock=None,
+):
+    """
+    Runs the CMD line state machine over an iterable of (position, clk, cmd,
+    data) transitions and returns a DecodeResult.  The sample rate is in
+    nanoseconds.  Every action of the state machine happens on a clock or
+    CMD edge, so only samples where a signal changes need to be visited and
+    the run time follows the bus activity rather than the capture length.
+    The position is the sample index from the start of the iterable, and
+    the last sample is expected to be present to mark the end.
+
+    The remaining parameters allow a decode to begin part way through a
+    capture: start_line is the line number of the first sample, cmd_idx is
+    the index of the last command seen before it, and clk_period is the clock
+    period in samples leading up to it (0 if unknown).  clock is the
+    ClockSegment in progress there if known, for the clock analysis to carry
+    on (see ClockTiming).  When dat is set the DAT bus is decoded into data
+    blocks as well.
+    """
+    result = DecodeResult(filename, sample_rate)
+
+    # Initialize state machine
+    current_state = States.idle
+
+    last_clk = 0
+    last_cmd = 1
+    current_cmd_idx = cmd_idx
+    # DictReader skips the first line for field names and indexing line
+    # numbers at 1 means the first data line is line # 2
+    line_count = start_line
+    position = -1
+    if clk_period:
+        timing = ClockTiming(start_line - clk_period, carry=clock)
+    else:
+        timing = ClockTiming()
+    result.timing = timing
+    if dat:
+        dat_decoder = DatDecoder()
+    else:
+        dat_decoder = None
+    for position, clk, cmd, data in transitions:
+        line_count = start_line + position
+
+        # Identify edges
+        rising_edge_clk = clk == 1 and last_clk == 0
+        falling_edge_cmd = cmd == 0 and last_cmd == 1
+
+        # Track the clock rate.  Only the edge position is recorded here, the
+        # rate is worked out from the running statistics when reporting.
+        if rising_edge_clk:
+            timing.edge(line_count)
+            if dat_decoder is not None:
+                block = dat_decoder.clock(line_count, data)
+                if block is not None:
+                    result.add_block(block)
+
+        if current_state == States.idle:
+            # When not in a sequence, we watch for the falling edge of the
+            # CMD line to indicate the start of a TX/RX transaction.
+            bit_count = 0
+            if falling_edge_cmd:
+                vector = BitVector()
+                frame_line = line_count
+                current_state = States.acquire
+
+        elif current_state == States.acquire:
+            # Once a transaction begins, we'll always clock data in on the
+            # rising edge of the clock.  This did not work for slow sample
+            # rates because the host transitions data on a rising edge, but
+            # with sufficiently fast sampling, the clock precedes the next
+            # data bit.  At the faster clock rate the slew between clock and
+            # data is such that we still want always rising edge.
+            if rising_edge_clk:
+                vector.append(cmd)
+                bit_count += 1
+
+            # End of transaction is defined by the number of bits.  Usually
+            # 48 bits, however if the prior transaction was a command type
+            # 2, 9, or 10, the number of bits is 136.
+            if current_cmd_idx in (2, 9, 10):
+                max_bit = 136
+            else:
+                max_bit = 48
+
+            if bit_count == max_bit:
+                # End of transaction.  Branch between command and response
+                # types.
+                frame = Frame(
+                    frame_line,
+                    vector.value,
+                    max_bit,
+                    current_cmd_idx == 55,
+                )
+                result.add_frame(frame)
+                if dat_decoder is not None:
+                    dat_decoder.command_frame(frame)
+                if frame.is_command:
+                    current_cmd_idx = frame.cmd_idx
+                    result.cmd_idx_set = True
+                elif max_bit == 136:
+                    current_cmd_idx = 0
+                    result.cmd_idx_set = True
+
+                # Return to the idle state
+                current_state = States.idle
+
+        last_clk = clk
+        last_cmd = cmd
+
+    timing.finish()
+    result.samples = position + 1
+    result.final_cmd_idx = current_cmd_idx
+    return result
+
+
+def read_capture(filename, start=None, stop=None):
+    """Generator yielding (position, clk, cmd, data) transitions from either
+    a CSV or a binary capture.  Segment positions are byte offsets for CSV
+    captures and sample indices for binary captures.  Binary captures are
+    run-length encoded in numpy (or are stored that way already), CSV
+    captures have to be parsed row by row first."""
+    if capture_binary.is_binary_capture(filename):
+        return capture_binary.read_binary(filename, start, stop)
+    return to_transitions(read_csv(filename, start, stop))
+
+
+def capture_sample_rate(filename, sample_rate):
+    """Binary captures carry their own sample rate, which takes precedence
+    over the command line value."""
+    if capture_binary.is_binary_capture(filename):
+        return capture_binary.read_header(filename).sample_rate
+    return sample_rate
+
+
+def decode_file(filename, sample_rate, dat=False):
+    """Decodes a single capture file.  Module level so that it may be sent to
+    a worker process."""
+    sample_rate = capture_sample_rate(filename, sample_rate)
+    return decode(read_capture(filename), sample_rate, filename, dat=dat)
+
+
+def decode_segment(filename, segment, sample_rate, cmd_idx=0, clock=None):
+    """Decodes one segment of a capture file.  Line numbers in the result are
+    relative to the start of the segment."""
+    sample_rate = capture_sample_rate(filename, sample_rate)
+    return decode(
+        read_capture(filename, segment.start, segment.stop),
+        sample_rate,
+        filename,
+        start_line=0,
+        cmd_idx=cmd_idx,
+        clk_period=segment.clk_period,
+        clock=clock,
+    )
+
+
+def decode_file_split(filename, sample_rate, jobs=None):
+    """
+    Decodes a single large capture in parallel.  The file is cut at CMD line
+    idle gaps (see capture_split) and the segments are decoded in worker
+    processes, then stitched back together in order.
+
+    Every segment is decoded assuming no command preceded it.  That is only
+    wrong when the real preceding command changes how the following frames
+    are read: CMD2/9/10 (136 bit R2 response) and CMD55 (ACMD numbering).
+    Those segments are decoded again with the correct command carried in
+    once the prior segments are known.  Likewise the clock analysis of each
+    segment estimates the band of the clock rate segment in progress at its
+    start, and a segment is decoded again carrying that clock rate segment on
+    where the estimate turns out wrong, so the clock report is the one a
+    single pass gives.
+    """
+    if capture_binary.is_binary_capture(filename):
+        find_split_points = capture_binary.find_split_points
+    else:
+        find_split_points = capture_split.find_split_points
+    segments = find_split_points(filename, jobs or os.cpu_count() or 1)
+    sample_rate = capture_sample_rate(filename, sample_rate)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        partials = list(
+            executor.map(
+                decode_segment,
+                [filename] * len(segments),
+                segments,
+                [sample_rate] * len(segments),
+            )
+        )
+
+    result = DecodeResult(filename, sample_rate)
+    line_count = 2
+    for segment, partial in zip(segments, partials):
+        carry_idx = result.final_cmd_idx
+        if carry_idx in (2, 9, 10, 55) or not result.timing.continues(partial.timing):
+            partial = decode_segment(
+                filename, segment, sample_rate, carry_idx, result.timing.current
+            )
+        result.extend(partial, line_count)
+        line_count += partial.samples
+    return result
+
+
+def expand_inputs(patterns):
+    """Expands the input arguments into a list of capture filenames.  Each
+    argument may be a filename, a glob pattern, or a directory.  Order is
+    preserved and duplicates are dropped.  Directories supply their *.csv
+    and *.sdcap captures.  Raises ValueError for a glob pattern or directory
+    that supplies no capture."""
+    filenames = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = sorted(
+                glob.glob(os.path.join(pattern, "*.csv"))
+                + glob.glob(os.path.join(pattern, "*.sdcap"))
+            )
+        elif glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        if not matches:
+            raise ValueError("No capture files match {}".format(pattern))
+        for match in matches:
+            match = os.path.normpath(match)
+            if match not in filenames:
+                filenames.append(match)
+    return filenames
+
+
+def print_result(result):
+    """Prints the frames and blocks of a decode in the original single file
+    layout."""
+    print("Reading from : {}".format(result.filename))
+    # The clock segments, frames and blocks are all in line order, so step
+    # through the segments alongside them and announce each change of rate.
+    segments = result.timing.segments
+    seg_idx = -1
+    last_seg_idx = -1
+    if result.blocks:
+        items = sorted(result.frames + result.blocks, key=lambda item: item.line)
+    else:
+        items = result.frames
+    for item in items:
+        while (
+            seg_idx + 1 < len(segments)
+            and segments[seg_idx + 1].start_line <= item.line
+        ):
+            seg_idx += 1
+        if seg_idx != last_seg_idx:
+            print(
+                "Transaction Clock Rate: {:.0f} Hz".format(
+                    segments[seg_idx].rate(result.sample_rate)
+                )
+            )
+            last_seg_idx = seg_idx
+        if isinstance(item, Frame):
+            print(format_frame(item))
+        else:
+            print(item)
+    print(result.crc.summary())
+    for line in result.timing.report(result.sample_rate):
+        print(line)
+
+
+def print_summary(results):
+    """Prints the per file and total statistics of a batch decode."""
+    print("=================================================================")
+    print("Batch Summary")
+    print("=================================================================")
+    total_crc = CrcCounter()
+    total_commands = Counter()
+    total_frames = 0
+    for result in results:
+        rates = ", ".join(
+            "{:.0f}".format(segment.rate(result.sample_rate))
+            for segment in result.timing.segments
+        )
+        print(
+            "{}: {} frames  {} blocks  {} samples  CRC errors: {}  Clock rates (Hz): {}".format(
+                result.filename,
+                len(result.frames),
+                len(result.blocks),
+                result.samples,
+                result.crc.errors,
+                rates,
+            )
+        )
+        total_crc.merge(result.crc)
+        total_commands.update(result.commands)
+        total_frames += len(result.frames)
+    print("Total: {} files  {} frames".format(len(results), total_frames))
+    print(total_crc.summary())
+    print("Command histogram:")
+    for name, count in sorted(total_commands.items()):
+        print("  {:<7} {}".format(name, count))
+
+
 def main():
     """Initial entry point.  Command line parameters."""
     parser = argparse.ArgumentParser(
         prog="sdcard_data_reader",
         description="""Reads commands from a serial data stream and decodes.""",
     )
-    parser.add_argument("input_file", help="Input CSV filename.  Required.")
+    parser.add_argument(
+        "input_file",
+        nargs="+",
+        help="""Input CSV or binary capture filename.  Required.  Several
+        files, glob patterns or directories may be given to decode a batch.""",
+    )
     parser.add_argument(
         "-s",
         "--sample_rate",
         help="Sample rate in nanoseconds.  Default = 10.",
         default=10,
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="""Number of worker processes used for a batch.  Default: one per
+        CPU core.""",
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--split",
+        action="store_true",
+        help="""Decode a single capture in parallel by splitting it at long
+        CMD line idle gaps.  Uses the --jobs number of workers.  Not
+        available together with --dat.""",
+    )
+    parser.add_argument(
+        "--dat",
+        action="store_true",
+        help="""Also decode data blocks on the 4 bit DAT bus and check their
+        CRC16s.""",
+    )
     args = parser.parse_args()
 
-    print("Reading from : {}".format(args.input_file))
-
-    with open(args.input_file) as csvfile:
-        sddata = csv.DictReader(csvfile)
-        # print("Field Names: {}".format(sddata.fieldnames))
-
-        # Initialize state machine
-        current_state = States.idle
-
-        last_clk = 0
-        last_cmd = 1
-        current_cmd_idx = 0
-        # DictReader skips the first line for field names and indexing line
-        # numbers at 1 means the first data line is line # 2
-        line_count = 2
-        last_clk_edge_line = 0
-        last_freq = 0
-        for row in sddata:
-            clk = int(row["clk"])
-            cmd = int(row["cmd"])
-            data = int(row["data"], 16)
-            # print("Line Count: {} Clk: {} Cmd: {} Data: {}".format(line_count, clk, cmd, data))
-
-            # Identify edges
-            rising_edge_clk = False
-            falling_edge_clk = False
-            rising_edge_cmd = False
-            falling_edge_cmd = False
-            if clk == 1 and last_clk == 0:
-                rising_edge_clk = True
-            elif clk == 0 and last_clk == 1:
-                falling_edge_clk = True
-            if cmd == 1 and last_cmd == 0:
-                rising_edge_cmd = True
-            elif cmd == 0 and last_cmd == 1:
-                falling_edge_cmd = True
-
-            # Try to calculate clock rate
-            if rising_edge_clk:
-                edge_to_edge = line_count - last_clk_edge_line
-                #print("Line Count: {} Last: {} E2E: {} Rate: {}".format(line_count, last_clk_edge_line, edge_to_edge, args.sample_rate))
-                clock_freq = 1.0 / (float(edge_to_edge) * float(args.sample_rate) * float(1e-9))
-                #print("Transaction Clock Rate: {} Hz".format(clock_freq))
-                last_clk_edge_line = line_count
-
-            # if rising_edge_clk: print("Line: {}  Rising Edge Clk Found".format(line_count))
-            # if falling_edge_clk: print("Line: {}  Falling Edge Clk Found".format(line_count))
-            # if rising_edge_cmd: print("Line: {}  Rising Edge Cmd Found".format(line_count))
-            # if falling_edge_cmd: print("Line: {}  Falling Edge Cmd Found".format(line_count))
-
-            if current_state == States.idle:
-                # When not in a sequence, we watch for the falling edge of the
-                # CMD line to indicate the start of a TX/RX transaction.
-                bit_count = 0
-                if falling_edge_cmd:
-                    vector = BitVector()
-                    current_state = States.acquire
-                    if clock_freq != last_freq:
-                        print("Transaction Clock Rate: {} Hz".format(clock_freq))
-                        last_freq = clock_freq
-
-            elif current_state == States.acquire:
-                # Once a transaction begins, we'll always clock data in on the
-                # rising edge of the clock.  This did not work for slow sample
-                # rates because the host transitions data on a rising edge, but
-                # with sufficiently fast sampling, the clock precedes the next
-                # data bit.  At the faster clock rate the slew between clock and
-                # data is such that we still want always rising edge.
-                if rising_edge_clk:
-                    vector.append(cmd)
-                    bit_count += 1
-
-                # End of transaction is defined by the number of bits.  Usually
-                # 48 bits, however if the prior transaction was a command type
-                # 2, 9, or 10, the number of bits is 136.
-                if current_cmd_idx in (2, 9, 10):
-                    max_bit = 136
-                else:
-                    max_bit = 48
-
-                if bit_count == max_bit:
-                    # End of transaction.  Branch between command and response
-                    # types.
-                    start_txrx = vector.slice(vector.length - 1, vector.length - 2)
-
-                    if start_txrx.value == 1:
-                        # Command
-                        cmd_idx = vector.slice(45, 40)
-                        argument = vector.slice(39, 8)
-                        crc7_stop = vector.slice(7, 0)
-                        if current_cmd_idx != 55:
-                            print(
-                                "Command:      Raw: {:012x}  Start + Tx: {:02x}  Cmd Idx:  CMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x}".format(
-                                    vector.value,
-                                    start_txrx.value,
-                                    cmd_idx.value,
-                                    argument.value,
-                                    crc7_stop.value,
-                                )
-                            )
-                        else:
-                            print(
-                                "Command:      Raw: {:012x}  Start + Tx: {:02x}  Cmd Idx: ACMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x}".format(
-                                    vector.value,
-                                    start_txrx.value,
-                                    cmd_idx.value,
-                                    argument.value,
-                                    crc7_stop.value,
-                                )
-                            )
-                        current_cmd_idx = cmd_idx.value
-
-                    else:
-                        # Response
-                        if max_bit != 136:
-                            # R1, R3, R6 Response
-                            cmd_idx = vector.slice(45, 40)
-                            argument = vector.slice(39, 8)
-                            crc7_stop = vector.slice(7, 0)
-                            if cmd_idx.value == 63:
-                                print(
-                                    "R3 (OCR):     Raw: {:012x}  Start + Rx: {:02x}  Reserved:    {:02x}  OCR: {:08x}  Reserved:    {:02x}".format(
-                                        vector.value,
-                                        start_txrx.value,
-                                        cmd_idx.value,
-                                        argument.value,
-                                        crc7_stop.value,
-                                    )
-                                )
-                            elif cmd_idx.value == 3:
-                                new_rca = vector.slice(39, 24)
-                                card_status = vector.slice(23, 8)
-                                print(
-                                    "R6 (RCA):     Raw: {:012x}\n              Start Rx: {:02x}\n              Cmd Idx:  {:02x}\n              RCA: {:04x}\n              Card Status: {:04x}\n              CRC7 Stop: {:02x}".format(
-                                        vector.value,
-                                        start_txrx.value,
-                                        cmd_idx.value,
-                                        new_rca.value,
-                                        card_status.value,
-                                        crc7_stop.value,
-                                    )
-                                )
-                            else:
-                                print(
-                                    "R1 (Normal):  Raw: {:012x}  Start + Rx: {:02x}  Cmd Idx:  CMD{:02d}  Arg: {:08x}  CRC7 + Stop: {:02x}".format(
-                                        vector.value,
-                                        start_txrx.value,
-                                        cmd_idx.value,
-                                        argument.value,
-                                        crc7_stop.value,
-                                    )
-                                )
-                        else:
-                            # R2 Response
-                            start_tx = vector.slice(135, 134)
-                            cmd_idx = vector.slice(133, 128)
-                            cid_csr = vector.slice(127, 0)
-                            print(
-                                "R2 (CID/CSR): Raw: {:034x}\n              Start Rx: {:02x}\n              Reserved: {:02x}\n              CID/CSR + Stop: {:032x}".format(
-                                    vector.value,
-                                    start_tx.value,
-                                    cmd_idx.value,
-                                    cid_csr.value,
-                                )
-                            )
-                            current_cmd_idx = 0
-
-                    # Return to the idle state
-                    current_state = States.idle
-
-            line_count += 1
-            last_clk = clk
-            last_cmd = cmd
+    try:
+        filenames = expand_inputs(args.input_file)
+    except ValueError as err:
+        parser.error(str(err))
+    if len(filenames) == 1:
+        if args.split and not args.dat:
+            print_result(decode_file_split(filenames[0], args.sample_rate, args.jobs))
+        else:
+            # DAT transfers run on while the CMD line is idle, so the idle
+            # gaps are not safe split points for the DAT decoder.
+            print_result(decode_file(filenames[0], args.sample_rate, args.dat))
+        return
+
+    # Executor.map hands results back in submission order so the merged
+    # output is ordered regardless of which worker finishes first.
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(
+            executor.map(
+                decode_file,
+                filenames,
+                [args.sample_rate] * len(filenames),
+                [args.dat] * len(filenames),
+            )
+        )
+    for result in results:
+        print_result(result)
+    print_summary(results)
 
 
 if __name__ == "__main__":
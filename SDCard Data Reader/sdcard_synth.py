@@ -0,0 +1,407 @@
+#! python3
+"""
+Module for synthesizing Logic Analyzer captures of an SD card session so the
+decoder can be checked and timed without a real capture.  The session is a
+card initialization at the slow clock (CMD0, CMD8, CMD55/ACMD41, CMD2, CMD3,
+CMD9, CMD7, ACMD6) with R1/R2/R3/R6 responses, followed by single and
+multiple block reads at the transfer clock with data on the 4 bit DAT bus.
+The host drives the lines on the falling clock edge and the decoder samples
+on the rising edge.  Oversampling follows from the sample rate and bus clock
+rates, and each clock half period can be given random jitter.
+
+The samples are built as packed bytes (see capture_binary) and may be written
+as CSV, packed binary or run-length encoded binary.  A ground truth list of
+the frames and blocks, with the line each starts on, is kept alongside.
+
+    python sdcard_synth.py session.csv --reads 20 --truth session.json
+"""
+import argparse
+import json
+import random
+from crc import crc7, crc16
+import capture_binary
+
+# DictReader line numbering used by the decoder: the first sample is line 2.
+FIRST_LINE = 2
+RCA = 0x1234
+CID = 0x035344534430384780B3F4A5C5013D
+CSD = 0x400E00325B59000076B27F800A4040
+OCR = 0x00FF8000
+
+
+class TruthFrame:
+    """Class representing an expected CMD line frame."""
+
+    def __init__(self, line, value, length, name, crc_ok=True):
+        self.line = line
+        self.value = value
+        self.length = length
+        self.name = name
+        self.crc_ok = crc_ok
+
+    def as_dict(self):
+        """Returns the frame as a JSON friendly dictionary."""
+        return {
+            "line": self.line,
+            "value": "{:x}".format(self.value),
+            "length": self.length,
+            "name": self.name,
+            "crc_ok": self.crc_ok,
+        }
+
+
+class TruthBlock:
+    """Class representing an expected DAT bus block."""
+
+    def __init__(self, line, data, command, index):
+        self.line = line
+        self.data = data
+        self.command = command
+        self.index = index
+
+    def as_dict(self):
+        """Returns the block as a JSON friendly dictionary."""
+        return {
+            "line": self.line,
+            "data": self.data.hex(),
+            "command": self.command,
+            "index": self.index,
+        }
+
+
+def command_frame(cmd_idx, argument):
+    """Returns the packed 48 bit host command for an index and argument."""
+    content = (1 << 38) | (cmd_idx << 32) | argument
+    return (content << 8) | (crc7(content.to_bytes(5, "big")) << 1) | 1
+
+
+def response_frame(cmd_idx, argument):
+    """Returns a packed 48 bit R1/R6/R7 style response."""
+    content = (cmd_idx << 32) | argument
+    return (content << 8) | (crc7(content.to_bytes(5, "big")) << 1) | 1
+
+
+def r3_frame(ocr):
+    """Returns a packed R3 response.  R3 carries no CRC, the reserved bits are
+    all ones."""
+    return (0x3F << 40) | (ocr << 8) | 0xFF
+
+
+def r2_frame(register):
+    """Returns a packed 136 bit R2 response for a 120 bit CID or CSD (the
+    register without its CRC7 and end bit)."""
+    crc = crc7(register.to_bytes(15, "big"))
+    return (0x3F << 128) | (register << 8) | (crc << 1) | 1
+
+
+def lane_crc(data, lane):
+    """Computes the CRC16 of one DAT line bit by bit from the nibble stream,
+    independently of the decoder's table driven version."""
+    bits = []
+    for byte in data:
+        bits.append((byte >> (4 + lane)) & 1)
+        bits.append((byte >> lane) & 1)
+    value = int("".join(str(bit) for bit in bits), 2)
+    return crc16(value.to_bytes(len(bits) // 8, "big"))
+
+
+class BusWriter:
+    """
+    Class accumulating packed samples as the bus is clocked.  Each clock
+    cycle is a low half followed by a high half.  Line values change at the
+    start of the low half, i.e. on the falling edge.
+    """
+
+    def __init__(self, sample_rate=10, jitter=0, seed=0):
+        self.sample_rate = float(sample_rate)
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.samples = bytearray()
+        self.half = 1
+        self.cmd = 1
+        self.data = 0xF
+
+    def set_clock(self, freq):
+        """Sets the bus clock frequency in Hz."""
+        period = 1e9 / (float(freq) * self.sample_rate)
+        self.half = max(1, int(round(period / 2)))
+
+    def _half(self):
+        """Returns the length of one clock half period in samples."""
+        if self.jitter:
+            return max(1, self.half + self.rng.randint(-self.jitter, self.jitter))
+        return self.half
+
+    def clock(self, cmd=None, data=None):
+        """Runs one clock cycle, changing the lines first if given.  Returns
+        the decoder line number of the rising edge."""
+        if cmd is not None:
+            self.cmd = cmd
+        if data is not None:
+            self.data = data
+        low = (self.cmd << 1) | (self.data << 4)
+        self.samples += bytes((low,)) * self._half()
+        rising = len(self.samples)
+        self.samples += bytes((low | 1,)) * self._half()
+        return rising + FIRST_LINE
+
+    def idle(self, cycles):
+        """Runs clock cycles with CMD and DAT released high."""
+        for _ in range(cycles):
+            self.clock(1, 0xF)
+
+    def frame(self, value, length):
+        """Clocks a CMD line frame out, start bit first.  Returns the decoder
+        line number of the frame, the CMD falling edge."""
+        line = len(self.samples) + FIRST_LINE
+        for bit in range(length - 1, -1, -1):
+            self.clock((value >> bit) & 1)
+        self.cmd = 1
+        return line
+
+    def block(self, data):
+        """Clocks a data block onto the DAT bus with start bit, per line
+        CRC16s and end bit.  Returns the decoder line number of the start bit
+        rising edge."""
+        line = self.clock(data=0)
+        for byte in data:
+            self.clock(data=byte >> 4)
+            self.clock(data=byte & 0xF)
+        crcs = [lane_crc(data, lane) for lane in range(4)]
+        for bit in range(15, -1, -1):
+            self.clock(data=sum(((crcs[lane] >> bit) & 1) << lane for lane in range(4)))
+        self.clock(data=0xF)
+        return line
+
+
+class Session:
+    """
+    Class that drives a BusWriter through an SD card session and records the
+    ground truth.  Frames listed in corrupt (by frame number) get a CRC bit
+    flipped on the bus and are expected to fail their check.
+    """
+
+    def __init__(self, writer, response_delay=8, gap=16, corrupt=()):
+        self.writer = writer
+        self.response_delay = response_delay
+        self.gap = gap
+        self.corrupt = set(corrupt)
+        self.frames = []
+        self.blocks = []
+
+    def _send(self, value, length, name):
+        """Clocks out one frame and records it."""
+        crc_ok = True
+        if len(self.frames) in self.corrupt and name != "R3":
+            value ^= 1 << 1
+            crc_ok = False
+        line = self.writer.frame(value, length)
+        self.frames.append(TruthFrame(line, value, length, name, crc_ok))
+
+    def transaction(self, cmd_idx, argument, response=None, acmd=False):
+        """Sends a command and optionally its response.  The response is a
+        tuple of (value, length, kind)."""
+        if acmd:
+            name = "ACMD{:02d}".format(cmd_idx)
+        else:
+            name = "CMD{:02d}".format(cmd_idx)
+        self._send(command_frame(cmd_idx, argument), 48, name)
+        if response is not None:
+            self.writer.idle(self.response_delay)
+            self._send(*response)
+        self.writer.idle(self.gap)
+
+    def read(self, cmd_idx, address, blocks, rng):
+        """Performs a block read (CMD17 or CMD18) with random data."""
+        self.transaction(cmd_idx, address, (response_frame(cmd_idx, 0x900), 48, "R1"))
+        for index in range(blocks):
+            data = bytes(rng.getrandbits(8) for _ in range(512))
+            line = self.writer.block(data)
+            self.blocks.append(
+                TruthBlock(line, data, "CMD{:02d}".format(cmd_idx), index)
+            )
+            self.writer.idle(self.gap)
+        if cmd_idx == 18:
+            self.transaction(12, 0, (response_frame(12, 0xB00), 48, "R1"))
+
+    def initialize(self, init_clock):
+        """Runs the card identification sequence at the slow clock."""
+        self.writer.set_clock(init_clock)
+        # At least 74 clocks after power up before the first command.
+        self.writer.idle(80)
+        self.transaction(0, 0)
+        self.transaction(8, 0x1AA, (response_frame(8, 0x1AA), 48, "R1"))
+        for busy in (0, 1):
+            self.transaction(55, 0, (response_frame(55, 0x120), 48, "R1"))
+            self.transaction(
+                41, 0x40FF8000, (r3_frame(OCR | (busy << 31)), 48, "R3"), acmd=True
+            )
+        self.transaction(2, 0, (r2_frame(CID), 136, "R2"))
+        self.transaction(3, 0, (response_frame(3, (RCA << 16) | 0x0500), 48, "R6"))
+        self.transaction(9, RCA << 16, (r2_frame(CSD), 136, "R2"))
+        self.transaction(7, RCA << 16, (response_frame(7, 0x700), 48, "R1"))
+        self.transaction(55, RCA << 16, (response_frame(55, 0x920), 48, "R1"))
+        self.transaction(6, 2, (response_frame(6, 0x920), 48, "R1"), acmd=True)
+
+    def transfer(self, clock, reads, max_blocks, idle, rng):
+        """Runs a mix of single and multiple block reads at the transfer
+        clock, with idle stretches between them."""
+        self.writer.set_clock(clock)
+        for _ in range(reads):
+            self.writer.idle(idle)
+            if max_blocks > 1 and rng.random() < 0.5:
+                self.read(18, rng.getrandbits(20) << 9, rng.randint(2, max_blocks), rng)
+            else:
+                self.read(17, rng.getrandbits(20) << 9, 1, rng)
+        self.writer.idle(idle)
+
+    def truth(self):
+        """Returns the ground truth as a JSON friendly dictionary."""
+        return {
+            "frames": [frame.as_dict() for frame in self.frames],
+            "blocks": [block.as_dict() for block in self.blocks],
+        }
+
+
+def generate(
+    reads=10,
+    max_blocks=4,
+    sample_rate=10,
+    init_clock=400e3,
+    clock=25e6,
+    jitter=0,
+    idle=200,
+    corrupt=(),
+    seed=0,
+):
+    """Synthesizes a session and returns the finished Session.  The packed
+    samples are in session.writer.samples."""
+    rng = random.Random(seed)
+    session = Session(BusWriter(sample_rate, jitter, seed), corrupt=corrupt)
+    session.initialize(init_clock)
+    session.transfer(clock, reads, max_blocks, idle, rng)
+    return session
+
+
+def write_csv(filename, samples):
+    """Writes packed samples as a Logic Analyzer CSV capture."""
+    lines = [
+        "{},{},{:x}\n".format(value & 1, (value >> 1) & 1, value >> 4)
+        for value in range(256)
+    ]
+    with open(filename, "w") as f_out:
+        f_out.write("clk,cmd,data\n")
+        for pos in range(0, len(samples), capture_binary.CHUNK):
+            f_out.write(
+                "".join(
+                    map(lines.__getitem__, samples[pos : pos + capture_binary.CHUNK])
+                )
+            )
+
+
+def write_capture(filename, samples, sample_rate, fmt):
+    """Writes packed samples in one of the formats 'csv', 'packed' or
+    'rle'."""
+    if fmt == "csv":
+        write_csv(filename, samples)
+    elif fmt == "packed":
+        capture_binary.write_packed(filename, samples, sample_rate)
+    else:
+        capture_binary.write_packed(
+            filename, samples, sample_rate, capture_binary.TRANSITIONS
+        )
+
+
+def main():
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(
+        prog="sdcard_synth",
+        description="""Synthesizes a Logic Analyzer capture of an SD card
+        session for testing and benchmarking sdcard_data_reader.""",
+    )
+    parser.add_argument("output_file", help="Output capture filename.  Required.")
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=["csv", "packed", "rle"],
+        default="csv",
+        help="Capture format.  Default: csv",
+    )
+    parser.add_argument(
+        "-s",
+        "--sample_rate",
+        type=float,
+        default=10,
+        help="Sample rate in nanoseconds.  Default = 10.",
+    )
+    parser.add_argument(
+        "--init_clock",
+        type=float,
+        default=400e3,
+        help="Identification clock in Hz.  Default: 400e3",
+    )
+    parser.add_argument(
+        "--clock",
+        type=float,
+        default=25e6,
+        help="Transfer clock in Hz.  Default: 25e6",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=int,
+        default=0,
+        help="Maximum random change of each clock half period in samples.  Default: 0",
+    )
+    parser.add_argument(
+        "--reads", type=int, default=10, help="Number of block reads.  Default: 10"
+    )
+    parser.add_argument(
+        "--max_blocks",
+        type=int,
+        default=4,
+        help="Largest multiple block read.  Default: 4",
+    )
+    parser.add_argument(
+        "--idle",
+        type=int,
+        default=200,
+        help="Idle clocks between reads.  Default: 200",
+    )
+    parser.add_argument(
+        "--corrupt",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Frame numbers to send with a bad CRC.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.  Default: 0")
+    parser.add_argument(
+        "--truth", help="Also write the ground truth as JSON to this file."
+    )
+    args = parser.parse_args()
+
+    session = generate(
+        args.reads,
+        args.max_blocks,
+        args.sample_rate,
+        args.init_clock,
+        args.clock,
+        args.jitter,
+        args.idle,
+        args.corrupt,
+        args.seed,
+    )
+    samples = session.writer.samples
+    write_capture(args.output_file, samples, args.sample_rate, args.format)
+    print(
+        "Wrote {} samples, {} frames, {} blocks to {}".format(
+            len(samples), len(session.frames), len(session.blocks), args.output_file
+        )
+    )
+    if args.truth:
+        with open(args.truth, "w") as f_out:
+            json.dump(session.truth(), f_out, indent=1)
+
+
+if __name__ == "__main__":
+    main()
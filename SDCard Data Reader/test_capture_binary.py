@@ -0,0 +1,104 @@
+#! python3
+"""Tests for capture_binary.  Run with pytest from this directory."""
+import os
+import tempfile
+import unittest
+import numpy as np
+import capture_binary
+from capture_binary import (
+    CHUNK,
+    PACKED,
+    TRANSITIONS,
+    find_idle_split,
+    map_capture,
+    read_binary,
+    write_packed,
+)
+
+
+def idle_middle_capture():
+    """Returns packed samples three chunks long.  The clock toggles with CMD
+    low for the first and last half chunk, and in between the bus is idle
+    (clock stopped, CMD high), so the whole middle chunk has no transition."""
+    samples = np.full(3 * CHUNK, 2, dtype=np.uint8)
+    toggling = (np.arange(CHUNK // 2) // 4) & 1
+    samples[: CHUNK // 2] = toggling
+    samples[-(CHUNK // 2) :] = toggling
+    return samples
+
+
+def expected_transitions(samples):
+    """Returns the (position, clk, cmd, data) transitions read_binary should
+    give for the packed samples, worked out directly."""
+    idx = np.flatnonzero(samples[1:] != samples[:-1]) + 1
+    idx = np.concatenate(([0], idx))
+    if idx[-1] != samples.size - 1:
+        idx = np.concatenate((idx, [samples.size - 1]))
+    values = samples[idx]
+    return list(
+        zip(
+            idx.tolist(),
+            (values & 1).tolist(),
+            ((values >> 1) & 1).tolist(),
+            (values >> 4).tolist(),
+        )
+    )
+
+
+class IdleStretchTest(unittest.TestCase):
+    """A stretch of at least CHUNK samples without a transition."""
+
+    def setUp(self):
+        self.samples = idle_middle_capture()
+        self.tempdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, encoding):
+        filename = os.path.join(self.tempdir.name, "capture.bin")
+        write_packed(filename, self.samples.tobytes(), 1e8, encoding)
+        return filename
+
+    def test_read_binary(self):
+        expected = expected_transitions(self.samples)
+        for encoding in (PACKED, TRANSITIONS):
+            with self.subTest(encoding=encoding):
+                filename = self.write(encoding)
+                self.assertEqual(list(read_binary(filename)), expected)
+
+    def test_read_binary_idle_end(self):
+        # A range that ends inside the idle stretch still marks its end.
+        filename = self.write(PACKED)
+        start = CHUNK // 4
+        stop = 2 * CHUNK
+        transitions = list(read_binary(filename, start, stop))
+        self.assertEqual(transitions[-1], (stop - 1 - start, 0, 1, 0))
+
+    def test_find_idle_split(self):
+        filename = self.write(PACKED)
+        header, mm, data = map_capture(filename)
+        try:
+            # The clock never runs with CMD high, so there is no split.
+            self.assertIsNone(find_idle_split(header, data, 0, header.count))
+            self.assertIsNone(find_idle_split(header, data, CHUNK, 2 * CHUNK))
+        finally:
+            data = None
+            mm.close()
+
+    def test_chunks_not_empty(self):
+        filename = self.write(PACKED)
+        header, mm, data = map_capture(filename)
+        try:
+            chunks = capture_binary.iter_transitions(header, data, 0, header.count)
+            sizes = [positions.size for positions, values in chunks]
+            self.assertEqual(len(sizes), 2)
+            self.assertTrue(all(sizes))
+        finally:
+            chunks.close()
+            data = None
+            mm.close()
+
+
+if __name__ == "__main__":
+    unittest.main()